@@ -0,0 +1,142 @@
+from flask import Blueprint, request, jsonify
+from service.analytics_service import AnalyticsService
+from repository.incident_sketch_repository import IncidentSketchRepository
+from utils.dimension_cache import DimensionCache
+from utils.incident_cube import IncidentCube
+from utils.filters import parse_filters
+from database import db
+
+analytics_bp = Blueprint("analytics", __name__, url_prefix="/analytics")
+service = AnalyticsService(IncidentCube(db), IncidentSketchRepository(db), DimensionCache(db))
+
+def _parse_list(args, name: str, allowed, default: str = ""):
+    """Lista separada por vírgulas, sem repetições, só com valores de `allowed`."""
+    values = []
+
+    for value in args.get(name, default).split(","):
+        value = value.strip()
+        if not value or value in values:
+            continue
+        if value not in allowed:
+            raise ValueError(f"{name} must be a comma-separated list of: {', '.join(allowed)}")
+        values.append(value)
+
+    return values
+
+@analytics_bp.get("/cube")
+def analytics_cube():
+    """
+    Análise multidimensional de incidentes
+    ---
+    tags:
+      - Analytics
+    summary: "Incident Cube"
+    description: "Agrupa os incidentes por qualquer combinação de dimensões e calcula as métricas pedidas, a partir de índices bitmap em memória. Aceita os mesmos filtros de GET /cyber_threats/ (year, year_from, year_to, country, attack_type, attack_source, target_industry, security_vulnerability, defense_mechanism, min_loss, max_loss, min_users, max_users)."
+    parameters:
+      - in: query
+        name: group_by
+        type: string
+        required: false
+        description: "Dimensões separadas por vírgula: attack_type, attack_source, target_industry, security_vulnerability, defense_mechanism, country, year (vazio = total)"
+      - in: query
+        name: metrics
+        type: string
+        required: false
+        default: count
+        description: "Métricas separadas por vírgula: count, distinct_countries, sum_loss, avg_loss, sum_users, avg_users, sum_resolution, avg_resolution, p50_loss, p95_loss, p99_loss, p50_resolution, p95_resolution, p99_resolution"
+      - in: query
+        name: approx
+        type: integer
+        required: false
+        enum: [0, 1]
+        description: "1 = resposta aproximada em tempo constante, a partir de sketches (HyperLogLog para distinct_countries com erro padrão de 1,6%; t-digest para os percentis com erro de posição até 0,5% em p50, 0,1% em p95 e 0,02% em p99). Só com group_by vazio, defense_mechanism ou security_vulnerability, sem filtros, e com as métricas count, distinct_countries e p*."
+      - in: query
+        name: year_from
+        type: integer
+        required: false
+      - in: query
+        name: year_to
+        type: integer
+        required: false
+      - in: query
+        name: country
+        type: string
+        required: false
+        description: País, ou vários separados por vírgula
+      - in: query
+        name: attack_type
+        type: string
+        required: false
+        description: Id(s) do tipo de ataque, separados por vírgula
+    produces:
+      - application/json
+      - application/msgpack
+      - application/vnd.apache.arrow.stream
+      - text/csv
+    responses:
+      200:
+        description: Grupos com pelo menos um incidente, por ordem decrescente de nº de incidentes
+        schema:
+          type: object
+          properties:
+            group_by:
+              type: array
+              items:
+                type: string
+            metrics:
+              type: array
+              items:
+                type: string
+            stale_since:
+              type: string
+              description: "Só com approx=1: instante da primeira alteração ou remoção de incidentes ainda não refletida nos sketches (null se estiverem atualizados)"
+            groups:
+              type: array
+              items:
+                type: object
+              example:
+                - attack_type: {id: 1, name: "Phishing"}
+                  year: 2023
+                  count: 42
+                  sum_loss: 2110.5
+      400:
+        description: Dimensão, métrica ou filtro inválido (ou não suportado com approx=1)
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+    try:
+        group_by = _parse_list(request.args, "group_by", list(IncidentCube.DIMENSIONS))
+        metrics = _parse_list(request.args, "metrics", IncidentCube.METRICS, default="count")
+        filters = parse_filters(request.args)
+    except ValueError as err:
+        return {"error": str(err)}, 400
+
+    if not metrics:
+        return {"error": "metrics must not be empty"}, 400
+
+    approx = request.args.get("approx", "0") == "1"
+
+    if approx:
+        if len(group_by) > 1 or (group_by and group_by[0] not in IncidentSketchRepository.DIMENSIONS):
+            return {"error": f"approx=1 groups only by one of: {', '.join(IncidentSketchRepository.DIMENSIONS)}"}, 400
+        if filters:
+            return {"error": "approx=1 does not support filters"}, 400
+
+        unsupported = [metric for metric in metrics if metric not in IncidentSketchRepository.METRICS]
+        if unsupported:
+            return {"error": f"Metrics not available with approx=1: {', '.join(unsupported)}"}, 400
+
+    body = {
+        "group_by": group_by,
+        "metrics": metrics,
+        "approx": approx,
+        "groups": service.cube_query(group_by, filters, metrics, approx),
+    }
+
+    if approx:
+        body["stale_since"] = service.approx_stale_since()
+
+    return jsonify(body)
@@ -2,9 +2,82 @@ from flask import Blueprint, request, jsonify
 from service.attack_service import AttackService
 from repository.attack_repository import AttackRepository
 from database import db
+from service.ingest_service import IngestService
+from utils.column_limits import column_error
+from utils.filters import parse_filters, parse_sort, check_cursor_sort
+from utils.pagination import parse_page_args, paginated_response
+from utils.prefer import wants_representation
+from utils.streaming import wants_ndjson, ndjson_response, STREAM_CHUNK_SIZE
 
 attack_bp = Blueprint("attacks", __name__, url_prefix="/attacks")
 service = AttackService(AttackRepository(db))
+ingest = IngestService(db)
+ingest.register("attack", service.create_many)
+
+# Campos de um ataque que podem ser atualizados -> tipos aceites
+_ATTACK_FIELDS = (
+    ("attack_type", int),
+    ("attack_source", int),
+    ("target_industry", int),
+    ("country", str),
+    ("year", int),
+    ("financial_loss", (int, float)),
+    ("affected_users", int),
+)
+
+def validate_attack(data):
+    """
+    Valida um ataque completo recebido no body.
+
+    Retorna (valores, None), com os valores pela ordem de service.create,
+    ou (None, mensagem de erro).
+    """
+    if not isinstance(data, dict):
+        return None, "Invalid attack"
+
+    values = []
+    for field, types in _ATTACK_FIELDS:
+        value = data.get(field)
+
+        if value is None or not isinstance(value, types) or (types is str and not value):
+            return None, f"Invalid {field}"
+
+        error = column_error(field, value)
+        if error is not None:
+            return None, error
+
+        values.append(value)
+
+    return tuple(values), None
+
+def validate_attack_fields(data):
+    """
+    Valida os campos fornecidos numa atualização parcial.
+
+    Retorna ({campo: valor}, None) só com os campos presentes, ou (None, mensagem de erro).
+    """
+    if not isinstance(data, dict):
+        return None, "Invalid attack"
+
+    fields = {}
+    for field, types in _ATTACK_FIELDS:
+        value = data.get(field)
+
+        if value is None:
+            continue
+        if not isinstance(value, types) or (types is str and not value):
+            return None, f"Invalid {field}"
+
+        error = column_error(field, value)
+        if error is not None:
+            return None, error
+
+        fields[field] = value
+
+    if not fields:
+        return None, "No fields to update"
+
+    return fields, None
 
 @attack_bp.post("/")
 def create_attack():
@@ -81,6 +154,15 @@ def create_attack():
               type: number
             affected_users:
               type: integer
+      202:
+        description: "Com INGEST_MODE=async: ataque gravado no diário local; o estado fica em GET /ingest/{ticket}"
+        schema:
+          type: object
+          properties:
+            ticket:
+              type: string
+            status:
+              type: string
       400:
         description: Dados inválidos ou incompletos
         schema:
@@ -89,33 +171,16 @@ def create_attack():
             error:
               type: string
     """
-    data = request.json or {}
-
-    attack_type = data.get("attack_type")
-    attack_source = data.get("attack_source")
-    target_industry = data.get("target_industry")
-    country = data.get("country")
-    year = data.get("year")
-    financial_loss = data.get("financial_loss")
-    affected_users = data.get("affected_users")
-
-    if attack_type is None or not isinstance(attack_type, int):
-        return {"error": "Invalid attack_type"}, 400
-    if attack_source is None or not isinstance(attack_source, int):
-        return {"error": "Invalid attack_source"}, 400
-    if target_industry is None or not isinstance(target_industry, int):
-        return {"error": "Invalid target_industry"}, 400
-    if not country or not isinstance(country, str):
-        return {"error": "Invalid country"}, 400
-    if year is None or not isinstance(year, int):
-        return {"error": "Invalid year"}, 400
-    if financial_loss is None or not isinstance(financial_loss, (int, float)):
-        return {"error": "Invalid financial_loss"}, 400
-    if affected_users is None or not isinstance(affected_users, int):
-        return {"error": "Invalid affected_users"}, 400
-
-    result = service.create(attack_type, attack_source, target_industry, 
-                           country, year, financial_loss, affected_users)
+    values, error = validate_attack(request.json or {})
+
+    if error is not None:
+        return {"error": error}, 400
+
+    if ingest.enabled:
+        ticket = ingest.submit("attack", values)
+        return {"ticket": ticket, "status": "pending"}, 202, {"Location": f"/ingest/{ticket}"}
+
+    result = service.create(*values)
 
     if result is None:
         return {"error": "Invalid parameters"}, 400
@@ -130,10 +195,109 @@ def list_attacks():
     tags:
       - Attacks
     summary: "List All Attacks"
-    description: "Retorna uma lista de todos os ataques registrados"
+    description: "Retorna uma página de ataques, filtrada e ordenada pelos parâmetros (por omissão do mais recente para o mais antigo). Use o cursor do header X-Next-Cursor em `after` para obter a página seguinte."
+    parameters:
+      - in: query
+        name: limit
+        type: integer
+        required: false
+        default: 100
+        description: Número máximo de ataques por página (máximo 1000)
+      - in: query
+        name: after
+        type: string
+        required: false
+        description: Cursor opaco devolvido pela página anterior
+      - in: query
+        name: stream
+        type: integer
+        required: false
+        enum: [1]
+        description: "Exporta todos os ataques filtrados em NDJSON (um por linha, sem paginação). Equivalente a `Accept: application/x-ndjson`."
+      - in: query
+        name: sort
+        type: string
+        required: false
+        default: -id
+        enum: [id, -id, year, -year, country, -country, financial_loss, -financial_loss, affected_users, -affected_users, resolution_time, -resolution_time]
+        description: Ordenação (prefixo `-` para descendente), com Id como desempate
+      - in: query
+        name: year
+        type: string
+        required: false
+        description: Ano, ou vários separados por vírgula
+      - in: query
+        name: year_from
+        type: integer
+        required: false
+      - in: query
+        name: year_to
+        type: integer
+        required: false
+      - in: query
+        name: country
+        type: string
+        required: false
+        description: País, ou vários separados por vírgula
+      - in: query
+        name: attack_type
+        type: string
+        required: false
+        description: Id(s) do tipo de ataque, separados por vírgula
+      - in: query
+        name: attack_source
+        type: string
+        required: false
+        description: Id(s) da fonte de ataque, separados por vírgula
+      - in: query
+        name: target_industry
+        type: string
+        required: false
+        description: Id(s) da indústria alvo, separados por vírgula
+      - in: query
+        name: security_vulnerability
+        type: string
+        required: false
+        description: Id(s) da vulnerabilidade, separados por vírgula
+      - in: query
+        name: defense_mechanism
+        type: string
+        required: false
+        description: Id(s) do mecanismo de defesa, separados por vírgula
+      - in: query
+        name: min_loss
+        type: number
+        required: false
+        description: Perda financeira mínima (milhões $)
+      - in: query
+        name: max_loss
+        type: number
+        required: false
+      - in: query
+        name: min_users
+        type: integer
+        required: false
+        description: Mínimo de utilizadores afetados
+      - in: query
+        name: max_users
+        type: integer
+        required: false
+    produces:
+      - application/json
+      - application/x-ndjson
+      - application/msgpack
+      - application/vnd.apache.arrow.stream
+      - text/csv
     responses:
       200:
-        description: Lista de ataques
+        description: Página de ataques
+        headers:
+          X-Next-Cursor:
+            type: string
+            description: Cursor da próxima página (ausente na última página)
+          Link:
+            type: string
+            description: URL da próxima página (rel="next")
         schema:
           type: array
           items:
@@ -156,8 +320,30 @@ def list_attacks():
                 type: number
               affected_users:
                 type: integer
+      400:
+        description: Parâmetros de paginação, filtro ou ordenação inválidos
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
     """
-    return jsonify(service.list())
+    try:
+        filters = parse_filters(request.args)
+        sort = parse_sort(request.args, default="-id")
+    except ValueError as err:
+        return {"error": str(err)}, 400
+
+    if wants_ndjson():
+        return ndjson_response(service.stream(STREAM_CHUNK_SIZE, filters, sort))
+
+    try:
+        limit, after = parse_page_args(request.args)
+        check_cursor_sort(after, sort)
+    except ValueError as err:
+        return {"error": str(err)}, 400
+
+    return paginated_response(*service.list(limit, after, filters, sort))
 
 @attack_bp.get("/<string:external_id>")
 def get_by_id_attack(external_id):
@@ -204,7 +390,7 @@ def update_attack(external_id):
     tags:
       - Attacks
     summary: "Update Attack"
-    description: "Atualiza as informações de um ataque existente"
+    description: "Atualiza as informações de um ataque existente, numa única instrução UPDATE. Por omissão responde 204 sem corpo; com `Prefer: return=representation` devolve o ataque atualizado."
     parameters:
       - in: path
         name: external_id
@@ -212,6 +398,11 @@ def update_attack(external_id):
         required: true
         description: ID único do ataque
         example: "550e8400-e29b-41d4-a716-446655440001"
+      - in: header
+        name: Prefer
+        type: string
+        required: false
+        enum: ["return=representation", "return=minimal"]
       - in: body
         name: body
         required: true
@@ -234,9 +425,13 @@ def update_attack(external_id):
               type: integer
     responses:
       200:
-        description: Ataque atualizado com sucesso
+        description: "Ataque atualizado (com `Prefer: return=representation`)"
         schema:
           type: object
+      204:
+        description: Ataque atualizado
+      400:
+        description: Dados inválidos
       404:
         description: Ataque não encontrado
         schema:
@@ -246,23 +441,84 @@ def update_attack(external_id):
               type: string
               example: "Not found"
     """
-    data = request.json or {}
-
-    result = service.update(
-        external_id=external_id,
-        attack_type=data.get("attack_type"),
-        attack_source=data.get("attack_source"),
-        target_industry=data.get("target_industry"),
-        country=data.get("country"),
-        year=data.get("year"),
-        financial_loss=data.get("financial_loss"),
-        affected_users=data.get("affected_users")
-    )
+    fields, error = validate_attack_fields(request.json or {})
 
-    if result is None:
+    if error is not None:
+        return {"error": error}, 400
+
+    if service.update(external_id, fields) is None:
+        return {"error": "Not found"}, 404
+
+    if not wants_representation():
+        return "", 204
+
+    return jsonify(service.get_by_id(external_id)), 200, {"Preference-Applied": "return=representation"}
+
+@attack_bp.patch("/<string:external_id>")
+def patch_attack(external_id):
+    """
+    Atualizar parcialmente ataque
+    ---
+    tags:
+      - Attacks
+    summary: "Patch Attack"
+    description: "Atualiza só os campos enviados, numa única instrução UPDATE. Por omissão responde 204 sem corpo; com `Prefer: return=representation` devolve o ataque atualizado."
+    parameters:
+      - in: path
+        name: external_id
+        type: string
+        required: true
+        description: ID único do ataque
+        example: "550e8400-e29b-41d4-a716-446655440001"
+      - in: header
+        name: Prefer
+        type: string
+        required: false
+        enum: ["return=representation", "return=minimal"]
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          properties:
+            attack_type:
+              type: integer
+            attack_source:
+              type: integer
+            target_industry:
+              type: integer
+            country:
+              type: string
+            year:
+              type: integer
+            financial_loss:
+              type: number
+            affected_users:
+              type: integer
+    responses:
+      200:
+        description: "Ataque atualizado (com `Prefer: return=representation`)"
+        schema:
+          type: object
+      204:
+        description: Ataque atualizado
+      400:
+        description: Dados inválidos
+      404:
+        description: Ataque não encontrado
+    """
+    fields, error = validate_attack_fields(request.json or {})
+
+    if error is not None:
+        return {"error": error}, 400
+
+    if service.update(external_id, fields) is None:
         return {"error": "Not found"}, 404
 
-    return jsonify(result)
+    if not wants_representation():
+        return "", 204
+
+    return jsonify(service.get_by_id(external_id)), 200, {"Preference-Applied": "return=representation"}
 
 @attack_bp.delete("/<string:external_id>")
 def delete_attack(external_id):
@@ -308,6 +564,11 @@ def attack_statistics():
       - Attacks
     summary: "Get Attack Statistics"
     description: "Retorna estatísticas e análises sobre os ataques"
+    produces:
+      - application/json
+      - application/msgpack
+      - application/vnd.apache.arrow.stream
+      - text/csv
     responses:
       200:
         description: Estatísticas dos ataques
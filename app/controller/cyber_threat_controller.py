@@ -1,10 +1,95 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from service.cyber_threat_service import CyberThreatService
 from repository.cyber_threat_repository import CyberThreatRepository
+from service.ingest_service import IngestService
+from service.incident_import_service import IncidentImportService, IMPORT_FORMATS, read_csv, read_ndjson
+from utils.dimension_cache import DimensionCache
 from database import db
+import mysql.connector
+import io
+import json
+import os
+from utils.column_limits import column_error
+from utils.filters import parse_filters, parse_sort, check_cursor_sort
+from utils.pagination import parse_page_args, paginated_response
+from utils.prefer import wants_representation
+from utils.streaming import wants_ndjson, ndjson_response, NDJSON_MIMETYPE, STREAM_CHUNK_SIZE
 
 cyber_threat_bp = Blueprint("cyber_threats", __name__, url_prefix="/cyber_threats")
 service = CyberThreatService(CyberThreatRepository(db))
+import_service = IncidentImportService(service.repo, DimensionCache(db))
+ingest = IngestService(db)
+ingest.register("cyber_threat", service.create_many)
+
+# Número máximo de incidentes aceites por pedido em POST /cyber_threats/bulk
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "10000"))
+
+# Campos obrigatórios de um incidente (pela ordem de service.create) -> tipos aceites
+_INCIDENT_FIELDS = (
+    ("country", str),
+    ("year", int),
+    ("attack_type", int),
+    ("target_industry", int),
+    ("financial_loss", (int, float)),
+    ("affected_users", int),
+    ("security_vulnerability", int),
+    ("defense_mechanism", int),
+    ("resolution_time", int),
+)
+
+def validate_incident(data):
+    """
+    Valida um incidente recebido no body.
+
+    Retorna (valores, None), com os valores pela ordem de service.create,
+    ou (None, mensagem de erro).
+    """
+    if not isinstance(data, dict):
+        return None, "Invalid incident"
+
+    values = []
+    for field, types in _INCIDENT_FIELDS:
+        value = data.get(field)
+
+        if value is None or not isinstance(value, types) or (types is str and not value):
+            return None, f"Invalid {field}"
+
+        error = column_error(field, value)
+        if error is not None:
+            return None, error
+
+        values.append(value)
+
+    return tuple(values), None
+
+def validate_incident_fields(data):
+    """
+    Valida os campos fornecidos numa atualização parcial.
+
+    Retorna ({campo: valor}, None) só com os campos presentes, ou (None, mensagem de erro).
+    """
+    if not isinstance(data, dict):
+        return None, "Invalid incident"
+
+    fields = {}
+    for field, types in _INCIDENT_FIELDS:
+        value = data.get(field)
+
+        if value is None:
+            continue
+        if not isinstance(value, types) or (types is str and not value):
+            return None, f"Invalid {field}"
+
+        error = column_error(field, value)
+        if error is not None:
+            return None, error
+
+        fields[field] = value
+
+    if not fields:
+        return None, "No fields to update"
+
+    return fields, None
 
 @cyber_threat_bp.post("/")
 def create_cyber_threat():
@@ -64,6 +149,15 @@ def create_cyber_threat():
         description: Ameaça criada com sucesso
         schema:
           type: object
+      202:
+        description: "Com INGEST_MODE=async: ameaça gravada no diário local; o estado fica em GET /ingest/{ticket}"
+        schema:
+          type: object
+          properties:
+            ticket:
+              type: string
+            status:
+              type: string
       400:
         description: Dados inválidos
         schema:
@@ -72,44 +166,229 @@ def create_cyber_threat():
             error:
               type: string
     """
-    data = request.json or {}
-
-    country = data.get("country")
-    year = data.get("year")
-    attack_type = data.get("attack_type")
-    target_industry = data.get("target_industry")
-    financial_loss = data.get("financial_loss")
-    affected_users = data.get("affected_users")
-    security_vulnerability = data.get("security_vulnerability")
-    defense_mechanism = data.get("defense_mechanism")
-    resolution_time = data.get("resolution_time")
-
-    if not country or not isinstance(country, str):
-        return {"error": "Invalid country"}, 400
-    if year is None or not isinstance(year, int):
-        return {"error": "Invalid year"}, 400
-    if attack_type is None or not isinstance(attack_type, int):
-        return {"error": "Invalid attack_type"}, 400
-    if target_industry is None or not isinstance(target_industry, int):
-        return {"error": "Invalid target_industry"}, 400
-    if financial_loss is None or not isinstance(financial_loss, (int, float)):
-        return {"error": "Invalid financial_loss"}, 400
-    if affected_users is None or not isinstance(affected_users, int):
-        return {"error": "Invalid affected_users"}, 400
-    if security_vulnerability is None or not isinstance(security_vulnerability, int):
-        return {"error": "Invalid security_vulnerability"}, 400
-    if defense_mechanism is None or not isinstance(defense_mechanism, int):
-        return {"error": "Invalid defense_mechanism"}, 400
-    if resolution_time is None or not isinstance(resolution_time, int):
-        return {"error": "Invalid resolution_time"}, 400
-
-    result = service.create(country, year, attack_type, target_industry, financial_loss, affected_users, security_vulnerability, defense_mechanism, resolution_time)
+    values, error = validate_incident(request.json or {})
+
+    if error is not None:
+        return {"error": error}, 400
+
+    if ingest.enabled:
+        ticket = ingest.submit("cyber_threat", values)
+        return {"ticket": ticket, "status": "pending"}, 202, {"Location": f"/ingest/{ticket}"}
+
+    result = service.create(*values)
 
     if result is None:
         return {"error": "Invalid parameters"}
 
     return jsonify(result), 201
 
+@cyber_threat_bp.post("/bulk")
+def bulk_create_cyber_threats():
+    """
+    Criar várias ameaças cibernéticas
+    ---
+    tags:
+      - CyberThreats
+    summary: "Bulk Create Cyber Threats"
+    description: "Registra uma lista de incidentes numa só transação. Os incidentes inválidos são devolvidos em `errors` (com a posição na lista) e os restantes são inseridos."
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              country:
+                type: string
+                example: "Brasil"
+              year:
+                type: integer
+                example: 2024
+              attack_type:
+                type: integer
+                example: 1
+              target_industry:
+                type: integer
+                example: 2
+              financial_loss:
+                type: number
+                example: 1000000.00
+              affected_users:
+                type: integer
+                example: 5000
+              security_vulnerability:
+                type: integer
+                example: 1
+              defense_mechanism:
+                type: integer
+                example: 2
+              resolution_time:
+                type: integer
+                example: 48
+    responses:
+      201:
+        description: Todos os incidentes foram criados
+        schema:
+          type: object
+          properties:
+            created:
+              type: integer
+            errors:
+              type: array
+              items:
+                type: object
+      207:
+        description: Parte dos incidentes foi criada; os restantes estão em `errors`
+      400:
+        description: Body inválido ou nenhum incidente válido
+      413:
+        description: Mais incidentes do que BULK_MAX_ROWS
+      503:
+        description: Falha do MySQL; nada foi inserido e o pedido pode ser repetido
+    """
+    data = request.json
+
+    if not isinstance(data, list) or not data:
+        return {"error": "Expected a non-empty array of incidents"}, 400
+    if len(data) > BULK_MAX_ROWS:
+        return {"error": f"At most {BULK_MAX_ROWS} incidents per request"}, 413
+
+    positions = []
+    incidents = []
+    errors = []
+
+    for index, item in enumerate(data):
+        values, error = validate_incident(item)
+
+        if error is not None:
+            errors.append({"index": index, "error": error})
+        else:
+            positions.append(index)
+            incidents.append(values)
+
+    created = 0
+
+    if incidents:
+        try:
+            result = service.create_many(incidents)
+        except mysql.connector.Error:
+            # Falha do MySQL, não do pedido: o cliente pode repetir o mesmo body
+            return {"error": "Database unavailable, try again later"}, 503, {"Retry-After": "5"}
+
+        if result is None:
+            return {"error": "Invalid parameters"}, 400
+
+        created, rejected = result
+        errors.extend(
+            {"index": positions[position], "error": error}
+            for position, error in rejected.items()
+        )
+        errors.sort(key=lambda error: error["index"])
+
+    if created == 0:
+        return jsonify({"created": 0, "errors": errors}), 400
+
+    return jsonify({"created": created, "errors": errors}), 207 if errors else 201
+
+@cyber_threat_bp.post("/import")
+def import_cyber_threats():
+    """
+    Importar ficheiro de ameaças cibernéticas
+    ---
+    tags:
+      - CyberThreats
+    summary: "Import Cyber Threats File"
+    description: "Importa um ficheiro CSV (com cabeçalho) ou NDJSON em streaming. As colunas usam os nomes de global_cyber_threats (ex. `Attack Type`) ou os campos da API (ex. `attack_type`) e as dimensões vêm por nome (ex. `Phishing`). O ficheiro pode ser enviado como body (`Content-Type: text/csv` ou `application/x-ndjson`) ou no campo `file` de um formulário multipart."
+    consumes:
+      - text/csv
+      - application/x-ndjson
+      - multipart/form-data
+    parameters:
+      - in: formData
+        name: file
+        type: file
+        required: false
+        description: Ficheiro a importar
+      - in: query
+        name: format
+        type: string
+        required: false
+        enum: [csv, ndjson]
+        description: Formato do ficheiro (por omissão deduzido do Content-Type ou da extensão)
+      - in: query
+        name: progress
+        type: integer
+        required: false
+        enum: [1]
+        description: Com `progress=1` a resposta é NDJSON, com uma linha de progresso por bloco importado e o resumo na última linha
+    responses:
+      201:
+        description: Todas as linhas foram importadas
+        schema:
+          type: object
+          properties:
+            processed:
+              type: integer
+            imported:
+              type: integer
+            rejected:
+              type: integer
+            errors:
+              type: array
+              items:
+                type: object
+      207:
+        description: Parte das linhas foi rejeitada (ver `errors`)
+      400:
+        description: Formato inválido ou nenhuma linha importada
+    """
+    upload = request.files.get("file")
+
+    if upload is not None:
+        stream = upload.stream
+        name = upload.filename or ""
+        mimetype = upload.mimetype
+    else:
+        stream = request.stream
+        name = ""
+        mimetype = request.mimetype
+
+    format = request.args.get("format")
+    if format is None:
+        ndjson = mimetype == NDJSON_MIMETYPE or name.endswith((".ndjson", ".jsonl"))
+        format = "ndjson" if ndjson else "csv"
+
+    if format not in IMPORT_FORMATS:
+        return {"error": "Invalid format"}, 400
+
+    records = read_ndjson(stream) if format == "ndjson" else read_csv(stream)
+
+    if request.args.get("progress") == "1":
+        if upload is not None:
+            # O Flask fecha os ficheiros do request quando a view retorna,
+            # antes de a resposta em streaming ler o upload
+            upload.stream = io.BytesIO()
+
+        def generate():
+            try:
+                for summary in import_service.run(records):
+                    yield json.dumps(summary) + "\n"
+            finally:
+                stream.close()
+
+        return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+    summary = None
+    for summary in import_service.run(records):
+        pass
+
+    if summary["imported"] == 0:
+        return jsonify(summary), 400
+
+    return jsonify(summary), 207 if summary["rejected"] or "error" in summary else 201
+
 @cyber_threat_bp.get("/")
 def list_cyber_threats():
     """
@@ -118,16 +397,137 @@ def list_cyber_threats():
     tags:
       - CyberThreats
     summary: "List All Cyber Threats"
-    description: "Retorna uma lista de todos os incidentes de cibersegurança"
+    description: "Retorna uma página de incidentes de cibersegurança, filtrada e ordenada pelos parâmetros (por omissão por Id). Use o cursor do header X-Next-Cursor em `after` para obter a página seguinte."
+    parameters:
+      - in: query
+        name: limit
+        type: integer
+        required: false
+        default: 100
+        description: Número máximo de ameaças por página (máximo 1000)
+      - in: query
+        name: after
+        type: string
+        required: false
+        description: Cursor opaco devolvido pela página anterior
+      - in: query
+        name: stream
+        type: integer
+        required: false
+        enum: [1]
+        description: "Exporta todas as ameaças filtradas em NDJSON (uma por linha, sem paginação). Equivalente a `Accept: application/x-ndjson`."
+      - in: query
+        name: sort
+        type: string
+        required: false
+        default: id
+        enum: [id, -id, year, -year, country, -country, financial_loss, -financial_loss, affected_users, -affected_users, resolution_time, -resolution_time]
+        description: Ordenação (prefixo `-` para descendente), com Id como desempate
+      - in: query
+        name: year
+        type: string
+        required: false
+        description: Ano, ou vários separados por vírgula
+      - in: query
+        name: year_from
+        type: integer
+        required: false
+      - in: query
+        name: year_to
+        type: integer
+        required: false
+      - in: query
+        name: country
+        type: string
+        required: false
+        description: País, ou vários separados por vírgula
+      - in: query
+        name: attack_type
+        type: string
+        required: false
+        description: Id(s) do tipo de ataque, separados por vírgula
+      - in: query
+        name: attack_source
+        type: string
+        required: false
+        description: Id(s) da fonte de ataque, separados por vírgula
+      - in: query
+        name: target_industry
+        type: string
+        required: false
+        description: Id(s) da indústria alvo, separados por vírgula
+      - in: query
+        name: security_vulnerability
+        type: string
+        required: false
+        description: Id(s) da vulnerabilidade, separados por vírgula
+      - in: query
+        name: defense_mechanism
+        type: string
+        required: false
+        description: Id(s) do mecanismo de defesa, separados por vírgula
+      - in: query
+        name: min_loss
+        type: number
+        required: false
+        description: Perda financeira mínima (milhões $)
+      - in: query
+        name: max_loss
+        type: number
+        required: false
+      - in: query
+        name: min_users
+        type: integer
+        required: false
+        description: Mínimo de utilizadores afetados
+      - in: query
+        name: max_users
+        type: integer
+        required: false
+    produces:
+      - application/json
+      - application/x-ndjson
+      - application/msgpack
+      - application/vnd.apache.arrow.stream
+      - text/csv
     responses:
       200:
-        description: Lista de ameaças cibernéticas
+        description: Página de ameaças cibernéticas
+        headers:
+          X-Next-Cursor:
+            type: string
+            description: Cursor da próxima página (ausente na última página)
+          Link:
+            type: string
+            description: URL da próxima página (rel="next")
         schema:
           type: array
           items:
             type: object
+      400:
+        description: Parâmetros de paginação, filtro ou ordenação inválidos
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
     """
-    return jsonify(service.list())
+    try:
+        filters = parse_filters(request.args)
+        sort = parse_sort(request.args, default="id")
+    except ValueError as err:
+        return {"error": str(err)}, 400
+
+    if wants_ndjson():
+        return ndjson_response(service.stream(STREAM_CHUNK_SIZE, filters, sort))
+
+    try:
+        limit, after = parse_page_args(request.args)
+        check_cursor_sort(after, sort)
+    except ValueError as err:
+        return {"error": str(err)}, 400
+
+    return paginated_response(*service.list(limit, after, filters, sort))
 
 @cyber_threat_bp.get("/<int:id>")
 def get_by_id_cyber_threat(id):
@@ -172,13 +572,18 @@ def update_cyber_threat(id):
     tags:
       - CyberThreats
     summary: "Update Cyber Threat"
-    description: "Atualiza as informações de um incidente existente"
+    description: "Atualiza as informações de um incidente existente, numa única instrução UPDATE. Por omissão responde 204 sem corpo; com `Prefer: return=representation` devolve o incidente atualizado."
     parameters:
       - in: path
         name: id
         type: integer
         required: true
         description: ID único da ameaça
+      - in: header
+        name: Prefer
+        type: string
+        required: false
+        enum: ["return=representation", "return=minimal"]
       - in: body
         name: body
         required: true
@@ -205,9 +610,13 @@ def update_cyber_threat(id):
               type: integer
     responses:
       200:
-        description: Ameaça atualizada com sucesso
+        description: "Ameaça atualizada (com `Prefer: return=representation`)"
         schema:
           type: object
+      204:
+        description: Ameaça atualizada
+      400:
+        description: Dados inválidos
       404:
         description: Ameaça não encontrada
         schema:
@@ -216,25 +625,87 @@ def update_cyber_threat(id):
             error:
               type: string
     """
-    data = request.json or {}
-
-    result = service.update(
-        id=id,
-        country=data.get("country"),
-        year=data.get("year"),
-        attack_type=data.get("attack_type"),
-        target_industry=data.get("target_industry"),
-        financial_loss=data.get("financial_loss"),
-        affected_users=data.get("affected_users"),
-        security_vulnerability=data.get("security_vulnerability"),
-        defense_mechanism=data.get("defense_mechanism"),
-        resolution_time=data.get("resolution_time"),
-    )
+    fields, error = validate_incident_fields(request.json or {})
 
-    if result is None:
+    if error is not None:
+        return {"error": error}, 400
+
+    if service.update(id, fields) is None:
         return {"error": "Not found"}, 404
 
-    return jsonify(result)
+    if not wants_representation():
+        return "", 204
+
+    return jsonify(service.get_by_id(id)), 200, {"Preference-Applied": "return=representation"}
+
+@cyber_threat_bp.patch("/<int:id>")
+def patch_cyber_threat(id):
+    """
+    Atualizar parcialmente ameaça cibernética
+    ---
+    tags:
+      - CyberThreats
+    summary: "Patch Cyber Threat"
+    description: "Atualiza só os campos enviados, numa única instrução UPDATE. Por omissão responde 204 sem corpo; com `Prefer: return=representation` devolve o incidente atualizado."
+    parameters:
+      - in: path
+        name: id
+        type: integer
+        required: true
+        description: ID único da ameaça
+      - in: header
+        name: Prefer
+        type: string
+        required: false
+        enum: ["return=representation", "return=minimal"]
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          properties:
+            country:
+              type: string
+            year:
+              type: integer
+            attack_type:
+              type: integer
+            target_industry:
+              type: integer
+            financial_loss:
+              type: number
+            affected_users:
+              type: integer
+            security_vulnerability:
+              type: integer
+            defense_mechanism:
+              type: integer
+            resolution_time:
+              type: integer
+    responses:
+      200:
+        description: "Ameaça atualizada (com `Prefer: return=representation`)"
+        schema:
+          type: object
+      204:
+        description: Ameaça atualizada
+      400:
+        description: Dados inválidos
+      404:
+        description: Ameaça não encontrada
+    """
+    fields, error = validate_incident_fields(request.json or {})
+
+    if error is not None:
+        return {"error": error}, 400
+
+    if service.update(id, fields) is None:
+        return {"error": "Not found"}, 404
+
+    if not wants_representation():
+        return "", 204
+
+    return jsonify(service.get_by_id(id)), 200, {"Preference-Applied": "return=representation"}
 
 @cyber_threat_bp.delete("/<int:id>")
 def delete_cyber_threat(id):
@@ -269,6 +740,47 @@ def delete_cyber_threat(id):
 
     return "", 204
 
+@cyber_threat_bp.get("/breakdown")
+def breakdown():
+    """
+    Análise combinada de ameaças por todas as dimensões
+    ---
+    tags:
+      - CyberThreats
+    summary: "Threat Breakdown"
+    description: "Retorna, numa só resposta, as estatísticas por tipo de ataque, mecanismo de defesa, vulnerabilidade e indústria alvo (calculadas numa única leitura da tabela)"
+    produces:
+      - application/json
+      - application/msgpack
+      - application/vnd.apache.arrow.stream
+      - text/csv
+    responses:
+      200:
+        description: Estatísticas por dimensão
+        schema:
+          type: object
+          properties:
+            total:
+              type: integer
+            attack_types:
+              type: array
+              items:
+                type: object
+            defense_mechanisms:
+              type: array
+              items:
+                type: object
+            security_vulnerabilities:
+              type: array
+              items:
+                type: object
+            target_industries:
+              type: array
+              items:
+                type: object
+    """
+    return jsonify(service.breakdown())
+
 @cyber_threat_bp.get("/attack_types")
 def attack_type_percentage():
     """
@@ -278,6 +790,11 @@ def attack_type_percentage():
       - CyberThreats
     summary: "Threat Analysis by Attack Type"
     description: "Retorna estatísticas das ameaças agrupadas por tipo de ataque"
+    produces:
+      - application/json
+      - application/msgpack
+      - application/vnd.apache.arrow.stream
+      - text/csv
     responses:
       200:
         description: Estatísticas por tipo
@@ -295,6 +812,11 @@ def defense_mechanism_percentage():
       - CyberThreats
     summary: "Threat Analysis by Defense Mechanism"
     description: "Retorna estatísticas das ameaças agrupadas por mecanismo de defesa"
+    produces:
+      - application/json
+      - application/msgpack
+      - application/vnd.apache.arrow.stream
+      - text/csv
     responses:
       200:
         description: Estatísticas por defesa
@@ -312,6 +834,11 @@ def security_vulnerability_percentage():
       - CyberThreats
     summary: "Threat Analysis by Vulnerability"
     description: "Retorna estatísticas das ameaças agrupadas por vulnerabilidade"
+    produces:
+      - application/json
+      - application/msgpack
+      - application/vnd.apache.arrow.stream
+      - text/csv
     responses:
       200:
         description: Estatísticas por vulnerabilidade
@@ -329,6 +856,11 @@ def target_industry_percentage():
       - CyberThreats
     summary: "Threat Analysis by Target Industry"
     description: "Retorna estatísticas das ameaças agrupadas por indústria alvo"
+    produces:
+      - application/json
+      - application/msgpack
+      - application/vnd.apache.arrow.stream
+      - text/csv
     responses:
       200:
         description: Estatísticas por indústria
@@ -258,6 +258,11 @@ def defense_mechanism_statistics():
       - DefenseMechanisms
     summary: "Get Defense Mechanism Statistics"
     description: "Retorna estatísticas e análises sobre os mecanismos de defesa"
+    produces:
+      - application/json
+      - application/msgpack
+      - application/vnd.apache.arrow.stream
+      - text/csv
     responses:
       200:
         description: Estatísticas dos mecanismos de defesa
@@ -0,0 +1,47 @@
+from flask import Blueprint
+from service.ingest_service import IngestService
+from database import db
+
+ingest_bp = Blueprint("ingest", __name__, url_prefix="/ingest")
+service = IngestService(db)
+
+@ingest_bp.get("/<string:ticket>")
+def get_ingest_status(ticket):
+    """
+    Consultar estado de uma escrita assíncrona
+    ---
+    tags:
+      - Ingest
+    summary: "Get Ingest Ticket Status"
+    description: "Estado de um incidente aceite com 202 (INGEST_MODE=async): pending, applied ou rejected."
+    parameters:
+      - in: path
+        name: ticket
+        type: string
+        required: true
+        description: Ticket devolvido pelo POST
+    responses:
+      200:
+        description: Estado do ticket
+        schema:
+          type: object
+          properties:
+            ticket:
+              type: string
+            status:
+              type: string
+              enum: [pending, applied, rejected]
+            error:
+              type: string
+      404:
+        description: Ticket desconhecido (ou já removido do diário)
+    """
+    if not service.enabled:
+        return {"error": "Not found"}, 404
+
+    result = service.status(ticket)
+
+    if result is None:
+        return {"error": "Not found"}, 404
+
+    return result
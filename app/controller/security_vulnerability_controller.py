@@ -222,6 +222,11 @@ def security_vulnerability_statistics():
       - SecurityVulnerabilities
     summary: "Get Security Vulnerability Statistics"
     description: "Retorna estatísticas e análises sobre as vulnerabilidades"
+    produces:
+      - application/json
+      - application/msgpack
+      - application/vnd.apache.arrow.stream
+      - text/csv
     responses:
       200:
         description: Estatísticas das vulnerabilidades
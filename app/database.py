@@ -1,28 +1,209 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import mysql.connector
+from mysql.connector import errors
+from drivers import DRIVERS
 
 load_dotenv()
 
+# Driver MySQL (ver drivers.py): "mysql-connector" ou "pymysql" (modo gevent)
+DB_DRIVER = os.getenv("DB_DRIVER", "mysql-connector")
+
+
+class ConnectionPool:
+    """
+    Pool de conexões MySQL thread-safe.
+
+    - Limita o número de conexões abertas a `size`.
+    - Um checkout espera no máximo `timeout` segundos por uma conexão livre.
+    - Conexões paradas há mais de `recycle` segundos são fechadas e recriadas.
+    - Com `pre_ping`, cada conexão é testada antes de ser entregue; conexões
+      partidas são descartadas em vez de devolvidas ao pool.
+
+    Com o monkeypatch do gevent (aplicado antes de criar o pool), o semáforo
+    e o lock são "green": um greenlet à espera de conexão não bloqueia os
+    outros.
+    """
+
+    def __init__(self, connect, size=10, timeout=30.0, recycle=300.0, pre_ping=True):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []  # pilha (LIFO) de (conexão, instante da última utilização)
+        self._lock = threading.Lock()
+
+    def checkout(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise errors.PoolError(
+                f"No free connection in the pool after {self.timeout}s (size={self.size})"
+            )
+
+        try:
+            return self._take_idle() or self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def checkin(self, conn):
+        if getattr(conn, "unread_result", False):
+            # Resultado não lido (ex.: streaming interrompido pelo cliente):
+            # é mais barato fechar a conexão do que consumir o resto das linhas
+            self._close(conn)
+            self._slots.release()
+            return
+
+        try:
+            # Termina a transação aberta (inclusive leituras) para que o próximo
+            # utilizador não herde locks nem um snapshot antigo
+            conn.rollback()
+        except mysql.connector.Error:
+            self._close(conn)
+        else:
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def reset_after_fork(self):
+        """
+        No processo filho de um fork: esquece as conexões herdadas sem as
+        fechar (os sockets continuam a ser do processo pai) e recria os
+        locks, que podiam estar presos por threads que não existem no filho.
+        """
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def dispose(self):
+        """Fecha todas as conexões paradas no pool."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+
+        for conn, _ in idle:
+            self._close(conn)
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                conn, last_used = self._idle.pop()
+
+            if time.monotonic() - last_used > self.recycle:
+                self._close(conn)
+                continue
+
+            if self.pre_ping and not self._is_alive(conn):
+                self._close(conn)
+                continue
+
+            return conn
+
+    @staticmethod
+    def _is_alive(conn):
+        try:
+            return conn.is_connected()
+        except mysql.connector.Error:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except mysql.connector.Error:
+            pass
+
+
 class Database:
+    """
+    Acesso ao MySQL através do pool. Nenhuma conexão é aberta na criação:
+    a primeira é aberta no primeiro `get_connection`, já no processo que a
+    vai usar (depois do fork, num servidor pre-fork).
+    """
     _instance = None
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
 
-            cls._instance.conn = mysql.connector.connect(
-                host=os.getenv("DB_HOST"),
-                user=os.getenv("DB_USERNAME"),
-                password=os.getenv("DB_PASSWORD"),
-                database=os.getenv("DB_DATABASE"),
-                autocommit=False
+            cls._instance.pool = ConnectionPool(
+                cls._connect,
+                size=int(os.getenv("DB_POOL_SIZE", "10")),
+                timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+                recycle=float(os.getenv("DB_POOL_RECYCLE", "300")),
+                pre_ping=os.getenv("DB_POOL_PRE_PING", "1") != "0"
             )
+            cls._instance._local = threading.local()
+            cls._instance.local_infile = os.getenv("DB_LOCAL_INFILE", "0") == "1"
+
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=cls._instance._after_fork)
 
         return cls._instance
 
+    def _after_fork(self):
+        # Cada processo filho abre as suas próprias conexões
+        self.pool.reset_after_fork()
+        self._local = threading.local()
+
+    @staticmethod
+    def _connect():
+        connect = DRIVERS.get(DB_DRIVER)
+        if connect is None:
+            raise errors.InterfaceError(msg=f"Unknown DB_DRIVER: {DB_DRIVER}")
+
+        return connect(
+            {
+                "host": os.getenv("DB_HOST"),
+                "user": os.getenv("DB_USERNAME"),
+                "password": os.getenv("DB_PASSWORD"),
+                "database": os.getenv("DB_DATABASE"),
+            },
+            # LOAD DATA LOCAL INFILE (importação de incidentes)
+            os.getenv("DB_LOCAL_INFILE", "0") == "1"
+        )
+
     def get_connection(self):
-        return self.conn
+        """
+        Retorna a conexão da thread atual, fazendo checkout no pool na
+        primeira chamada. Todas as chamadas do mesmo request partilham a
+        mesma conexão até `release_connection`.
+        """
+        conn = getattr(self._local, "conn", None)
+
+        if conn is None:
+            conn = self.pool.checkout()
+            self._local.conn = conn
+
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """
+        Checkout de uma conexão exclusiva, independente da conexão da thread.
+        Usado por respostas em streaming, que continuam a ler do MySQL depois
+        de o request ter terminado.
+        """
+        conn = self.pool.checkout()
+
+        try:
+            yield conn
+        finally:
+            self.pool.checkin(conn)
+
+    def release_connection(self):
+        """Devolve ao pool a conexão da thread atual (se existir)."""
+        conn = getattr(self._local, "conn", None)
+
+        if conn is not None:
+            self._local.conn = None
+            self.pool.checkin(conn)
 
 
 db = Database()
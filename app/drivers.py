@@ -0,0 +1,188 @@
+"""
+Drivers MySQL do pool (DB_DRIVER):
+
+- "mysql-connector" (omissão): mysql-connector-python, com a extensão em C.
+- "pymysql": PyMySQL, só Python. Usa os sockets da biblioteca padrão, por
+  isso é compatível com o monkeypatch do gevent (WEB_WORKER_CLASS=gevent).
+
+O resto do código usa sempre a API do mysql-connector: `conn.cursor(
+dictionary=..., buffered=...)`, `is_connected()`, `unread_result` e as
+exceções de mysql.connector (com `errno`). O adaptador de PyMySQL
+traduz essa API e as exceções.
+"""
+import functools
+import tempfile
+import mysql.connector
+from mysql.connector import errors
+from mysql.connector.constants import ClientFlag
+
+try:
+    import pymysql
+    import pymysql.cursors
+    from pymysql.constants import CLIENT
+except ImportError:  # dependência opcional: só necessária com DB_DRIVER=pymysql
+    pymysql = None
+
+
+def connect_mysql_connector(settings: dict, local_infile: bool):
+    options = {}
+
+    # LOAD DATA LOCAL INFILE (importação de incidentes), só para ficheiros
+    # da pasta temporária; o servidor também precisa de local_infile=ON
+    if local_infile:
+        options["allow_local_infile_in_path"] = tempfile.gettempdir()
+
+    return mysql.connector.connect(
+        **settings,
+        autocommit=False,
+        # rowcount de UPDATE conta as linhas encontradas, mesmo sem alterações
+        client_flags=[ClientFlag.FOUND_ROWS],
+        **options
+    )
+
+
+def _translate(error):
+    """
+    Exceção de PyMySQL -> exceção de mysql.connector com o mesmo nome
+    (ambas seguem a PEP 249), com `errno` e `msg`.
+    """
+    errno = error.args[0] if error.args and isinstance(error.args[0], int) else None
+    msg = str(error.args[1]) if len(error.args) > 1 else str(error)
+
+    if not errno:
+        return errors.InterfaceError(msg=msg)
+
+    error_class = getattr(errors, type(error).__name__, errors.DatabaseError)
+    return error_class(msg=msg, errno=errno)
+
+
+def _translated(method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except pymysql.MySQLError as error:
+            raise _translate(error) from error
+
+    return wrapper
+
+
+class PyMySQLCursor:
+    """Cursor de PyMySQL com as exceções de mysql.connector."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @_translated
+    def execute(self, operation, params=None):
+        return self._cursor.execute(operation, params)
+
+    @_translated
+    def executemany(self, operation, seq_params):
+        return self._cursor.executemany(operation, seq_params)
+
+    @_translated
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    @_translated
+    def fetchmany(self, size: int = 1):
+        return self._cursor.fetchmany(size)
+
+    @_translated
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @_translated
+    def close(self):
+        return self._cursor.close()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+
+class PyMySQLConnection:
+    """Conexão PyMySQL com a interface de mysql.connector usada pelos repositórios."""
+
+    # (dictionary, unbuffered) -> classe de cursor de PyMySQL
+    _CURSORS = {
+        (False, False): "Cursor",
+        (True, False): "DictCursor",
+        (False, True): "SSCursor",
+        (True, True): "SSDictCursor",
+    }
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, dictionary: bool = False, buffered: bool = None):
+        # Sem `buffered`, o resultado é lido todo (como os repositórios já fazem)
+        cursor_class = getattr(pymysql.cursors, self._CURSORS[(dictionary, buffered is False)])
+
+        return PyMySQLCursor(self._conn.cursor(cursor_class))
+
+    @_translated
+    def commit(self):
+        self._conn.commit()
+
+    @_translated
+    def rollback(self):
+        self._conn.rollback()
+
+    @_translated
+    def close(self):
+        self._conn.close()
+
+    @property
+    def unread_result(self) -> bool:
+        result = self._conn._result
+        return result is not None and result.unbuffered_active
+
+    def is_connected(self) -> bool:
+        if not self._conn.open:
+            return False
+
+        try:
+            self._conn.ping(reconnect=False)
+        except pymysql.MySQLError:
+            return False
+
+        return True
+
+
+def connect_pymysql(settings: dict, local_infile: bool):
+    if pymysql is None:
+        raise errors.InterfaceError(msg="DB_DRIVER=pymysql requires PyMySQL (pip install PyMySQL)")
+
+    try:
+        conn = pymysql.connect(
+            **settings,
+            charset="utf8mb4",
+            autocommit=False,
+            # rowcount de UPDATE conta as linhas encontradas, mesmo sem alterações
+            client_flag=CLIENT.FOUND_ROWS,
+            # PyMySQL não restringe a pasta: ativar só com DB_LOCAL_INFILE=1
+            local_infile=local_infile,
+        )
+    except pymysql.MySQLError as error:
+        raise _translate(error) from error
+
+    return PyMySQLConnection(conn)
+
+
+DRIVERS = {
+    "mysql-connector": connect_mysql_connector,
+    "pymysql": connect_pymysql,
+}
@@ -0,0 +1,48 @@
+# Configuração do gunicorn (lida por `python serve.py`, ou por
+# `gunicorn "main:create_app(start_background=False, check_schema=True)"` corrido nesta pasta).
+# Todos os valores podem ser alterados por variáveis de ambiente (ver serve.py).
+import os
+import serve
+
+bind = serve.WEB_BIND
+
+# WEB_WORKERS processos (um por núcleo); com gthread, WEB_THREADS threads cada
+worker_class = serve.WEB_WORKER_CLASS
+workers = serve.WEB_WORKERS
+threads = serve.WEB_THREADS
+
+# A app é criada uma vez no master e partilhada pelos workers (copy-on-write);
+# o database.py descarta no filho as conexões herdadas
+preload_app = os.getenv("WEB_PRELOAD", "1") != "0"
+
+if worker_class == "gevent":
+    # gevent: cada worker atende WEB_WORKER_CONNECTIONS clientes com greenlets.
+    # A app tem de ser importada depois do monkeypatch (feito no worker), para
+    # que os locks, o threading.local e os sockets do pool sejam "green"
+    worker_connections = serve.WEB_WORKER_CONNECTIONS
+    preload_app = False
+
+# Segundos que uma conexão HTTP inativa fica aberta (atrás de um proxy,
+# usar um valor maior que o do proxy)
+keepalive = int(os.getenv("WEB_KEEPALIVE", "5"))
+
+# Worker sem resposta durante `timeout` segundos é reiniciado; num reinício
+# (SIGHUP) ou paragem (SIGTERM), os pedidos em curso têm `graceful_timeout`
+timeout = int(os.getenv("WEB_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+
+# Recicla cada worker ao fim de N pedidos (0 = nunca), com jitter para não
+# reiniciarem todos ao mesmo tempo
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "10000"))
+max_requests_jitter = max_requests // 10
+
+# Pool de conexões de cada worker, calculado a partir de workers e threads
+serve.configure_pool(workers, threads)
+
+
+def post_worker_init(worker):
+    # Threads de fundo (ingestão assíncrona, snapshot colunar) em cada worker,
+    # depois do fork
+    import main
+
+    main.start_background_tasks()
@@ -0,0 +1,73 @@
+"""
+Mede o tempo de arranque da API (import de main + create_app) com
+`python -X importtime`, num interpretador novo.
+
+Uso:
+    python importtime.py                 # total e os 15 módulos mais lentos
+    python importtime.py --top 30
+    python importtime.py --budget 300    # termina com código 1 acima de 300 ms
+
+O orçamento por omissão vem de IMPORT_TIME_BUDGET_MS (0 = sem limite).
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "0"))
+
+# create_app sem threads: só interessa o custo de construir a app
+_PROGRAM = """
+import time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.create_app(start_background=False)
+print(f"create_app {imported - started:.6f} {time.perf_counter() - imported:.6f}")
+"""
+
+
+def measure():
+    """Returns: ([(módulo, próprio µs, cumulativo µs)], segundos do import, segundos de create_app)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROGRAM],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        own, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(own), int(cumulative)))
+
+    _, imported, created = result.stdout.split()[-3:]
+
+    return modules, float(imported), float(created)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15, help="nº de módulos a listar")
+    parser.add_argument("--budget", type=float, default=IMPORT_TIME_BUDGET_MS, help="orçamento em ms (0 = sem limite)")
+    args = parser.parse_args()
+
+    modules, imported, created = measure()
+    total_ms = (imported + created) * 1000
+
+    for name, own, cumulative in sorted(modules, key=lambda module: module[1], reverse=True)[:args.top]:
+        print(f"{own / 1000:>8.1f} ms  {cumulative / 1000:>8.1f} ms  {name}")
+
+    print(f"import main: {imported * 1000:.1f} ms, create_app: {created * 1000:.1f} ms, total: {total_ms:.1f} ms")
+
+    if args.budget and total_ms > args.budget:
+        print(f"over budget ({args.budget:.0f} ms)", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,30 @@
-from flask import Flask, jsonify, render_template, request
-from flasgger import Swagger
-import json
+from flask import Flask, current_app, jsonify, render_template
+from flask.cli import with_appcontext
+import click
+import os
 from controller.attack_type_controller import attack_type_bp
 from controller.attack_controller import attack_bp
 from controller.cyber_threat_controller import cyber_threat_bp
 from controller.defense_mechanism_controller import defense_mechanism_bp
 from controller.security_vulnerability_controller import security_vulnerability_bp
 from controller.target_industry_controller import target_industry_bp
+from controller.ingest_controller import ingest_bp
+from controller.analytics_controller import analytics_bp
+from database import db
+import migrations
+from repository.cyber_threat_repository import CyberThreatRepository
+from repository.incident_aggregate_repository import IncidentAggregateRepository
+from repository.incident_sketch_repository import IncidentSketchRepository
+from service.incident_import_service import IncidentImportService, read_csv, read_ndjson
+from service.ingest_service import IngestService
+from utils.columnar_snapshot import ColumnarSnapshot
+from utils.dimension_cache import DimensionCache
+from utils.id_mapper import IdMapper
+from utils.json_provider import FastJSONProvider
+from utils.openapi import OpenAPISpec
 
-app = Flask(__name__, template_folder='templates')
+# Swagger UI e /apispec.json (0 desliga a documentação e não importa o flasgger)
+API_DOCS = os.getenv("API_DOCS", "1") != "0"
 
 # Configuração do Flasgger (Swagger UI) - Design moderno similar a FastAPI
 swagger_config = {
@@ -83,6 +99,14 @@ swagger_template = {
             "name": "AttackTypes",
             "description": "📋 Tipos de Ataques - Classificação e categorização de ataques",
         },
+        {
+            "name": "Analytics",
+            "description": "🧮 Análises - Agrupamentos por qualquer combinação de dimensões (cubo em memória)",
+        },
+        {
+            "name": "Ingest",
+            "description": "📥 Ingestão assíncrona - Estado das escritas aceites com 202 (INGEST_MODE=async)",
+        },
         {
             "name": "TargetIndustries",
             "description": "🏢 Indústrias Alvo - Setores e indústrias sob foco de ataques",
@@ -90,37 +114,11 @@ swagger_template = {
     ]
 }
 
-# Inicializar Swagger com Flasgger
-swagger = Swagger(app, config=swagger_config, template=swagger_template)
-
-# Função para limpar operationId (deixar mais elegante visualmente)
-@app.after_request
-def clean_operation_ids(response):
-    """Remove operationId da especificação Swagger para uma interface mais elegante"""
-    if 'apispec.json' in request.path and 'application/json' in response.content_type:
-        try:
-            spec = response.get_json()
-            if spec and 'paths' in spec:
-                for path in spec['paths'].values():
-                    for method in ['get', 'post', 'put', 'delete', 'patch', 'options']:
-                        if method in path and isinstance(path[method], dict):
-                            # Remove operationId mas mantém outras propriedades
-                            path[method].pop('operationId', None)
-            response.data = json.dumps(spec).encode('utf-8')
-        except Exception:
-            pass  # Se falhar, mantém a resposta original
-    return response
-
-# Registrar blueprints
-app.register_blueprint(attack_type_bp)
-app.register_blueprint(attack_bp)
-app.register_blueprint(cyber_threat_bp)
-app.register_blueprint(defense_mechanism_bp)
-app.register_blueprint(security_vulnerability_bp)
-app.register_blueprint(target_industry_bp)
+# Devolver ao pool a conexão usada pelo request (mesmo em caso de erro)
+def release_db_connection(exception):
+    db.release_connection()
 
 # Rota raiz - Mensagem de boas-vindas
-@app.route("/", methods=["GET"])
 def welcome():
     """
     Rota de boas-vindas da API
@@ -169,12 +167,225 @@ def welcome():
     }), 200
 
 # Rota customizada para servir o template Swagger bonito
-@app.route("/apidocs", methods=["GET"])
 def custom_swagger_ui():
     """
     Interface Swagger UI customizada e modernizada
     """
     return render_template('swagger_ui.html')
 
+def init_docs(app):
+    """
+    Swagger UI e /apispec.json. O flasgger só é importado aqui e a
+    especificação só é gerada no primeiro pedido a /apispec.json.
+    """
+    from flasgger import Swagger
+
+    swagger = Swagger(app, config=swagger_config, template=swagger_template)
+    app.add_url_rule("/apidocs", view_func=custom_swagger_ui, methods=["GET"])
+
+    # Especificação gerada uma só vez (sem operationId) e servida com ETag
+    openapi_spec = OpenAPISpec(swagger, "apispec")
+    openapi_spec.install(app)
+    app.extensions["openapi_spec"] = openapi_spec
+
+# Comando CLI: flask --app main migrate
+@click.command("migrate")
+@with_appcontext
+@click.option("--status", "show_status", is_flag=True, help="Lista as migrações sem aplicar nenhuma.")
+def migrate(show_status):
+    """Aplica as migrações pendentes do esquema (ver migrations.py)."""
+    try:
+        if show_status:
+            for version, description, applied_at in migrations.status(db):
+                click.echo(f"{version:>4}  {str(applied_at or 'pending'):<19}  {description}")
+            return
+
+        count = migrations.migrate(db, echo=click.echo)
+    finally:
+        db.release_connection()
+
+    click.echo(f"{count} migrations applied")
+
+# Comando CLI: flask --app main rebuild-aggregates
+@click.command("rebuild-aggregates")
+@with_appcontext
+def rebuild_aggregates():
+    """Recalcula incident_aggregates a partir de global_cyber_threats."""
+    IncidentAggregateRepository(db).rebuild()
+    db.release_connection()
+    click.echo("incident_aggregates rebuilt")
+
+# Comando CLI: flask --app main rebuild-sketches [--if-dirty]
+@click.command("rebuild-sketches")
+@click.option("--if-dirty", is_flag=True, help="Só recalcula se houve UPDATE/DELETE desde o último recálculo (para cron).")
+@with_appcontext
+def rebuild_sketches(if_dirty):
+    """Recalcula incident_sketches (modo approx=1) a partir de global_cyber_threats."""
+    sketches = IncidentSketchRepository(db)
+
+    if if_dirty and sketches.dirty_since() is None:
+        db.release_connection()
+        click.echo("incident_sketches up to date")
+        return
+
+    sketches.rebuild()
+    db.release_connection()
+    click.echo("incident_sketches rebuilt")
+
+# Comando CLI: flask --app main build-snapshot
+@click.command("build-snapshot")
+@with_appcontext
+def build_snapshot():
+    """Reconstrói já o snapshot colunar de global_cyber_threats (COLUMNAR_SNAPSHOT_PATH)."""
+    snapshot = ColumnarSnapshot(db)
+
+    if not snapshot.enabled:
+        raise click.ClickException("Set COLUMNAR_SNAPSHOT_PATH and install numpy to use the columnar snapshot (not available on Windows)")
+
+    try:
+        built = snapshot.refresh(force=True)
+    finally:
+        db.release_connection()
+
+    click.echo("columnar snapshot rebuilt" if built else "another process is rebuilding the snapshot")
+
+# Comando CLI: flask --app main export-openapi openapi.json
+@click.command("export-openapi")
+@with_appcontext
+@click.argument("path", type=click.Path(dir_okay=False, writable=True))
+def export_openapi(path):
+    """Grava a especificação OpenAPI num ficheiro (servido com OPENAPI_SPEC_PATH)."""
+    openapi_spec = current_app.extensions.get("openapi_spec")
+    if openapi_spec is None:
+        raise click.ClickException("API_DOCS=0: the API documentation is disabled")
+
+    data = openapi_spec.generate()
+
+    with open(path, "wb") as file:
+        file.write(data)
+
+    click.echo(f"{path}: {len(data)} bytes")
+
+# Comando CLI: flask --app main backfill-external-ids
+@click.command("backfill-external-ids")
+@with_appcontext
+def backfill_external_ids():
+    """Grava em external_ids o UUID de todos os registos já existentes."""
+    total = IdMapper(db).backfill()
+    db.release_connection()
+    click.echo(f"external_ids: {total} mappings")
+
+# Comando CLI: flask --app main import-incidents ficheiro.csv
+@click.command("import-incidents")
+@with_appcontext
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "format", type=click.Choice(["csv", "ndjson"]), default=None,
+              help="Formato do ficheiro (por omissão deduzido da extensão).")
+def import_incidents(path, format):
+    """Importa um ficheiro CSV/NDJSON de incidentes com dimensões por nome."""
+    if format is None:
+        format = "ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv"
+
+    importer = IncidentImportService(CyberThreatRepository(db), DimensionCache(db))
+    reader = read_ndjson if format == "ndjson" else read_csv
+
+    with open(path, "rb") as file:
+        for summary in importer.run(reader(file)):
+            click.echo(
+                f"{summary['processed']} rows read, {summary['imported']} imported, "
+                f"{summary['rejected']} rejected"
+            )
+
+    db.release_connection()
+
+    for error in summary["errors"]:
+        click.echo(f"row {error['row']}: {error['error']}", err=True)
+
+    if "error" in summary:
+        raise click.ClickException(summary["error"])
+
+COMMANDS = (
+    migrate,
+    rebuild_aggregates,
+    rebuild_sketches,
+    build_snapshot,
+    export_openapi,
+    backfill_external_ids,
+    import_incidents,
+)
+
+def start_background_tasks():
+    """
+    Threads de cada processo. Num servidor pre-fork com a app carregada
+    antes do fork, devem ser iniciadas em cada worker (depois do fork).
+    """
+    # Com INGEST_MODE=async, passa o diário local para o MySQL
+    IngestService(db).start()
+
+    # Com COLUMNAR_SNAPSHOT_PATH, mantém o snapshot colunar partilhado atualizado
+    ColumnarSnapshot(db).start()
+
+def check_migrations():
+    """
+    Recusa arrancar se houver migrações por aplicar (ex.: dump importado sem
+    `flask --app main migrate`): sem as tabelas de apoio, as escritas e as
+    estatísticas falhariam pedido a pedido.
+    """
+    try:
+        versions = migrations.pending(db)
+    finally:
+        db.release_connection()
+
+    if versions:
+        raise RuntimeError(
+            f"Database schema is out of date (pending migrations: {', '.join(map(str, versions))}). "
+            "Run: flask --app main migrate"
+        )
+
+def create_app(start_background: bool = True, check_schema: bool = False) -> Flask:
+    """
+    Cria a aplicação sem abrir conexões ao MySQL: o pool liga-se no
+    primeiro pedido e as tabelas de lookup (DimensionCache) são carregadas
+    no primeiro uso, já no processo que as vai usar.
+
+    Com `check_schema` (servidores: serve.py e `python main.py`) verifica
+    antes as migrações, com uma conexão que é logo devolvida ao pool (os
+    processos filhos descartam-na depois do fork). Os comandos `flask` não
+    verificam, para que `flask --app main migrate` funcione.
+    """
+    if check_schema:
+        check_migrations()
+
+    app = Flask(__name__, template_folder='templates')
+
+    # Provider JSON: orjson, sem ordenar chaves, Decimal segundo JSON_DECIMAL
+    app.json = FastJSONProvider(app)
+
+    if API_DOCS:
+        init_docs(app)
+
+    app.teardown_appcontext(release_db_connection)
+
+    # Registrar blueprints
+    app.register_blueprint(attack_type_bp)
+    app.register_blueprint(attack_bp)
+    app.register_blueprint(cyber_threat_bp)
+    app.register_blueprint(defense_mechanism_bp)
+    app.register_blueprint(security_vulnerability_bp)
+    app.register_blueprint(target_industry_bp)
+    app.register_blueprint(ingest_bp)
+    app.register_blueprint(analytics_bp)
+
+    app.add_url_rule("/", view_func=welcome, methods=["GET"])
+
+    for command in COMMANDS:
+        app.cli.add_command(command)
+
+    if start_background:
+        start_background_tasks()
+
+    return app
+
+# Servidor de desenvolvimento (reloader e debugger); em produção: python serve.py
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    create_app(check_schema=True).run(debug=True)
\ No newline at end of file
@@ -0,0 +1,253 @@
+"""
+Migrações versionadas do esquema da base de dados.
+
+Cada migração é uma lista de passos idempotentes (verificam o estado atual
+antes de alterar), porque no MySQL as instruções DDL fazem commit implícito:
+se uma migração falhar a meio, basta corrigir a causa e voltar a executar.
+As versões aplicadas ficam na tabela `schema_migrations`.
+
+Uso:
+    flask --app main migrate
+    flask --app main migrate --status
+"""
+from mysql.connector import errors
+from repository.incident_aggregate_repository import IncidentAggregateRepository
+from repository.incident_sketch_repository import IncidentSketchRepository
+from service.ingest_service import IngestService
+from utils.id_mapper import IdMapper
+from utils.incident_cube import IncidentCube
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS `schema_migrations` (
+      `version` int(11) NOT NULL,
+      `description` varchar(255) NOT NULL,
+      `applied_at` timestamp NOT NULL DEFAULT current_timestamp(),
+      PRIMARY KEY (`version`)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+"""
+
+# Tempo (s) à espera de outro processo que esteja a migrar
+LOCK_TIMEOUT = 60
+
+
+def _index_exists(cursor, table: str, name: str) -> bool:
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        LIMIT 1
+        """,
+        (table, name)
+    )
+    return cursor.fetchone() is not None
+
+
+def add_index(table: str, name: str, columns: tuple):
+    def step(db, cursor):
+        if not _index_exists(cursor, table, name):
+            column_list = ", ".join(f"`{column}`" for column in columns)
+            cursor.execute(f"ALTER TABLE `{table}` ADD KEY `{name}` ({column_list})")
+    return step
+
+
+def drop_index(table: str, name: str):
+    def step(db, cursor):
+        if _index_exists(cursor, table, name):
+            cursor.execute(f"ALTER TABLE `{table}` DROP KEY `{name}`")
+    return step
+
+
+def add_column(table: str, name: str, definition: str):
+    def step(db, cursor):
+        cursor.execute(
+            """
+            SELECT 1 FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+            LIMIT 1
+            """,
+            (table, name)
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(f"ALTER TABLE `{table}` ADD COLUMN `{name}` {definition}")
+    return step
+
+
+def execute(sql: str):
+    def step(db, cursor):
+        cursor.execute(sql)
+    return step
+
+
+def _auto_increment_id(db, cursor):
+    # O dump cria global_cyber_threats.Id sem AUTO_INCREMENT
+    cursor.execute(
+        """
+        SELECT EXTRA FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'global_cyber_threats' AND COLUMN_NAME = 'Id'
+        """
+    )
+    row = cursor.fetchone()
+
+    if row is not None and "auto_increment" not in row[0].lower():
+        cursor.execute(
+            "ALTER TABLE `global_cyber_threats` MODIFY `Id` int(11) NOT NULL AUTO_INCREMENT"
+        )
+
+
+def _rebuild_aggregates(db, cursor):
+    IncidentAggregateRepository(db).rebuild()
+
+
+def _create_aggregates_trigger(db, cursor):
+    # Recriado sempre a partir do código (CREATE TRIGGER não tem IF NOT EXISTS no MariaDB antigo)
+    cursor.execute(f"DROP TRIGGER IF EXISTS `{IncidentAggregateRepository.UPDATE_TRIGGER}`")
+    cursor.execute(IncidentAggregateRepository.update_trigger())
+
+
+def _create_change_triggers(db, cursor):
+    for name in IncidentCube.CHANGE_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS `{name}`")
+        cursor.execute(IncidentCube.change_trigger(name))
+
+
+def _rebuild_sketches(db, cursor):
+    IncidentSketchRepository(db).rebuild()
+
+
+# (versão, descrição, passos). Nunca alterar uma migração já publicada:
+# acrescentar uma nova.
+MIGRATIONS = [
+    (1, "Tabelas de apoio da API (agregados, IDs externos, ingestão)", [
+        execute(IncidentAggregateRepository.SCHEMA),
+        execute(IdMapper.SCHEMA),
+        execute(IngestService.APPLIED_SCHEMA),
+    ]),
+    (2, "AUTO_INCREMENT em global_cyber_threats.Id", [
+        _auto_increment_id,
+    ]),
+    (3, "Índices dos filtros das listagens de incidentes", [
+        add_index("global_cyber_threats", "Country_Year", ("Country", "Year")),
+        add_index("global_cyber_threats", "Attack Type_Year", ("Attack Type", "Year")),
+        add_index("global_cyber_threats", "Target Industry_Year", ("Target Industry", "Year")),
+        add_index("global_cyber_threats", "Financial Loss (in Million $)", ("Financial Loss (in Million $)",)),
+        add_index("global_cyber_threats", "Number of Affected Users", ("Number of Affected Users",)),
+    ]),
+    (4, "Índices de cobertura das estatísticas (GROUP BY País/Ano e análise percentual)", [
+        add_index("global_cyber_threats", "Country_Totals", (
+            "Country", "Financial Loss (in Million $)", "Number of Affected Users",
+            "Incident Resolution Time (in Hours)",
+        )),
+        add_index("global_cyber_threats", "Year_Totals", (
+            "Year", "Financial Loss (in Million $)", "Number of Affected Users",
+            "Incident Resolution Time (in Hours)",
+        )),
+        add_index("global_cyber_threats", "Breakdown", (
+            "Attack Type", "Defense Mechanism Used", "Security Vulnerability Type", "Target Industry",
+        )),
+        # `Year_Totals` começa por Year e substitui o índice simples
+        drop_index("global_cyber_threats", "Year"),
+    ]),
+    (5, "Recalcular incident_aggregates", [
+        _rebuild_aggregates,
+    ]),
+    (6, "Sketches do modo aproximado (incident_sketches)", [
+        execute(IncidentSketchRepository.SCHEMA),
+        _rebuild_sketches,
+    ]),
+    (7, "Marca de sketches desatualizados por UPDATE/DELETE (incident_sketches.dirty_since)", [
+        add_column("incident_sketches", "dirty_since", "timestamp NULL DEFAULT NULL"),
+    ]),
+    (8, "Trigger que atualiza incident_aggregates nos UPDATE de global_cyber_threats", [
+        _create_aggregates_trigger,
+        # Corrige UPDATEs feitos entre a versão anterior do código e o trigger
+        _rebuild_aggregates,
+    ]),
+    (9, "Registo das escritas em global_cyber_threats para o cubo (incident_changes)", [
+        execute(IncidentCube.CHANGES_SCHEMA),
+        _create_change_triggers,
+    ]),
+]
+
+
+def _applied(db) -> dict:
+    """
+    {versão: aplicada em} de `schema_migrations` ({} se a tabela ainda não
+    existir). Só lê: não cria a tabela.
+    """
+    conn = db.get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT version, applied_at FROM schema_migrations")
+    except errors.ProgrammingError as err:
+        # 1146: a tabela não existe (dump importado sem migrações)
+        if err.errno != 1146:
+            raise
+        return {}
+
+    return dict(cursor.fetchall())
+
+
+def status(db):
+    """
+    [(versão, descrição, aplicada em ou None)] de todas as migrações (todas
+    por aplicar, se a tabela `schema_migrations` ainda não existir).
+    """
+    applied = _applied(db)
+
+    return [
+        (version, description, applied.get(version))
+        for version, description, _ in MIGRATIONS
+    ]
+
+
+def pending(db) -> list:
+    """
+    Versões de MIGRATIONS ainda não aplicadas (todas, se a tabela
+    `schema_migrations` ainda não existir). Só lê: não cria a tabela.
+    """
+    applied = _applied(db)
+
+    return [version for version, _, _ in MIGRATIONS if version not in applied]
+
+
+def migrate(db, echo=print) -> int:
+    """
+    Aplica, por ordem, as migrações ainda não registadas em
+    `schema_migrations`. Um lock no servidor impede que dois processos
+    migrem ao mesmo tempo. Retorna o nº de migrações aplicadas.
+    """
+    conn = db.get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT GET_LOCK('schema_migrations', %s)", (LOCK_TIMEOUT,))
+    if cursor.fetchone()[0] != 1:
+        raise RuntimeError("Another process is running the migrations")
+
+    try:
+        cursor.execute(SCHEMA)
+        cursor.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+
+        count = 0
+
+        for version, description, steps in MIGRATIONS:
+            if version in applied:
+                continue
+
+            echo(f"Applying {version}: {description}")
+
+            for step in steps:
+                step(db, cursor)
+
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (version, description)
+            )
+            conn.commit()
+            count += 1
+
+        return count
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK('schema_migrations')")
+        cursor.fetchall()
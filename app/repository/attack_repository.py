@@ -1,33 +1,57 @@
+import logging
 import mysql.connector
 from utils.id_mapper import IdMapper
+from repository.base_incident_repository import BaseIncidentRepository
+from utils.filters import compile_filters, compile_sort, sort_position
+from utils.row_mapper import RowMapper, Call, Lookup
 
-class AttackRepository:
+logger = logging.getLogger(__name__)
+
+class AttackRepository(BaseIncidentRepository):
     def __init__(self, db):
-        self.db = db
-        self.id_mapper = IdMapper()
+        super().__init__(db)
+        self.id_mapper = IdMapper(db)
+
+    # Colunas de global_cyber_threats pela ordem dos argumentos de create
+    _COLUMNS = (
+        "Attack Type",
+        "Attack Source",
+        "Target Industry",
+        "Country",
+        "Year",
+        "Financial Loss (in Million $)",
+        "Number of Affected Users",
+    )
+
+    _INSERT = """INSERT INTO global_cyber_threats
+                (`Attack Type`, `Attack Source`, `Target Industry`, Country, Year,
+                `Financial Loss (in Million $)`, `Number of Affected Users`)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)"""
 
-    def create(self, attack_type: int, target_industry: int, 
+    def create(self, attack_type: int, attack_source: int, target_industry: int,
                country: str, year: int, financial_loss: float, affected_users: int):
         conn = self.db.get_connection()
         cursor = conn.cursor(dictionary=True)
 
+        values = (attack_type, attack_source, target_industry, country, year,
+                  financial_loss, affected_users)
+
         try:
-            cursor.execute(
-                """INSERT INTO global_cyber_threats
-                (`Attack Type`, `Target Industry`, Country, Year,
-                `Financial Loss (in Million $)`, `Number of Affected Users`)
-                VALUES (%s, %s, %s, %s, %s, %s)""",
-                (attack_type, target_industry, country, year, 
-                 financial_loss, affected_users)
-            )
+            cursor.execute(self._INSERT, values)
 
-            conn.commit()
             internal_id = cursor.lastrowid
+            added = [dict(zip(self._COLUMNS, values))]
+            self.aggregates.apply(cursor, added=added)
+
             external_id = self.id_mapper.get_external_id(internal_id, 'attack')
 
+            conn.commit()
+            self._after_write(added=added)
+
             return {
                 "id": external_id,
                 "attack_type": attack_type,
+                "attack_source": attack_source,
                 "target_industry": target_industry,
                 "country": country,
                 "year": year,
@@ -35,81 +59,198 @@ class AttackRepository:
                 "affected_users": affected_users
             }
         except:
+            logger.exception("Could not create attack")
+            conn.rollback()
             return None
 
-    def list(self):
+    # Colunas com chave estrangeira: (posição nos argumentos de create, tabela de lookup, nome do campo)
+    _FOREIGN_KEYS = (
+        (0, "Attack_Types", "attack_type"),
+        (1, "Attack_Sources", "attack_source"),
+        (2, "Target_Industries", "target_industry"),
+    )
+
+    def create_many(self, attacks: list[tuple], before_commit=None):
+        """
+        Insere vários ataques (tuplos pela ordem dos argumentos de create)
+        numa só transação, com INSERTs multi-linha.
+
+        Os ataques com chaves estrangeiras desconhecidas, e os que o MySQL
+        recusar (ver `_insert_chunks`), não são inseridos e ficam em
+        {posição: erro}.
+
+        `before_commit(cursor, posições inseridas)`, se dado, corre na mesma
+        transação, antes do commit.
+
+        Retorna (nº de ataques criados, {posição: erro}), ou None se o MySQL
+        recusar o resto da transação (ex.: `before_commit`); nesse caso nada
+        é inserido. Falhas do MySQL (conexão perdida, lock wait, deadlock)
+        são relançadas depois do rollback.
+        """
+        rejected = self.dimensions.unknown_references(attacks, self._FOREIGN_KEYS)
+        positions = [position for position in range(len(attacks)) if position not in rejected]
+        rows = [attacks[position] for position in positions]
+
+        if not rows:
+            return 0, rejected
+
         conn = self.db.get_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor()
+
+        try:
+            inserted = self._insert_chunks(cursor, self._INSERT, rows, positions, rejected)
+
+            added = [dict(zip(self._COLUMNS, attacks[position])) for position in inserted]
+            self.aggregates.apply(cursor, added=added)
+
+            if before_commit is not None:
+                before_commit(cursor, inserted)
+
+            conn.commit()
+            self._after_write(added=added)
+
+            return len(inserted), rejected
+        except (mysql.connector.IntegrityError, mysql.connector.DataError):
+            logger.exception("Attack batch rejected by MySQL")
+            conn.rollback()
+            return None
+        except:
+            conn.rollback()
+            raise
+
+    # Colunas partilhadas por list, get_by_id e stream: (expressão, nome).
+    # Os nomes das dimensões vêm do DimensionCache; o filtro IS NOT NULL
+    # mantém o resultado dos antigos INNER JOIN com as tabelas de lookup.
+    _SELECT_COLUMNS = (
+        ("gct.Id", "internal_id"),
+        ("gct.Country", "Country"),
+        ("gct.Year", "Year"),
+        ("gct.`Financial Loss (in Million $)`", "financial_loss"),
+        ("gct.`Number of Affected Users`", "affected_users"),
+        ("gct.`Incident Resolution Time (in Hours)`", "resolution_time"),
+        ("gct.`Attack Type`", "attack_type_id"),
+        ("gct.`Target Industry`", "target_industry_id"),
+    )
+
+    _SELECT = f"""
+        SELECT {", ".join(expression for expression, _ in _SELECT_COLUMNS)}
+        FROM global_cyber_threats gct
+        WHERE gct.`Attack Type` IS NOT NULL
+            AND gct.`Target Industry` IS NOT NULL
+    """
+
+    # A listagem também fazia JOIN com Attack_Sources
+    _LIST_SELECT = _SELECT + """
+            AND gct.`Attack Source` IS NOT NULL
+    """
+
+    # Tuplo do cursor (ordem de _SELECT_COLUMNS) -> formato da API
+    _MAPPER = RowMapper(
+        [name for _, name in _SELECT_COLUMNS],
+        {
+            "id": Call("attack_id", "internal_id"),
+            "country": "Country",
+            "year": "Year",
+            "financial_loss": Call("float", "financial_loss"),
+            "affected_users": "affected_users",
+            "attack_type": Lookup("attack_types", "attack_type_id"),
+            "target_industry": Lookup("target_industries", "target_industry_id"),
+        }
+    )
+
+    def _row_mapper(self):
+        """Mapper de _MAPPER com os objetos das dimensões (partilhados entre linhas)."""
+        references = self.dimensions.references
+        external_id = self.id_mapper.get_external_id
+
+        return self._MAPPER.bind(
+            attack_id=lambda internal_id: external_id(internal_id, 'attack'),
+            float=float,
+            attack_types=references("Attack_Types", "id", "type", "attack_type"),
+            target_industries=references("Target_Industries", "id", "industry", "target_industry"),
+        )
+
+    def _position(self, sort: str, row: tuple) -> dict:
+        """Posição (cursor `after`) de uma linha de _SELECT."""
+        return sort_position(sort, row[0], dict(zip(self._MAPPER.columns, row)))
+
+    def list(self, limit: int, after: dict | None = None, filters: dict | None = None, sort: str = "-id"):
+        """
+        Retorna uma página de ataques (keyset pagination), filtrada por
+        `filters` (ver utils.filters) e ordenada por `sort`; por omissão do
+        mais recente para o mais antigo.
+
+        Returns:
+            (ataques, posição da última linha ou None se não houver mais páginas)
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
 
+        where, params = compile_filters(filters or {})
+        keyset, keyset_params, order_by = compile_sort(sort, after)
+
+        # Busca uma linha a mais para saber se existe próxima página
         cursor.execute(
-            """
-            SELECT
-                gct.Id AS internal_id,
-                gct.Country,
-                gct.Year,
-                gct.`Financial Loss (in Million $)` AS financial_loss,
-                gct.`Number of Affected Users` AS affected_users,
-                atp.Id AS attack_type_id,
-                atp.Type AS attack_type,
-                src.Id AS attack_source_id,
-                src.Source AS attack_source,
-                ti.Id AS target_industry_id,
-                ti.Industry AS target_industry
-            FROM global_cyber_threats gct
-            JOIN Attack_Types atp ON atp.Id = gct.`Attack Type`
-            JOIN Attack_Sources src ON src.Id = gct.`Attack Source`
-            JOIN Target_Industries ti ON ti.Id = gct.`Target Industry`
-            ORDER BY gct.Id DESC
-            """
+            f"""
+            {self._LIST_SELECT}
+            {where}
+            {keyset}
+            {order_by}
+            LIMIT %s
+            """,
+            (*params, *keyset_params, limit + 1)
         )
         
         rows = cursor.fetchall()
-        result = []
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        result = list(map(self._row_mapper(), rows))
 
-        for row in rows:
-            external_id = self.id_mapper.get_external_id(row["internal_id"], 'attack')
-            result.append({
-                "id": external_id,
-                "country": row["Country"],
-                "year": row["Year"],
-                "financial_loss": float(row["financial_loss"]),
-                "affected_users": row["affected_users"],
-                "attack_type": {
-                    "id": self.id_mapper.get_external_id(row["attack_type_id"], 'attack_type'),
-                    "type": row["attack_type"]
-                },
-                "target_industry": {
-                    "id": self.id_mapper.get_external_id(row["target_industry_id"], 'target_industry'),
-                    "industry": row["target_industry"]
-                }
-            })
+        next_position = self._position(sort, rows[-1]) if has_more else None
+
+        return result, next_position
+
+    def stream(self, chunk_size: int = 1000, filters: dict | None = None, sort: str = "-id"):
+        """
+        Percorre todos os ataques (com os mesmos filtros e ordenação de
+        `list`) com um cursor não bufferizado, lendo `chunk_size` linhas de
+        cada vez. Só um bloco fica em memória.
+        """
+        where, params = compile_filters(filters or {})
+        _, _, order_by = compile_sort(sort, None)
+
+        with self.db.connection() as conn:
+            cursor = conn.cursor(buffered=False)
+
+            cursor.execute(
+                f"""
+                {self._LIST_SELECT}
+                {where}
+                {order_by}
+                """,
+                tuple(params)
+            )
+
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
 
-        return result
+                # Mapper por bloco: apanha recargas do DimensionCache a meio do stream
+                yield from map(self._row_mapper(), rows)
     
     def get_by_id(self, external_id: str):
         conn = self.db.get_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor()
         
-        internal_id = self.id_mapper.get_internal_id(external_id)
+        internal_id = self.id_mapper.get_internal_id(external_id, 'attack')
         if internal_id is None:
             return None
 
         cursor.execute(
-            """
-            SELECT
-                gct.Id AS internal_id,
-                gct.Country,
-                gct.Year,
-                gct.`Financial Loss (in Million $)` AS financial_loss,
-                gct.`Number of Affected Users` AS affected_users,
-                atp.Id AS attack_type_id,
-                atp.Type AS attack_type,
-                ti.Id AS target_industry_id,
-                ti.Industry AS target_industry
-            FROM global_cyber_threats gct
-            JOIN Attack_Types atp ON atp.Id = gct.`Attack Type`
-            JOIN Target_Industries ti ON ti.Id = gct.`Target Industry`
-            WHERE gct.Id = %s
+            f"""
+            {self._SELECT}
+            AND gct.Id = %s
             """,
             (internal_id,)
         )
@@ -118,98 +259,63 @@ class AttackRepository:
         if row is None:
             return None
 
-        return {
-            "id": external_id,
-            "country": row["Country"],
-            "year": row["Year"],
-            "financial_loss": float(row["financial_loss"]),
-            "affected_users": row["affected_users"],
-            "attack_type": {
-                "id": self.id_mapper.get_external_id(row["attack_type_id"], 'attack_type'),
-                "type": row["attack_type"]
-            },
-            "target_industry": {
-                "id": self.id_mapper.get_external_id(row["target_industry_id"], 'target_industry'),
-                "industry": row["target_industry"]
-            }
-        }
+        attack = self._row_mapper()(row)
+        attack["id"] = external_id
+
+        return attack
     
-    def update(self, external_id: str, attack_type: int = None,
-               target_industry: int = None, country: str = None, year: int = None,
-               financial_loss: float = None, affected_users: int = None):
-        conn = self.db.get_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        internal_id = self.id_mapper.get_internal_id(external_id)
-        if internal_id is None:
-            return None
+    # Campo da API -> coluna de global_cyber_threats (atualizações parciais)
+    FIELD_COLUMNS = {
+        "attack_type": "Attack Type",
+        "attack_source": "Attack Source",
+        "target_industry": "Target Industry",
+        "country": "Country",
+        "year": "Year",
+        "financial_loss": "Financial Loss (in Million $)",
+        "affected_users": "Number of Affected Users",
+    }
 
-        # Busca dados atuais
-        cursor.execute(
-            "SELECT * FROM global_cyber_threats WHERE Id = %s",
-            (internal_id,)
-        )
-        current = cursor.fetchone()
-        if current is None:
+    def update(self, external_id: str, fields: dict):
+        """
+        Atualiza só os campos fornecidos ({campo da API: valor}) com um único
+        UPDATE. Retorna True, ou None se o ataque não existir.
+        """
+        internal_id = self.id_mapper.get_internal_id(external_id, 'attack')
+        if internal_id is None:
             return None
 
-        # Atualiza apenas campos fornecidos
-        attack_type = attack_type if attack_type is not None else current['Attack Type']
-        target_industry = target_industry if target_industry is not None else current['Target Industry']
-        country = country if country is not None else current['Country']
-        year = year if year is not None else current['Year']
-        financial_loss = financial_loss if financial_loss is not None else float(current['Financial Loss (in Million $)'])
-        affected_users = affected_users if affected_users is not None else current['Number of Affected Users']
+        changes = {self.FIELD_COLUMNS[field]: value for field, value in fields.items()}
 
-        cursor.execute(
-            """
-            UPDATE global_cyber_threats
-            SET
-                `Attack Type` = %s,
-                `Target Industry` = %s,
-                Country = %s,
-                Year = %s,
-                `Financial Loss (in Million $)` = %s,
-                `Number of Affected Users` = %s
-            WHERE Id = %s
-            """,
-            (attack_type, target_industry, country, year, 
-             financial_loss, affected_users, internal_id)
-        )
-
-        if cursor.rowcount == 0:
+        if not self._update(internal_id, changes):
             return None
-        
-        conn.commit()
 
-        return {
-            "id": external_id,
-            "attack_type": attack_type,
-            "target_industry": target_industry,
-            "country": country,
-            "year": year,
-            "financial_loss": financial_loss,
-            "affected_users": affected_users
-        }
+        return True
     
     def delete(self, external_id: str):
         conn = self.db.get_connection()
         cursor = conn.cursor(dictionary=True)
         
-        internal_id = self.id_mapper.get_internal_id(external_id)
+        internal_id = self.id_mapper.get_internal_id(external_id, 'attack')
         if internal_id is None:
             return False
 
         cursor.execute(
-            "DELETE FROM global_cyber_threats WHERE Id = %s",
+            "SELECT * FROM global_cyber_threats WHERE Id = %s FOR UPDATE",
             (internal_id,)
         )
-
-        if cursor.rowcount == 0:
+        current = cursor.fetchone()
+        if current is None:
             return False
 
-        conn.commit()
+        cursor.execute(
+            "DELETE FROM global_cyber_threats WHERE Id = %s",
+            (internal_id,)
+        )
+        self.aggregates.apply(cursor, removed=[current])
         self.id_mapper.clear_mapping(external_id)
+
+        conn.commit()
+        self._after_write(ids=[internal_id])
         return True
 
     def statistics(self):
@@ -221,114 +327,69 @@ class AttackRepository:
         - Ataques por ano
         - Perda financeira total
         - Total de usuários afetados
-        """
-        conn = self.db.get_connection()
-        cursor = conn.cursor(dictionary=True)
 
-        # Estatísticas gerais
-        cursor.execute(
-            """
-            SELECT
-                COUNT(*) AS total_attacks,
-                SUM(`Financial Loss (in Million $)`) AS total_financial_loss,
-                SUM(`Number of Affected Users`) AS total_affected_users,
-                AVG(`Financial Loss (in Million $)`) AS avg_financial_loss,
-                AVG(`Number of Affected Users`) AS avg_affected_users
-            FROM global_cyber_threats
-            """
-        )
-        general_stats = cursor.fetchone()
+        Lidas de incident_aggregates (O(nº de grupos)), não de global_cyber_threats.
+        """
+        general_stats = self.aggregates.total()
+        total_attacks = general_stats["incident_count"]
 
-        # Ataques por tipo
-        cursor.execute(
-            """
-            SELECT
-                atp.Id AS attack_type_id,
-                atp.Type AS attack_type,
-                COUNT(gct.Id) AS count,
-                SUM(gct.`Financial Loss (in Million $)`) AS total_loss,
-                SUM(gct.`Number of Affected Users`) AS total_users
-            FROM global_cyber_threats gct
-            JOIN Attack_Types atp ON atp.Id = gct.`Attack Type`
-            GROUP BY atp.Id, atp.Type
-            ORDER BY count DESC
-            """
-        )
-        by_type = cursor.fetchall()
+        # Ataques por tipo (só tipos com ataques, como o JOIN original)
+        attack_types = self.dimensions.references("Attack_Types", "id", "type", "attack_type")
+        by_type = [
+            item for item in self.aggregates.by_lookup("attack_type", "Attack_Types", "Type")
+            if item["incident_count"] > 0
+        ]
 
-        # Ataques por país
-        cursor.execute(
-            """
-            SELECT
-                Country,
-                COUNT(*) AS count,
-                SUM(`Financial Loss (in Million $)`) AS total_loss,
-                SUM(`Number of Affected Users`) AS total_users
-            FROM global_cyber_threats
-            GROUP BY Country
-            ORDER BY count DESC
-            LIMIT 10
-            """
-        )
-        by_country = cursor.fetchall()
+        # Ataques por país (top 10)
+        by_country = sorted(
+            self.aggregates.by_dimension("country"),
+            key=lambda item: item["incident_count"],
+            reverse=True
+        )[:10]
 
-        # Ataques por ano
-        cursor.execute(
-            """
-            SELECT
-                Year,
-                COUNT(*) AS count,
-                SUM(`Financial Loss (in Million $)`) AS total_loss,
-                SUM(`Number of Affected Users`) AS total_users
-            FROM global_cyber_threats
-            GROUP BY Year
-            ORDER BY Year DESC
-            """
+        # Ataques por ano (mais recente primeiro, ano desconhecido no fim)
+        by_year = sorted(
+            self.aggregates.by_dimension("year"),
+            key=lambda item: int(item["dimension_key"] or -1),
+            reverse=True
         )
-        by_year = cursor.fetchall()
 
         # Mapear IDs externos
         by_type_mapped = []
         for item in by_type:
             by_type_mapped.append({
-                "attack_type": {
-                    "id": self.id_mapper.get_external_id(item["attack_type_id"], 'attack_type'),
-                    "type": item["attack_type"]
-                },
-                "count": item["count"],
-                "total_financial_loss": float(item["total_loss"] or 0),
-                "total_affected_users": item["total_users"] or 0
+                "attack_type": attack_types[item["id"]],
+                "count": item["incident_count"],
+                "total_financial_loss": float(item["total_financial_loss"]),
+                "total_affected_users": item["total_affected_users"]
             })
 
         return {
             "general": {
-                "total_attacks": general_stats["total_attacks"],
-                "total_financial_loss": float(general_stats["total_financial_loss"] or 0),
-                "total_affected_users": general_stats["total_affected_users"] or 0,
-                "avg_financial_loss": float(general_stats["avg_financial_loss"] or 0),
-                "avg_affected_users": float(general_stats["avg_affected_users"] or 0)
+                "total_attacks": total_attacks,
+                "total_financial_loss": float(general_stats["total_financial_loss"]),
+                "total_affected_users": general_stats["total_affected_users"],
+                # Médias sobre os valores não NULL, como AVG()
+                "avg_financial_loss": float(general_stats["total_financial_loss"] / general_stats["financial_loss_count"]) if general_stats["financial_loss_count"] else 0.0,
+                "avg_affected_users": general_stats["total_affected_users"] / general_stats["affected_users_count"] if general_stats["affected_users_count"] else 0.0
             },
             "by_type": by_type_mapped,
             "by_country": [
                 {
-                    "country": item["Country"],
-                    "count": item["count"],
-                    "total_financial_loss": float(item["total_loss"] or 0),
-                    "total_affected_users": item["total_users"] or 0
+                    "country": item["dimension_key"] or None,
+                    "count": item["incident_count"],
+                    "total_financial_loss": float(item["total_financial_loss"]),
+                    "total_affected_users": item["total_affected_users"]
                 }
                 for item in by_country
             ],
             "by_year": [
                 {
-                    "year": item["Year"],
-                    "count": item["count"],
-                    "total_financial_loss": float(item["total_loss"] or 0),
-                    "total_affected_users": item["total_users"] or 0
+                    "year": int(item["dimension_key"]) if item["dimension_key"] else None,
+                    "count": item["incident_count"],
+                    "total_financial_loss": float(item["total_financial_loss"]),
+                    "total_affected_users": item["total_affected_users"]
                 }
                 for item in by_year
             ]
         }
-
-
-
-
@@ -0,0 +1,122 @@
+import logging
+import os
+from mysql.connector import errors
+from repository.incident_aggregate_repository import IncidentAggregateRepository
+from repository.incident_sketch_repository import IncidentSketchRepository
+from utils.dimension_cache import DimensionCache
+from utils.incident_cube import IncidentCube
+
+# Linhas por INSERT multi-linha em create_many (limitado por max_allowed_packet)
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+
+logger = logging.getLogger(__name__)
+
+class BaseIncidentRepository:
+    """
+    Base dos repositórios que escrevem em global_cyber_threats
+    (CyberThreatRepository e AttackRepository).
+
+    Dentro da transação, as inserções e remoções aplicam os deltas de
+    incident_aggregates (`self.aggregates.apply`); os de UPDATE vêm do trigger
+    IncidentAggregateRepository.UPDATE_TRIGGER. Depois do commit, todas
+    chamam `_after_write`, o único sítio que atualiza as caches derivadas da
+    tabela.
+    """
+
+    # (instante, resultado) de CyberThreatRepository.breakdown, partilhado
+    # por todas as instâncias do processo (ex.: a do importador em main.py)
+    _breakdown = None
+
+    def __init__(self, db):
+        self.db = db
+        self.aggregates = IncidentAggregateRepository(db)
+        self.dimensions = DimensionCache(db)
+        self.cube = IncidentCube(db)
+        self.sketches = IncidentSketchRepository(db)
+
+    def _insert_chunks(self, cursor, insert: str, rows: list, positions: list, rejected: dict) -> list:
+        """
+        Executa `insert` para `rows` (as linhas das `positions` do pedido) em
+        blocos de BULK_CHUNK_SIZE linhas.
+
+        Se o MySQL recusar um bloco (DataError ou IntegrityError), o bloco é
+        desfeito (savepoint) e repetido linha a linha. Cada linha recusada
+        fica em `rejected` com a sua posição. Retorna as posições inseridas.
+        Não faz commit.
+        """
+        inserted = []
+
+        for start in range(0, len(rows), BULK_CHUNK_SIZE):
+            chunk = rows[start:start + BULK_CHUNK_SIZE]
+            chunk_positions = positions[start:start + BULK_CHUNK_SIZE]
+
+            cursor.execute("SAVEPOINT insert_chunk")
+
+            try:
+                cursor.executemany(insert, chunk)
+            except (errors.IntegrityError, errors.DataError):
+                logger.warning("Chunk rejected by MySQL, inserting row by row", exc_info=True)
+                cursor.execute("ROLLBACK TO SAVEPOINT insert_chunk")
+            else:
+                inserted.extend(chunk_positions)
+                continue
+
+            # Cada INSERT de uma linha é atómico: os recusados não deixam nada
+            for position, values in zip(chunk_positions, chunk):
+                try:
+                    cursor.execute(insert, values)
+                except (errors.IntegrityError, errors.DataError):
+                    rejected[position] = "Invalid data"
+                else:
+                    inserted.append(position)
+
+        return inserted
+
+    def _update(self, id: int, changes: dict) -> bool:
+        """
+        Atualiza só as colunas em `changes` ({coluna: valor}) com um único
+        UPDATE e faz commit. Retorna False se o incidente não existir.
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+
+        assignments = ", ".join(f"`{column}` = %s" for column in changes)
+
+        cursor.execute(
+            f"UPDATE global_cyber_threats SET {assignments} WHERE Id = %s",
+            (*changes.values(), id)
+        )
+
+        # Com FOUND_ROWS (drivers.py) conta a linha mesmo sem alterações
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return False
+
+        conn.commit()
+        self._after_write(ids=[id])
+
+        return True
+
+    def _after_write(self, added=(), ids=()):
+        """
+        Chamado depois do commit. `added` são os incidentes inseridos (dicts
+        com os nomes das colunas) e `ids` os Ids dos incidentes alterados ou
+        apagados.
+
+        - Limpa o resultado de `breakdown` (rotas de percentagem). Com o
+          snapshot colunar, `breakdown` volta a ler o snapshot, que só muda
+          na reconstrução seguinte.
+        - Avisa o cubo, que lê incident_changes na consulta seguinte, e apaga
+          as alterações antigas dessa tabela.
+        - Junta `added` aos sketches. Alterações e remoções marcam-nos como
+          desatualizados, porque HyperLogLog e t-digest não removem valores
+          (ver `flask --app main rebuild-sketches --if-dirty`).
+        """
+        BaseIncidentRepository._breakdown = None
+        self.cube.touch()
+        self.cube.prune_changes()
+
+        if ids:
+            self.sketches.mark_dirty()
+        if added:
+            self.sketches.record(added)
@@ -1,132 +1,381 @@
-class CyberThreatRepository:
+import logging
+import os
+import tempfile
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from mysql.connector import errors
+from repository.base_incident_repository import BaseIncidentRepository, BULK_CHUNK_SIZE
+from utils.filters import compile_filters, compile_sort, sort_position
+from utils.row_mapper import RowMapper, Lookup
+from utils.columnar_snapshot import ColumnarSnapshot
+
+# Tempo (s) durante o qual o resultado de `breakdown` é reutilizado pelas
+# rotas de percentagem. As escritas em incidentes deste processo limpam-no
+# (`_after_write`); as de outros processos aparecem ao fim deste tempo. Com
+# o snapshot colunar, o resultado é recalculado do snapshot, que só apanha
+# as escritas (de qualquer processo) na reconstrução seguinte
+BREAKDOWN_CACHE_SECONDS = float(os.getenv("BREAKDOWN_CACHE_SECONDS", "5"))
+
+logger = logging.getLogger(__name__)
+
+class CyberThreatRepository(BaseIncidentRepository):
+    # Dimensões da análise percentual:
+    # (chave na resposta, coluna em global_cyber_threats, tabela de lookup, nome do campo)
+    _BREAKDOWN_DIMENSIONS = (
+        ("attack_types", "Attack Type", "Attack_Types", "Type"),
+        ("defense_mechanisms", "Defense Mechanism Used", "Defense_Mechanisms", "Defense"),
+        ("security_vulnerabilities", "Security Vulnerability Type", "Security_Vulnerabilities", "Vulnerability"),
+        ("target_industries", "Target Industry", "Target_Industries", "Industry"),
+    )
+
     def __init__(self, db):
-        self.db = db
+        super().__init__(db)
+        self.snapshot = ColumnarSnapshot(db)
+
+    # Colunas de global_cyber_threats pela ordem dos argumentos de create
+    _COLUMNS = (
+        "Country",
+        "Year",
+        "Attack Type",
+        "Target Industry",
+        "Financial Loss (in Million $)",
+        "Number of Affected Users",
+        "Security Vulnerability Type",
+        "Defense Mechanism Used",
+        "Incident Resolution Time (in Hours)",
+    )
+
+    _INSERT = """INSERT INTO global_cyber_threats
+                (Country, Year, `Attack Type`, `Target Industry`, `Financial Loss (in Million $)`, `Number of Affected Users`,
+                `Security Vulnerability Type`, `Defense Mechanism Used`, `Incident Resolution Time (in Hours)`)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)"""
+
+    # Colunas com chave estrangeira: (posição nos argumentos de create, tabela de lookup, nome do campo)
+    _FOREIGN_KEYS = (
+        (2, "Attack_Types", "attack_type"),
+        (3, "Target_Industries", "target_industry"),
+        (6, "Security_Vulnerabilities", "security_vulnerability"),
+        (7, "Defense_Mechanisms", "defense_mechanism"),
+    )
 
     def create(self, country: str, year: int, attack_type: int, target_industry: int, financial_loss: float, affected_users: int, security_vulnerability: int, defense_mechanism: int, resolution_time: int):
         conn = self.db.get_connection()
         cursor = conn.cursor(dictionary=True)
 
+        values = (country, year, attack_type, target_industry, financial_loss, affected_users, security_vulnerability, defense_mechanism, resolution_time)
+
         try:
-            cursor.execute(
-                """INSERT INTO global_cyber_threats
-                (Country, Year, `Attack Type`, `Target Industry`, `Financial Loss (in Million $)`, `Number of Affected Users`,
-                `Security Vulnerability Type`, `Defense Mechanism Used`, `Incident Resolution Time (in Hours)`)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                (country, year, attack_type, target_industry, financial_loss, affected_users, security_vulnerability, defense_mechanism, resolution_time)
-            )
+            cursor.execute(self._INSERT, values)
+
+            incident = {"Id": cursor.lastrowid, **dict(zip(self._COLUMNS, values))}
+            self.aggregates.apply(cursor, added=[incident])
 
             conn.commit()
+            self._after_write(added=[incident])
 
-            return {
-                "Id": cursor.lastrowid,
-                "Country": country,
-                "Year": year,
-                "Attack Type": attack_type,
-                "Target Industry": target_industry,
-                "Financial Loss (in Million $)": financial_loss,
-                "Number of Affected Users": affected_users,
-                "Security Vulnerability Type": security_vulnerability,
-                "Defense Mechanism Used": defense_mechanism,
-                "Incident Resolution Time (in Hours)": resolution_time
-            }
+            return incident
         except:
+            logger.exception("Could not create incident")
+            conn.rollback()
             return None
 
-    def list(self):
+    def create_many(self, incidents: list[tuple], before_commit=None):
+        """
+        Insere vários incidentes (tuplos pela ordem dos argumentos de create)
+        numa só transação, com INSERTs multi-linha de BULK_CHUNK_SIZE linhas.
+
+        Os incidentes com chaves estrangeiras desconhecidas, e os que o MySQL
+        recusar (ver `_insert_chunks`), não são inseridos e ficam em
+        {posição: erro}.
+
+        Retorna (nº de incidentes criados, {posição: erro}), ou None se o
+        MySQL recusar o resto da transação (ex.: `before_commit`); nesse caso
+        nada é inserido. Falhas do MySQL (conexão perdida, lock wait,
+        deadlock) são relançadas depois do rollback, para quem chama
+        responder 503 ou repetir.
+
+        `before_commit(cursor, posições inseridas)`, se dado, corre na mesma
+        transação, antes do commit.
+        """
+        rejected = self.dimensions.unknown_references(incidents, self._FOREIGN_KEYS)
+
+        positions = [position for position in range(len(incidents)) if position not in rejected]
+        rows = [incidents[position] for position in positions]
+
+        if not rows:
+            return 0, rejected
+
         conn = self.db.get_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor()
+
+        try:
+            inserted = self._insert_chunks(cursor, self._INSERT, rows, positions, rejected)
+
+            added = [dict(zip(self._COLUMNS, incidents[position])) for position in inserted]
+            self.aggregates.apply(cursor, added=added)
+
+            if before_commit is not None:
+                before_commit(cursor, inserted)
+
+            conn.commit()
+            self._after_write(added=added)
+
+            return len(inserted), rejected
+        except (errors.IntegrityError, errors.DataError):
+            logger.exception("Incident batch rejected by MySQL")
+            conn.rollback()
+            return None
+        except:
+            conn.rollback()
+            raise
+
+    # Colunas preenchidas pela importação de ficheiros (ordem do dump)
+    IMPORT_COLUMNS = (
+        "Country",
+        "Year",
+        "Attack Type",
+        "Target Industry",
+        "Financial Loss (in Million $)",
+        "Number of Affected Users",
+        "Attack Source",
+        "Security Vulnerability Type",
+        "Defense Mechanism Used",
+        "Incident Resolution Time (in Hours)",
+    )
+
+    def import_rows(self, rows: list[tuple]):
+        """
+        Insere um bloco de incidentes já resolvidos (tuplos pela ordem de
+        IMPORT_COLUMNS) e faz commit.
+
+        Com DB_LOCAL_INFILE=1 o bloco é enviado por LOAD DATA LOCAL INFILE a
+        partir de um ficheiro temporário; caso contrário (ou se o LOAD DATA
+        saltar ou truncar linhas) por INSERTs multi-linha de BULK_CHUNK_SIZE
+        linhas, repetidos linha a linha se o MySQL recusar um bloco.
+
+        Retorna {posição no bloco: erro} das linhas recusadas, ou None (e faz
+        rollback do bloco) se a escrita falhar.
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
 
+        columns = ", ".join(f"`{column}`" for column in self.IMPORT_COLUMNS)
+        positions = list(range(len(rows)))
+        rejected = {}
+
+        try:
+            if self.db.local_infile and self._load_data(cursor, columns, rows):
+                inserted = positions
+            else:
+                placeholders = ", ".join(["%s"] * len(self.IMPORT_COLUMNS))
+                inserted = self._insert_chunks(
+                    cursor,
+                    f"INSERT INTO global_cyber_threats ({columns}) VALUES ({placeholders})",
+                    rows, positions, rejected
+                )
+
+            added = [dict(zip(self.IMPORT_COLUMNS, rows[position])) for position in inserted]
+            self.aggregates.apply(cursor, added=added)
+
+            conn.commit()
+            self._after_write(added=added)
+
+            return rejected
+        except:
+            logger.exception("Could not import incident rows")
+            conn.rollback()
+            return None
+
+    @staticmethod
+    def _tsv_field(value) -> str:
+        if value is None:
+            return "\\N"
+
+        return (
+            str(value)
+            .replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+        )
+
+    def _load_data(self, cursor, columns: str, rows: list[tuple]) -> bool:
+        """
+        Envia `rows` por LOAD DATA LOCAL INFILE. Retorna False, sem deixar
+        nada inserido, se o MySQL não inserir todas as linhas tal como vieram:
+        com LOCAL o LOAD DATA comporta-se como IGNORE e, em vez de falhar,
+        salta ou trunca as linhas recusadas com avisos.
+        """
+        # O ficheiro tem de estar na pasta autorizada em Database._connect
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", newline="\n", suffix=".tsv", delete=False
+        ) as file:
+            for values in rows:
+                file.write("\t".join(self._tsv_field(value) for value in values))
+                file.write("\n")
+
+        cursor.execute("SAVEPOINT load_data")
+
+        try:
+            cursor.execute(
+                f"""
+                LOAD DATA LOCAL INFILE %s
+                INTO TABLE global_cyber_threats
+                CHARACTER SET utf8mb4
+                FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+                LINES TERMINATED BY '\\n'
+                ({columns})
+                """,
+                (file.name,)
+            )
+            loaded = cursor.rowcount
+
+            cursor.execute("SELECT @@warning_count")
+            (warnings,) = cursor.fetchone()
+        finally:
+            os.remove(file.name)
+
+        if loaded == len(rows) and warnings == 0:
+            return True
+
+        logger.warning(
+            "LOAD DATA inserted %s of %s rows with %s warnings, inserting row by row",
+            loaded, len(rows), warnings
+        )
+        cursor.execute("ROLLBACK TO SAVEPOINT load_data")
+
+        return False
+
+    # Colunas partilhadas por list, get_by_id e stream: (expressão, nome).
+    # Os nomes das dimensões vêm do DimensionCache; o filtro IS NOT NULL
+    # mantém o resultado dos antigos INNER JOIN com as tabelas de lookup.
+    _SELECT_COLUMNS = (
+        ("gct.Id", "Id"),
+        ("gct.Country", "Country"),
+        ("gct.Year", "Year"),
+        ("gct.`Financial Loss (in Million $)`", "financial_loss"),
+        ("gct.`Number of Affected Users`", "affected_users"),
+        ("gct.`Incident Resolution Time (in Hours)`", "resolution_time"),
+        ("gct.`Attack Type`", "attack_type_id"),
+        ("gct.`Target Industry`", "target_industry_id"),
+        ("gct.`Security Vulnerability Type`", "vulnerability_id"),
+        ("gct.`Defense Mechanism Used`", "defense_mechanism_id"),
+    )
+
+    _SELECT = f"""
+        SELECT {", ".join(expression for expression, _ in _SELECT_COLUMNS)}
+        FROM global_cyber_threats gct
+        WHERE gct.`Attack Type` IS NOT NULL
+            AND gct.`Target Industry` IS NOT NULL
+            AND gct.`Security Vulnerability Type` IS NOT NULL
+            AND gct.`Defense Mechanism Used` IS NOT NULL
+    """
+
+    # Tuplo do cursor (ordem de _SELECT_COLUMNS) -> formato da API
+    _MAPPER = RowMapper(
+        [name for _, name in _SELECT_COLUMNS],
+        {
+            "Id": "Id",
+            "Country": "Country",
+            "Year": "Year",
+            "Financial Loss (in Million $)": "financial_loss",
+            "Number of Affected Users": "affected_users",
+            "Incident Resolution Time (in Hours)": "resolution_time",
+            "Attack Type": Lookup("attack_types", "attack_type_id"),
+            "Target Industry": Lookup("target_industries", "target_industry_id"),
+            "Security Vulnerability Type": Lookup("vulnerabilities", "vulnerability_id"),
+            "Defense Mechanism Used": Lookup("defense_mechanisms", "defense_mechanism_id"),
+        }
+    )
+
+    def _row_mapper(self):
+        """Mapper de _MAPPER com os objetos das dimensões (partilhados entre linhas)."""
+        references = self.dimensions.references
+
+        return self._MAPPER.bind(
+            attack_types=references("Attack_Types", "Id", "Type"),
+            target_industries=references("Target_Industries", "Id", "Industry"),
+            vulnerabilities=references("Security_Vulnerabilities", "Id", "Vulnerability"),
+            defense_mechanisms=references("Defense_Mechanisms", "Id", "Mechanism"),
+        )
+
+    def _position(self, sort: str, row: tuple) -> dict:
+        """Posição (cursor `after`) de uma linha de _SELECT."""
+        return sort_position(sort, row[0], dict(zip(self._MAPPER.columns, row)))
+
+    def list(self, limit: int, after: dict | None = None, filters: dict | None = None, sort: str = "id"):
+        """
+        Retorna uma página de ameaças (keyset pagination), filtrada por
+        `filters` (ver utils.filters) e ordenada por `sort`, com Id como
+        desempate.
+
+        Returns:
+            (ameaças, posição da última linha ou None se não houver mais páginas)
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+
+        where, params = compile_filters(filters or {})
+        keyset, keyset_params, order_by = compile_sort(sort, after)
+
+        # Busca uma linha a mais para saber se existe próxima página
         cursor.execute(
-            """
-            SELECT
-                gct.Id,
-                gct.Country,
-                gct.Year,
-                gct.`Financial Loss (in Million $)` AS financial_loss,
-                gct.`Number of Affected Users` AS affected_users,
-                gct.`Incident Resolution Time (in Hours)` AS resolution_time,
-                atp.Id AS attack_type_id,
-                atp.Type AS attack_type,
-                ti.Id AS target_industry_id,
-                ti.Industry AS target_industry,
-                svt.Id AS vulnerability_id,
-                svt.Vulnerability AS vulnerability,
-                dm.Id AS defense_mechanism_id,
-                dm.Mechanism AS defense_mechanism
-            FROM global_cyber_threats gct
-            JOIN Attack_Types atp
-                ON atp.Id = gct.`Attack Type`
-            JOIN Target_Industries ti
-                ON ti.Id = gct.`Target Industry`
-            JOIN Security_Vulnerabilities svt
-                ON svt.Id = gct.`Security Vulnerability Type`
-            JOIN Defense_Mechanisms dm
-                ON dm.Id = gct.`Defense Mechanism Used`;
-            """)
+            f"""
+            {self._SELECT}
+            {where}
+            {keyset}
+            {order_by}
+            LIMIT %s
+            """,
+            (*params, *keyset_params, limit + 1)
+        )
         
         rows = cursor.fetchall()
-        result = []
-
-        for row in rows:
-            result.append({
-                "Id": row["Id"],
-                "Country": row["Country"],
-                "Year": row["Year"],
-                "Financial Loss (in Million $)": row["financial_loss"],
-                "Number of Affected Users": row["affected_users"],
-                "Incident Resolution Time (in Hours)": row["resolution_time"],
-
-                "Attack Type": {
-                    "Id": row["attack_type_id"],
-                    "Type": row["attack_type"]
-                },
-                "Target Industry": {
-                    "Id": row["target_industry_id"],
-                    "Industry": row["target_industry"]
-                },
-                "Security Vulnerability Type": {
-                    "Id": row["vulnerability_id"],
-                    "Vulnerability": row["vulnerability"]
-                },
-                "Defense Mechanism Used": {
-                    "Id": row["defense_mechanism_id"],
-                    "Mechanism": row["defense_mechanism"]
-                }
-            })
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        result = list(map(self._row_mapper(), rows))
 
-        return result
+        next_position = self._position(sort, rows[-1]) if has_more else None
+
+        return result, next_position
+
+    def stream(self, chunk_size: int = 1000, filters: dict | None = None, sort: str = "id"):
+        """
+        Percorre todas as ameaças (com os mesmos filtros e ordenação de
+        `list`) com um cursor não bufferizado, lendo `chunk_size` linhas de
+        cada vez. Só um bloco fica em memória.
+        """
+        where, params = compile_filters(filters or {})
+        _, _, order_by = compile_sort(sort, None)
+
+        with self.db.connection() as conn:
+            cursor = conn.cursor(buffered=False)
+
+            cursor.execute(
+                f"""
+                {self._SELECT}
+                {where}
+                {order_by}
+                """,
+                tuple(params)
+            )
+
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+
+                # Mapper por bloco: apanha recargas do DimensionCache a meio do stream
+                yield from map(self._row_mapper(), rows)
     
     def get_by_id(self, id: int):
         conn = self.db.get_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor()
 
         cursor.execute(
-            """
-            SELECT
-                gct.Id,
-                gct.Country,
-                gct.Year,
-                gct.`Financial Loss (in Million $)` AS financial_loss,
-                gct.`Number of Affected Users` AS affected_users,
-                gct.`Incident Resolution Time (in Hours)` AS resolution_time,
-                atp.Id AS attack_type_id,
-                atp.Type AS attack_type,
-                ti.Id AS target_industry_id,
-                ti.Industry AS target_industry,
-                svt.Id AS vulnerability_id,
-                svt.Vulnerability AS vulnerability,
-                dm.Id AS defense_mechanism_id,
-                dm.Mechanism AS defense_mechanism
-            FROM global_cyber_threats gct
-            JOIN Attack_Types atp
-                ON atp.Id = gct.`Attack Type`
-            JOIN Target_Industries ti
-                ON ti.Id = gct.`Target Industry`
-            JOIN Security_Vulnerabilities svt
-                ON svt.Id = gct.`Security Vulnerability Type`
-            JOIN Defense_Mechanisms dm
-                ON dm.Id = gct.`Defense Mechanism Used`
-            WHERE gct.Id = %s
+            f"""
+            {self._SELECT}
+            AND gct.Id = %s
             """,
             (id,)
         )
@@ -136,260 +385,173 @@ class CyberThreatRepository:
         if row is None:
             return None
 
-        result = {
-            "Id": row["Id"],
-            "Country": row["Country"],
-            "Year": row["Year"],
-            "Financial Loss (in Million $)": row["financial_loss"],
-            "Number of Affected Users": row["affected_users"],
-            "Incident Resolution Time (in Hours)": row["resolution_time"],
-
-            "Attack Type": {
-                "Id": row["attack_type_id"],
-                "Type": row["attack_type"]
-            },
-            "Target Industry": {
-                "Id": row["target_industry_id"],
-                "Industry": row["target_industry"]
-            },
-            "Security Vulnerability Type": {
-                "Id": row["vulnerability_id"],
-                "Vulnerability": row["vulnerability"]
-            },
-            "Defense Mechanism Used": {
-                "Id": row["defense_mechanism_id"],
-                "Mechanism": row["defense_mechanism"]
-            }
-        }
-        
-        return result
+        return self._row_mapper()(row)
     
-    def update(
-        self, id: int, country: str, year: int, attack_type: int, target_industry: int, financial_loss: float, affected_users: int,
-        security_vulnerability: int, defense_mechanism: int, resolution_time: int
-    ):
-        conn = self.db.get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute(
-            """
-            UPDATE global_cyber_threats
-            SET
-                Country = %s,
-                Year = %s,
-                `Attack Type` = %s,
-                `Target Industry` = %s,
-                `Financial Loss (in Million $)` = %s,
-                `Number of Affected Users` = %s,
-                `Security Vulnerability Type` = %s,
-                `Defense Mechanism Used` = %s,
-                `Incident Resolution Time (in Hours)` = %s
-            WHERE Id = %s
-            """,
-            (
-                country,
-                year,
-                attack_type,
-                target_industry,
-                financial_loss,
-                affected_users,
-                security_vulnerability,
-                defense_mechanism,
-                resolution_time,
-                id
-            )
-        )
+    # Campo da API -> coluna de global_cyber_threats (atualizações parciais)
+    FIELD_COLUMNS = {
+        "country": "Country",
+        "year": "Year",
+        "attack_type": "Attack Type",
+        "target_industry": "Target Industry",
+        "financial_loss": "Financial Loss (in Million $)",
+        "affected_users": "Number of Affected Users",
+        "security_vulnerability": "Security Vulnerability Type",
+        "defense_mechanism": "Defense Mechanism Used",
+        "resolution_time": "Incident Resolution Time (in Hours)",
+    }
+
+    def update(self, id: int, fields: dict):
+        """
+        Atualiza só os campos fornecidos ({campo da API: valor}) com um único
+        UPDATE. Retorna True, ou None se o incidente não existir.
+        """
+        changes = {self.FIELD_COLUMNS[field]: value for field, value in fields.items()}
+
+        if not self._update(id, changes):
+            return None
 
-        conn.commit()
+        return True
 
-        return {
-            "Id": id,
-            "Country": country,
-            "Year": year,
-            "Attack Type": attack_type,
-            "Target Industry": target_industry,
-            "Financial Loss (in Million $)": financial_loss,
-            "Number of Affected Users": affected_users,
-            "Security Vulnerability Type": security_vulnerability,
-            "Defense Mechanism Used": defense_mechanism,
-            "Incident Resolution Time (in Hours)": resolution_time
-        }
-    
     def delete(self, id: int):
         conn = self.db.get_connection()
         cursor = conn.cursor(dictionary=True)
 
         cursor.execute(
-            "DELETE FROM global_cyber_threats WHERE id = %s",
+            "SELECT * FROM global_cyber_threats WHERE Id = %s FOR UPDATE",
             (id,)
         )
+        current = cursor.fetchone()
 
-        if cursor.rowcount == 0:
+        if current is None:
             return False
 
-        conn.commit()
-        return True
-    
-    def attack_type_percentage(self):
-        conn = self.db.get_connection()
-        cursor = conn.cursor(dictionary=True)
-
         cursor.execute(
-            """
-            SELECT
-                atp.Id AS attack_type_id,
-                atp.Type AS attack_type,
-                COUNT(gct.Id) AS total_attacks,
-                COALESCE(
-                    (
-                        COUNT(gct.Id) /
-                        NULLIF(
-                            (SELECT COUNT(*) FROM global_cyber_threats),
-                            0
-                        )
-                    ) * 100,
-                    0
-                ) AS percentage
-            FROM global_cyber_threats gct
-            RIGHT JOIN Attack_Types atp
-                ON atp.Id = gct.`Attack Type`
-            GROUP BY atp.Id, atp.Type
-            ORDER BY percentage DESC
-            """
+            "DELETE FROM global_cyber_threats WHERE id = %s",
+            (id,)
         )
+        self.aggregates.apply(cursor, removed=[current])
 
-        rows = cursor.fetchall()
-        result = []
-
-        for row in rows:
-            result.append({
-                "Id": row["attack_type_id"],
-                "Type": row["attack_type"],
-                "Total": row["total_attacks"],
-                "Percentage": float(row["percentage"])
-            })
+        conn.commit()
+        self._after_write(ids=[id])
+        return True
+    
+    def breakdown(self):
+        """
+        Contagens e percentagens de ameaças por tipo de ataque, mecanismo de
+        defesa, vulnerabilidade e indústria alvo, calculadas numa só leitura
+        de global_cyber_threats.
+
+        O resultado é reutilizado durante BREAKDOWN_CACHE_SECONDS, para que o
+        dashboard possa chamar as quatro rotas de percentagem seguidas. Com o
+        snapshot colunar ativo é eventualmente consistente: pode ficar
+        atrasado até COLUMNAR_SNAPSHOT_SECONDS, mesmo depois de escritas
+        deste processo.
+        """
+        cached = BaseIncidentRepository._breakdown
+
+        if cached is not None and time.monotonic() - cached[0] < BREAKDOWN_CACHE_SECONDS:
+            return cached[1]
+
+        result = self._compute_breakdown()
+        BaseIncidentRepository._breakdown = (time.monotonic(), result)
 
         return result
-    
-    def defense_mechanism_percentage(self):
+
+    def _breakdown_counts(self):
+        """(total, {dimensão: {Id: nº de ameaças}}) numa só varredura de global_cyber_threats."""
         conn = self.db.get_connection()
         cursor = conn.cursor(dictionary=True)
 
+        # Agrupa pelas quatro dimensões ao mesmo tempo. O número de grupos é
+        # limitado pelo produto das tabelas de lookup (algumas centenas),
+        # não pelo tamanho de global_cyber_threats.
         cursor.execute(
-            """
+            f"""
             SELECT
-                dfm.Id AS defense_mechanism_id,
-                dfm.Mechanism AS defense_mechanism,
-                COUNT(gct.Id) AS total_attacks,
-                COALESCE(
-                    (
-                        COUNT(gct.Id) /
-                        NULLIF(
-                            (SELECT COUNT(*) FROM global_cyber_threats),
-                            0
-                        )
-                    ) * 100,
-                    0
-                ) AS percentage
-            FROM global_cyber_threats gct
-            RIGHT JOIN Defense_Mechanisms dfm
-                ON dfm.Id = gct.`Defense Mechanism Used`
-            GROUP BY dfm.Id, dfm.Mechanism
-            ORDER BY percentage DESC
+                {", ".join(f"`{column}` AS {key}" for key, column, _, _ in self._BREAKDOWN_DIMENSIONS)},
+                COUNT(*) AS total
+            FROM global_cyber_threats
+            GROUP BY {", ".join(key for key, _, _, _ in self._BREAKDOWN_DIMENSIONS)}
             """
         )
-
-        rows = cursor.fetchall()
-        result = []
-
-        for row in rows:
-            result.append({
-                "Id": row["defense_mechanism_id"],
-                "Defense": row["defense_mechanism"],
-                "Total": row["total_attacks"],
-                "Percentage": float(row["percentage"])
+        groups = cursor.fetchall()
+
+        total = sum(group["total"] for group in groups)
+        counts = {key: {} for key, _, _, _ in self._BREAKDOWN_DIMENSIONS}
+
+        for group in groups:
+            for key, dimension_counts in counts.items():
+                value = group[key]
+                dimension_counts[value] = dimension_counts.get(value, 0) + group["total"]
+
+        return total, counts
+
+    # Coluna do snapshot colunar de cada dimensão da análise percentual
+    _SNAPSHOT_COLUMNS = {
+        "attack_types": "attack_type",
+        "defense_mechanisms": "defense_mechanism",
+        "security_vulnerabilities": "security_vulnerability",
+        "target_industries": "target_industry",
+    }
+
+    def _compute_breakdown(self):
+        snapshot = self.snapshot.current()
+
+        if snapshot is not None:
+            # Contagens vetorizadas sobre o snapshot partilhado, sem ir ao MySQL
+            total = len(snapshot)
+            counts = {key: snapshot.counts(column) for key, column in self._SNAPSHOT_COLUMNS.items()}
+        else:
+            total, counts = self._breakdown_counts()
+
+        # Todas as linhas das tabelas de lookup (inclui valores sem ameaças,
+        # como o RIGHT JOIN das consultas originais), lidas do DimensionCache
+        lookups = [
+            {"dimension": key, "Id": id, "name": name}
+            for key, _, table, _ in self._BREAKDOWN_DIMENSIONS
+            for id, name in self.dimensions.all(table).items()
+        ]
+
+        labels = {key: label for key, _, _, label in self._BREAKDOWN_DIMENSIONS}
+        result = {"total": total}
+
+        for key in counts:
+            result[key] = []
+
+        for lookup in lookups:
+            key = lookup["dimension"]
+            count = counts[key].get(lookup["Id"], 0)
+
+            result[key].append({
+                "Id": lookup["Id"],
+                labels[key]: lookup["name"],
+                "Total": count,
+                "Percentage": self._percentage(count, total)
             })
 
+        for key in counts:
+            result[key].sort(key=lambda item: item["Percentage"], reverse=True)
+
         return result
-    
-    def security_vulnerability_percentage(self):
-        conn = self.db.get_connection()
-        cursor = conn.cursor(dictionary=True)
 
-        cursor.execute(
-            """
-            SELECT
-                scv.Id AS security_vulnerability_id,
-                scv.Vulnerability AS security_vulnerability,
-                COUNT(gct.Id) AS total_attacks,
-                COALESCE(
-                    (
-                        COUNT(gct.Id) /
-                        NULLIF(
-                            (SELECT COUNT(*) FROM global_cyber_threats),
-                            0
-                        )
-                    ) * 100,
-                    0
-                ) AS percentage
-            FROM global_cyber_threats gct
-            RIGHT JOIN Security_Vulnerabilities scv
-                ON scv.Id = gct.`Security Vulnerability Type`
-            GROUP BY scv.Id, scv.Vulnerability
-            ORDER BY percentage DESC
-            """
-        )
+    @staticmethod
+    def _percentage(count: int, total: int) -> float:
+        # Mesmo arredondamento que o MySQL usava em COUNT / total * 100
+        # (divisão com 4 casas decimais, meio para cima)
+        if total == 0:
+            return 0.0
 
-        rows = cursor.fetchall()
-        result = []
-
-        for row in rows:
-            result.append({
-                "Id": row["security_vulnerability_id"],
-                "Vulnerability": row["security_vulnerability"],
-                "Total": row["total_attacks"],
-                "Percentage": float(row["percentage"])
-            })
+        ratio = (Decimal(count) / Decimal(total)).quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)
+        return float(ratio * 100)
 
-        return result
+    def attack_type_percentage(self):
+        return self.breakdown()["attack_types"]
+    
+    def defense_mechanism_percentage(self):
+        return self.breakdown()["defense_mechanisms"]
+    
+    def security_vulnerability_percentage(self):
+        return self.breakdown()["security_vulnerabilities"]
     
     def target_industry_percentage(self):
-        conn = self.db.get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute(
-            """
-            SELECT
-                tgi.Id AS target_industry_id,
-                tgi.Industry AS target_industry,
-                COUNT(gct.Id) AS total_attacks,
-                COALESCE(
-                    (
-                        COUNT(gct.Id) /
-                        NULLIF(
-                            (SELECT COUNT(*) FROM global_cyber_threats),
-                            0
-                        )
-                    ) * 100,
-                    0
-                ) AS percentage
-            FROM global_cyber_threats gct
-            RIGHT JOIN Target_Industries tgi
-                ON tgi.Id = gct.`Target Industry`
-            GROUP BY tgi.Id, tgi.Industry
-            ORDER BY percentage DESC
-            """
-        )
-
-        rows = cursor.fetchall()
-        result = []
-
-        for row in rows:
-            result.append({
-                "Id": row["target_industry_id"],
-                "Industry": row["target_industry"],
-                "Total": row["total_attacks"],
-                "Percentage": float(row["percentage"])
-            })
-
-        return result
\ No newline at end of file
+        return self.breakdown()["target_industries"]
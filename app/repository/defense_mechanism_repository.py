@@ -1,10 +1,14 @@
 import mysql.connector
+from utils.dimension_cache import DimensionCache
 from utils.id_mapper import IdMapper
+from repository.incident_aggregate_repository import IncidentAggregateRepository
 
 class DefenseMechanismRepository:
     def __init__(self, db):
         self.db = db
-        self.id_mapper = IdMapper()
+        self.dimensions = DimensionCache(db)
+        self.id_mapper = IdMapper(db)
+        self.aggregates = IncidentAggregateRepository(db)
 
     def create(self, mechanism: str):
         conn = self.db.get_connection()
@@ -15,10 +19,12 @@ class DefenseMechanismRepository:
             (mechanism,)
         )
 
-        conn.commit()
         internal_id = cursor.lastrowid
         external_id = self.id_mapper.get_external_id(internal_id, 'defense')
 
+        conn.commit()
+        self.dimensions.invalidate()
+
         return {
             "id": external_id,
             "mechanism": mechanism
@@ -43,7 +49,7 @@ class DefenseMechanismRepository:
         conn = self.db.get_connection()
         cursor = conn.cursor(dictionary=True)
         
-        internal_id = self.id_mapper.get_internal_id(external_id)
+        internal_id = self.id_mapper.get_internal_id(external_id, 'defense')
         if internal_id is None:
             return None
 
@@ -65,7 +71,7 @@ class DefenseMechanismRepository:
         conn = self.db.get_connection()
         cursor = conn.cursor(dictionary=True)
         
-        internal_id = self.id_mapper.get_internal_id(external_id)
+        internal_id = self.id_mapper.get_internal_id(external_id, 'defense')
         if internal_id is None:
             return None
 
@@ -78,6 +84,7 @@ class DefenseMechanismRepository:
             return None
         
         conn.commit()
+        self.dimensions.invalidate()
 
         return {
             "id": external_id,
@@ -88,7 +95,7 @@ class DefenseMechanismRepository:
         conn = self.db.get_connection()
         cursor = conn.cursor(dictionary=True)
         
-        internal_id = self.id_mapper.get_internal_id(external_id)
+        internal_id = self.id_mapper.get_internal_id(external_id, 'defense')
         if internal_id is None:
             return False
 
@@ -101,8 +108,10 @@ class DefenseMechanismRepository:
             if cursor.rowcount == 0:
                 return False
 
-            conn.commit()
             self.id_mapper.clear_mapping(external_id)
+
+            conn.commit()
+            self.dimensions.invalidate()
             return True
 
         except mysql.connector.Error as err:
@@ -119,48 +128,30 @@ class DefenseMechanismRepository:
         - Total de mecanismos
         - Uso de cada mecanismo em ataques
         - Efetividade (baseado em tempo de resolução)
-        """
-        conn = self.db.get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # Total de mecanismos
-        cursor.execute("SELECT COUNT(*) AS total FROM Defense_Mechanisms")
-        total = cursor.fetchone()["total"]
 
-        # Uso de cada mecanismo em ataques
-        cursor.execute(
-            """
-            SELECT
-                dm.Id AS defense_mechanism_id,
-                dm.Mechanism AS mechanism,
-                COUNT(gct.Id) AS usage_count,
-                AVG(gct.`Incident Resolution Time (in Hours)`) AS avg_resolution_time,
-                SUM(gct.`Financial Loss (in Million $)`) AS total_financial_loss,
-                SUM(gct.`Number of Affected Users`) AS total_affected_users
-            FROM Defense_Mechanisms dm
-            LEFT JOIN global_cyber_threats gct ON gct.`Defense Mechanism Used` = dm.Id
-            GROUP BY dm.Id, dm.Mechanism
-            ORDER BY usage_count DESC
-            """
-        )
-        usage_stats = cursor.fetchall()
+        O uso por mecanismo é lido de incident_aggregates, sem varrer global_cyber_threats.
+        """
+        usage_stats = self.aggregates.by_lookup("defense_mechanism", "Defense_Mechanisms", "Mechanism")
 
         result = {
-            "total_defense_mechanisms": total,
+            "total_defense_mechanisms": len(usage_stats),
             "mechanisms": []
         }
 
         for item in usage_stats:
-            external_id = self.id_mapper.get_external_id(item["defense_mechanism_id"], 'defense')
+            external_id = self.id_mapper.get_external_id(item["id"], 'defense')
+            usage_count = item["incident_count"]
+
             result["mechanisms"].append({
                 "defense_mechanism": {
                     "id": external_id,
-                    "mechanism": item["mechanism"]
+                    "mechanism": item["name"]
                 },
-                "usage_count": item["usage_count"] or 0,
-                "avg_resolution_time_hours": float(item["avg_resolution_time"] or 0),
-                "total_financial_loss": float(item["total_financial_loss"] or 0),
-                "total_affected_users": item["total_affected_users"] or 0
+                "usage_count": usage_count,
+                # Média sobre os tempos não NULL, como AVG()
+                "avg_resolution_time_hours": item["total_resolution_hours"] / item["resolution_hours_count"] if item["resolution_hours_count"] else 0.0,
+                "total_financial_loss": float(item["total_financial_loss"]),
+                "total_affected_users": item["total_affected_users"]
             })
 
-        return result
\ No newline at end of file
+        return result
@@ -0,0 +1,318 @@
+from decimal import Decimal
+
+class IncidentAggregateRepository:
+    """
+    Tabela `incident_aggregates`: contagem e somas de global_cyber_threats por
+    tipo de ataque, indústria, vulnerabilidade, defesa, país e ano (mais uma
+    linha 'total').
+
+    Cada soma tem a contagem dos seus valores não NULL (`*_count`): as médias
+    dividem por ela, como AVG() no MySQL, e não por incident_count.
+
+    As inserções e remoções em global_cyber_threats chamam `apply` antes do
+    commit, na mesma transação; os UPDATE são contados pelo trigger
+    UPDATE_TRIGGER (migração 8). Por isso as estatísticas leem O(nº de
+    grupos) linhas em vez de varrer a tabela de incidentes.
+    """
+
+    TOTAL = "total"
+
+    # dimensão -> coluna em global_cyber_threats
+    DIMENSIONS = {
+        "attack_type": "Attack Type",
+        "target_industry": "Target Industry",
+        "security_vulnerability": "Security Vulnerability Type",
+        "defense_mechanism": "Defense Mechanism Used",
+        "country": "Country",
+        "year": "Year",
+    }
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS `incident_aggregates` (
+          `dimension` varchar(32) NOT NULL,
+          `dimension_key` varchar(50) NOT NULL,
+          `incident_count` bigint(20) NOT NULL DEFAULT 0,
+          `total_financial_loss` decimal(20,2) NOT NULL DEFAULT 0,
+          `total_affected_users` bigint(20) NOT NULL DEFAULT 0,
+          `total_resolution_hours` bigint(20) NOT NULL DEFAULT 0,
+          `financial_loss_count` bigint(20) NOT NULL DEFAULT 0,
+          `affected_users_count` bigint(20) NOT NULL DEFAULT 0,
+          `resolution_hours_count` bigint(20) NOT NULL DEFAULT 0,
+          PRIMARY KEY (`dimension`, `dimension_key`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    @staticmethod
+    def _key(value) -> str:
+        # NULL é guardado como '' (a chave primária não aceita NULL)
+        return "" if value is None else str(value)
+
+    def apply(self, cursor, added=(), removed=()):
+        """
+        Soma as linhas `added` e subtrai as linhas `removed` dos agregados.
+
+        Cada linha é um dict com os nomes das colunas de global_cyber_threats
+        (como devolvido por `SELECT *`). Não faz commit: quem chama faz.
+        """
+        deltas = {}
+
+        for rows, sign in ((added, 1), (removed, -1)):
+            for row in rows:
+                loss = row.get("Financial Loss (in Million $)")
+                users = row.get("Number of Affected Users")
+                hours = row.get("Incident Resolution Time (in Hours)")
+
+                keys = [(self.TOTAL, "")]
+                keys.extend(
+                    (dimension, self._key(row.get(column)))
+                    for dimension, column in self.DIMENSIONS.items()
+                )
+
+                for key in keys:
+                    delta = deltas.setdefault(key, [0, Decimal(0), 0, 0, 0, 0, 0])
+                    delta[0] += sign
+
+                    if loss is not None:
+                        delta[1] += sign * Decimal(str(loss))
+                        delta[4] += sign
+
+                    if users is not None:
+                        delta[2] += sign * users
+                        delta[5] += sign
+
+                    if hours is not None:
+                        delta[3] += sign * hours
+                        delta[6] += sign
+
+        # Dimensões que não mudaram (ex.: UPDATE de uma só coluna) dão delta zero
+        deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+
+        if not deltas:
+            return
+
+        # Ordem fixa das chaves para que escritas concorrentes bloqueiem as
+        # linhas sempre pela mesma ordem (evita deadlocks)
+        cursor.executemany(
+            """
+            INSERT INTO incident_aggregates
+                (dimension, dimension_key, incident_count, total_financial_loss,
+                 total_affected_users, total_resolution_hours, financial_loss_count,
+                 affected_users_count, resolution_hours_count)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                incident_count = incident_count + VALUES(incident_count),
+                total_financial_loss = total_financial_loss + VALUES(total_financial_loss),
+                total_affected_users = total_affected_users + VALUES(total_affected_users),
+                total_resolution_hours = total_resolution_hours + VALUES(total_resolution_hours),
+                financial_loss_count = financial_loss_count + VALUES(financial_loss_count),
+                affected_users_count = affected_users_count + VALUES(affected_users_count),
+                resolution_hours_count = resolution_hours_count + VALUES(resolution_hours_count)
+            """,
+            [key + tuple(delta) for key, delta in sorted(deltas.items())]
+        )
+
+    # Mantém os agregados nos UPDATE de global_cyber_threats, dentro da
+    # própria instrução (uma só ida ao MySQL). INSERT e DELETE continuam a
+    # usar `apply`, que já tem as linhas em memória.
+    UPDATE_TRIGGER = "incident_aggregates_update"
+
+    # Métricas: (soma, contagem de não NULL, coluna em global_cyber_threats)
+    _METRICS = (
+        ("total_financial_loss", "financial_loss_count", "Financial Loss (in Million $)"),
+        ("total_affected_users", "affected_users_count", "Number of Affected Users"),
+        ("total_resolution_hours", "resolution_hours_count", "Incident Resolution Time (in Hours)"),
+    )
+
+    @classmethod
+    def _trigger_upsert(cls, dimension: str, key: str, count: str, metrics: list) -> str:
+        """INSERT ... ON DUPLICATE KEY UPDATE de `apply` com expressões SQL."""
+        columns = ["incident_count"]
+        for total, not_null, _ in cls._METRICS:
+            columns += [total, not_null]
+
+        values = [count]
+        for total_delta, count_delta in metrics:
+            values += [total_delta, count_delta]
+
+        return f"""
+                INSERT INTO incident_aggregates (dimension, dimension_key, {", ".join(columns)})
+                VALUES ('{dimension}', {key}, {", ".join(values)})
+                ON DUPLICATE KEY UPDATE
+                    {", ".join(f"{column} = {column} + VALUES({column})" for column in columns)};"""
+
+    @classmethod
+    def update_trigger(cls) -> str:
+        """
+        CREATE TRIGGER (AFTER UPDATE) que subtrai a linha antiga (OLD) e soma
+        a nova (NEW) nos grupos cuja chave ou métricas mudaram. As chaves são
+        atualizadas pela ordem de `apply` (dimensão, depois chave), para que
+        as escritas concorrentes bloqueiem as linhas sempre pela mesma ordem.
+        """
+        def key(row, column):
+            return f"COALESCE(CAST({row}.`{column}` AS CHAR), '')"
+
+        def metrics(row, sign):
+            return [
+                (f"{sign}COALESCE({row}.`{column}`, 0)", f"{sign}({row}.`{column}` IS NOT NULL)")
+                for _, _, column in cls._METRICS
+            ]
+
+        difference = [
+            (f"COALESCE(NEW.`{column}`, 0) - COALESCE(OLD.`{column}`, 0)",
+             f"(NEW.`{column}` IS NOT NULL) - (OLD.`{column}` IS NOT NULL)")
+            for _, _, column in cls._METRICS
+        ]
+
+        metrics_changed = " OR ".join(
+            f"NOT (OLD.`{column}` <=> NEW.`{column}`)" for _, _, column in cls._METRICS
+        )
+
+        groups = [(cls.TOTAL, None)] + list(cls.DIMENSIONS.items())
+        statements = []
+
+        for dimension, column in sorted(groups):
+            if column is None:
+                statements.append(f"""
+            IF metrics_changed THEN{cls._trigger_upsert(dimension, "''", "0", difference)}
+            END IF;""")
+                continue
+
+            old_key, new_key = key("OLD", column), key("NEW", column)
+            remove = cls._trigger_upsert(dimension, old_key, "-1", metrics("OLD", "-"))
+            add = cls._trigger_upsert(dimension, new_key, "1", metrics("NEW", ""))
+
+            statements.append(f"""
+            IF NOT (OLD.`{column}` <=> NEW.`{column}`) THEN
+                IF {old_key} < {new_key} THEN{remove}{add}
+                ELSE{add}{remove}
+                END IF;
+            ELSEIF metrics_changed THEN{cls._trigger_upsert(dimension, new_key, "0", difference)}
+            END IF;""")
+
+        return f"""
+        CREATE TRIGGER `{cls.UPDATE_TRIGGER}` AFTER UPDATE ON global_cyber_threats
+        FOR EACH ROW
+        BEGIN
+            DECLARE metrics_changed BOOLEAN;
+            SET metrics_changed = {metrics_changed};
+            {"".join(statements)}
+        END
+        """
+
+    def rebuild(self):
+        """
+        Recalcula a tabela inteira a partir de global_cyber_threats (cria-a se
+        não existir). As escritas em global_cyber_threats esperam pelo fim da
+        reconstrução, que corre numa só transação.
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(self.SCHEMA)
+        cursor.execute("DELETE FROM incident_aggregates")
+
+        groups = [(self.TOTAL, "''")]
+        groups.extend(
+            (dimension, f"COALESCE(CAST(`{column}` AS CHAR), '')")
+            for dimension, column in self.DIMENSIONS.items()
+        )
+
+        for dimension, key_expression in groups:
+            cursor.execute(
+                f"""
+                INSERT INTO incident_aggregates
+                    (dimension, dimension_key, incident_count, total_financial_loss,
+                     total_affected_users, total_resolution_hours, financial_loss_count,
+                     affected_users_count, resolution_hours_count)
+                SELECT
+                    %s,
+                    {key_expression} AS dimension_key,
+                    COUNT(*),
+                    COALESCE(SUM(`Financial Loss (in Million $)`), 0),
+                    COALESCE(SUM(`Number of Affected Users`), 0),
+                    COALESCE(SUM(`Incident Resolution Time (in Hours)`), 0),
+                    COUNT(`Financial Loss (in Million $)`),
+                    COUNT(`Number of Affected Users`),
+                    COUNT(`Incident Resolution Time (in Hours)`)
+                FROM global_cyber_threats
+                GROUP BY dimension_key
+                """,
+                (dimension,)
+            )
+
+        conn.commit()
+
+    def total(self):
+        conn = self.db.get_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        cursor.execute(
+            """
+            SELECT incident_count, total_financial_loss, total_affected_users, total_resolution_hours,
+                   financial_loss_count, affected_users_count, resolution_hours_count
+            FROM incident_aggregates
+            WHERE dimension = %s AND dimension_key = ''
+            """,
+            (self.TOTAL,)
+        )
+
+        return cursor.fetchone() or {
+            "incident_count": 0,
+            "total_financial_loss": Decimal(0),
+            "total_affected_users": 0,
+            "total_resolution_hours": 0,
+            "financial_loss_count": 0,
+            "affected_users_count": 0,
+            "resolution_hours_count": 0
+        }
+
+    def by_dimension(self, dimension: str):
+        """Linhas (dimension_key, incident_count, totais) de uma dimensão, sem grupos vazios."""
+        conn = self.db.get_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        cursor.execute(
+            """
+            SELECT dimension_key, incident_count, total_financial_loss,
+                   total_affected_users, total_resolution_hours, financial_loss_count,
+                   affected_users_count, resolution_hours_count
+            FROM incident_aggregates
+            WHERE dimension = %s AND incident_count > 0
+            """,
+            (dimension,)
+        )
+
+        return cursor.fetchall()
+
+    def by_lookup(self, dimension: str, table: str, name_column: str):
+        """
+        Agregados de uma dimensão ligada a uma tabela de lookup, incluindo os
+        valores sem incidentes (como um LEFT JOIN a partir do lookup).
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        cursor.execute(
+            f"""
+            SELECT
+                lkp.Id AS id,
+                lkp.`{name_column}` AS name,
+                COALESCE(agg.incident_count, 0) AS incident_count,
+                COALESCE(agg.total_financial_loss, 0) AS total_financial_loss,
+                COALESCE(agg.total_affected_users, 0) AS total_affected_users,
+                COALESCE(agg.total_resolution_hours, 0) AS total_resolution_hours,
+                COALESCE(agg.financial_loss_count, 0) AS financial_loss_count,
+                COALESCE(agg.affected_users_count, 0) AS affected_users_count,
+                COALESCE(agg.resolution_hours_count, 0) AS resolution_hours_count
+            FROM {table} lkp
+            LEFT JOIN incident_aggregates agg
+                ON agg.dimension = %s AND agg.dimension_key = CAST(lkp.Id AS CHAR)
+            ORDER BY incident_count DESC
+            """,
+            (dimension,)
+        )
+
+        return cursor.fetchall()
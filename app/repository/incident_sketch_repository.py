@@ -0,0 +1,392 @@
+import logging
+import os
+import threading
+import time
+from utils.sketches import HyperLogLog, TDigest
+
+# Segundos entre envios dos sketches acumulados por este processo para o MySQL
+SKETCH_FLUSH_SECONDS = float(os.getenv("SKETCH_FLUSH_SECONDS", "5"))
+
+# Segundos durante os quais os sketches lidos do MySQL são reutilizados
+SKETCH_CACHE_SECONDS = float(os.getenv("SKETCH_CACHE_SECONDS", "5"))
+
+logger = logging.getLogger(__name__)
+
+
+class IncidentSketch:
+    """Sketches de um grupo: países distintos, quantis de perda e de tempo de resolução."""
+
+    __slots__ = ("count", "countries", "financial_loss", "resolution_time")
+
+    def __init__(self, count=0, countries=None, financial_loss=None, resolution_time=None):
+        self.count = count
+        self.countries = countries or HyperLogLog()
+        self.financial_loss = financial_loss or TDigest()
+        self.resolution_time = resolution_time or TDigest()
+
+    def add(self, row: dict):
+        self.count += 1
+
+        country = row.get("Country")
+        if country is not None:
+            # Como a collation do MySQL: sem distinguir maiúsculas
+            self.countries.add(str(country).strip().casefold())
+
+        loss = row.get("Financial Loss (in Million $)")
+        if loss is not None:
+            self.financial_loss.add(loss)
+
+        hours = row.get("Incident Resolution Time (in Hours)")
+        if hours is not None:
+            self.resolution_time.add(hours)
+
+    def merge(self, other: "IncidentSketch"):
+        self.count += other.count
+        self.countries.merge(other.countries)
+        self.financial_loss.merge(other.financial_loss)
+        self.resolution_time.merge(other.resolution_time)
+
+
+class IncidentSketchRepository:
+    """
+    Tabela `incident_sketches`: um IncidentSketch por defesa, vulnerabilidade
+    e total, para o modo aproximado de `/analytics/cube` (`approx=1`).
+
+    As criações de incidentes chamam `record` depois do commit. Cada processo
+    acumula os seus sketches em memória e junta-os aos do MySQL
+    (`flush`, a cada SKETCH_FLUSH_SECONDS ou antes de uma leitura); como os
+    sketches se juntam sem perda, o resultado é o mesmo que se todos os
+    processos escrevessem num só.
+
+    Os sketches só crescem: HyperLogLog e t-digest não removem valores. Por
+    isso UPDATE e DELETE chamam `mark_dirty`, que grava em `dirty_since` (na
+    linha do total) o instante da primeira alteração ainda não refletida. O
+    que estava por enviar perde-se se o processo terminar. `rebuild`
+    recalcula tudo a partir de global_cyber_threats e limpa a marca (ver
+    `flask --app main rebuild-sketches --if-dirty`).
+    """
+    _instance = None
+
+    TOTAL = "total"
+
+    # dimensão -> coluna em global_cyber_threats
+    DIMENSIONS = {
+        "defense_mechanism": "Defense Mechanism Used",
+        "security_vulnerability": "Security Vulnerability Type",
+    }
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS `incident_sketches` (
+          `dimension` varchar(32) NOT NULL,
+          `dimension_key` varchar(50) NOT NULL,
+          `incident_count` bigint(20) NOT NULL DEFAULT 0,
+          `countries` blob NOT NULL,
+          `financial_loss` mediumblob NOT NULL,
+          `resolution_time` mediumblob NOT NULL,
+          `dirty_since` timestamp NULL DEFAULT NULL,
+          PRIMARY KEY (`dimension`, `dimension_key`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+    """
+
+    def __new__(cls, db=None):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance.db = db
+            cls._instance._pending = {}
+            cls._instance._dirty = False
+            cls._instance._flushed_at = time.monotonic()
+            cls._instance._cache = None
+            cls._instance._dirty_since = None
+            cls._instance._cached_at = 0.0
+            cls._instance._lock = threading.Lock()
+
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=cls._instance._after_fork)
+
+        return cls._instance
+
+    def _after_fork(self):
+        # Os sketches pendentes são gravados pelo processo pai; o filho
+        # começa vazio para não os contar duas vezes
+        self._pending = {}
+        self._dirty = False
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _keys(self, row: dict):
+        # NULL é guardado como '' (como em incident_aggregates)
+        yield self.TOTAL, ""
+
+        for dimension, column in self.DIMENSIONS.items():
+            value = row.get(column)
+            yield dimension, "" if value is None else str(value)
+
+    def _add(self, sketches: dict, rows):
+        for row in rows:
+            for key in self._keys(row):
+                sketch = sketches.get(key)
+                if sketch is None:
+                    sketch = sketches[key] = IncidentSketch()
+                sketch.add(row)
+
+    def record(self, rows):
+        """
+        Acrescenta incidentes já gravados (dicts com os nomes das colunas) aos
+        sketches deste processo. Nunca lança exceções: chamado depois do commit.
+        """
+        try:
+            with self._lock:
+                self._add(self._pending, rows)
+                due = time.monotonic() - self._flushed_at >= SKETCH_FLUSH_SECONDS
+
+            if due:
+                self.flush()
+        except Exception:
+            logger.exception("Could not record incident sketches")
+
+    def mark_dirty(self):
+        """
+        Regista que um incidente foi alterado ou apagado depois de entrar nos
+        sketches (gravado no próximo `flush`). Nunca lança exceções: chamado
+        depois do commit.
+        """
+        try:
+            with self._lock:
+                self._dirty = True
+                due = time.monotonic() - self._flushed_at >= SKETCH_FLUSH_SECONDS
+
+            if due:
+                self.flush()
+        except Exception:
+            logger.exception("Could not mark incident sketches as dirty")
+
+    # Marca a linha do total (criada vazia se não existir) com o instante da
+    # primeira alteração; as seguintes não a mudam
+    _MARK_DIRTY = """
+        INSERT INTO incident_sketches
+            (dimension, dimension_key, incident_count, countries, financial_loss, resolution_time, dirty_since)
+        VALUES (%s, '', %s, %s, %s, %s, CURRENT_TIMESTAMP)
+        ON DUPLICATE KEY UPDATE dirty_since = COALESCE(dirty_since, VALUES(dirty_since))
+    """
+
+    def flush(self):
+        """Junta os sketches pendentes deste processo aos do MySQL."""
+        with self._lock:
+            pending = self._pending
+            dirty = self._dirty
+            self._pending = {}
+            self._dirty = False
+            self._flushed_at = time.monotonic()
+
+        if not pending and not dirty:
+            return
+
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            if pending:
+                self._merge(cursor, pending)
+            if dirty:
+                cursor.execute(self._MARK_DIRTY, (self.TOTAL, *self._to_row(IncidentSketch())))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+
+            # Volta a juntar aos pendentes para a próxima tentativa
+            with self._lock:
+                self._dirty = self._dirty or dirty
+                for key, sketch in pending.items():
+                    current = self._pending.get(key)
+                    if current is not None:
+                        sketch.merge(current)
+                    self._pending[key] = sketch
+            raise
+
+        self._cache = None
+
+    def _merge(self, cursor, sketches: dict):
+        keys = sorted(sketches)
+
+        # Ordem fixa das chaves (como em incident_aggregates) para evitar deadlocks
+        placeholders = ", ".join(["(%s, %s)"] * len(keys))
+        cursor.execute(
+            f"""
+            SELECT dimension, dimension_key, incident_count, countries, financial_loss, resolution_time
+            FROM incident_sketches
+            WHERE (dimension, dimension_key) IN ({placeholders})
+            ORDER BY dimension, dimension_key
+            FOR UPDATE
+            """,
+            tuple(value for key in keys for value in key)
+        )
+
+        # Os sketches recebidos não são alterados (voltam aos pendentes se falhar)
+        merged = dict(sketches)
+        for dimension, dimension_key, *stored in cursor.fetchall():
+            sketch = self._from_row(stored)
+            sketch.merge(sketches[(dimension, dimension_key)])
+            merged[(dimension, dimension_key)] = sketch
+
+        cursor.executemany(
+            """
+            INSERT INTO incident_sketches
+                (dimension, dimension_key, incident_count, countries, financial_loss, resolution_time)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                incident_count = VALUES(incident_count),
+                countries = VALUES(countries),
+                financial_loss = VALUES(financial_loss),
+                resolution_time = VALUES(resolution_time)
+            """,
+            [key + self._to_row(merged[key]) for key in keys]
+        )
+
+    @staticmethod
+    def _to_row(sketch: IncidentSketch) -> tuple:
+        return (
+            sketch.count,
+            sketch.countries.to_bytes(),
+            sketch.financial_loss.to_bytes(),
+            sketch.resolution_time.to_bytes(),
+        )
+
+    @staticmethod
+    def _from_row(row) -> IncidentSketch:
+        count, countries, financial_loss, resolution_time = row
+
+        return IncidentSketch(
+            count,
+            HyperLogLog.from_bytes(bytes(countries)),
+            TDigest.from_bytes(bytes(financial_loss)),
+            TDigest.from_bytes(bytes(resolution_time)),
+        )
+
+    def rebuild(self, chunk_size: int = 10000):
+        """
+        Recalcula a tabela inteira a partir de global_cyber_threats (cria-a se
+        não existir) e limpa `dirty_since`. Os sketches pendentes deste
+        processo são descartados.
+        """
+        columns = ("Country", "Financial Loss (in Million $)", "Incident Resolution Time (in Hours)")
+        columns += tuple(self.DIMENSIONS.values())
+
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(self.SCHEMA)
+
+        # A linha do total existe sempre, mesmo sem incidentes: as escritas
+        # da API FastAPI só marcam `dirty_since` nela
+        sketches = {(self.TOTAL, ""): IncidentSketch()}
+        last_id = 0
+
+        # Lido por blocos de Id para não manter o resultado inteiro em memória
+        while True:
+            cursor.execute(
+                "SELECT Id, " + ", ".join(f"`{column}`" for column in columns)
+                + " FROM global_cyber_threats WHERE Id > %s ORDER BY Id LIMIT %s",
+                (last_id, chunk_size)
+            )
+            rows = cursor.fetchall()
+
+            if not rows:
+                break
+
+            last_id = rows[-1][0]
+            self._add(sketches, (dict(zip(columns, row[1:])) for row in rows))
+
+        with self._lock:
+            self._pending = {}
+            self._dirty = False
+
+        cursor.execute("DELETE FROM incident_sketches")
+        self._merge(cursor, sketches)
+        conn.commit()
+
+        self._cache = None
+
+    def load(self) -> dict:
+        """{(dimensão, chave): IncidentSketch}, com cache de SKETCH_CACHE_SECONDS."""
+        cache = self._cache
+
+        if cache is not None and time.monotonic() - self._cached_at < SKETCH_CACHE_SECONDS:
+            return cache
+
+        self.flush()
+
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT dimension, dimension_key, incident_count, countries, financial_loss, resolution_time, dirty_since
+            FROM incident_sketches
+            """
+        )
+
+        cache = {}
+        dirty_since = None
+
+        for dimension, dimension_key, *stored, row_dirty_since in cursor.fetchall():
+            cache[(dimension, dimension_key)] = self._from_row(stored)
+            if dimension == self.TOTAL:
+                dirty_since = row_dirty_since
+
+        self._cache = cache
+        self._dirty_since = dirty_since
+        self._cached_at = time.monotonic()
+
+        return cache
+
+    def dirty_since(self):
+        """
+        Instante (datetime) da primeira alteração ou remoção de incidentes
+        ainda não refletida nos sketches, ou None. Usa a cache de `load`.
+        """
+        self.load()
+        return self._dirty_since
+
+    # Métricas do modo aproximado -> (sketch, quantil)
+    METRICS = {
+        "count": ("count", None),
+        "distinct_countries": ("countries", None),
+        "p50_loss": ("financial_loss", 0.50),
+        "p95_loss": ("financial_loss", 0.95),
+        "p99_loss": ("financial_loss", 0.99),
+        "p50_resolution": ("resolution_time", 0.50),
+        "p95_resolution": ("resolution_time", 0.95),
+        "p99_resolution": ("resolution_time", 0.99),
+    }
+
+    def query(self, group_by: list, metrics: list):
+        """
+        Métricas aproximadas do total (group_by vazio) ou por uma das
+        DIMENSIONS, no formato de IncidentCube.query. O custo não depende do
+        nº de incidentes.
+        """
+        dimension = group_by[0] if group_by else self.TOTAL
+
+        results = []
+        for (row_dimension, dimension_key), sketch in self.load().items():
+            if row_dimension != dimension or sketch.count == 0:
+                continue
+
+            key = {}
+            if group_by:
+                key[dimension] = int(dimension_key) if dimension_key else None
+
+            item = {"key": key}
+            for metric in metrics:
+                attribute, q = self.METRICS[metric]
+
+                if attribute == "count":
+                    item[metric] = sketch.count
+                elif attribute == "countries":
+                    item[metric] = sketch.countries.count()
+                else:
+                    item[metric] = getattr(sketch, attribute).quantile(q)
+
+            results.append((sketch.count, item))
+
+        results.sort(key=lambda result: result[0], reverse=True)
+
+        return [item for _, item in results]
@@ -1,10 +1,14 @@
 import mysql.connector
+from utils.dimension_cache import DimensionCache
 from utils.id_mapper import IdMapper
+from repository.incident_aggregate_repository import IncidentAggregateRepository
 
 class SecurityVulnerabilityRepository:
     def __init__(self, db):
         self.db = db
-        self.id_mapper = IdMapper()
+        self.dimensions = DimensionCache(db)
+        self.id_mapper = IdMapper(db)
+        self.aggregates = IncidentAggregateRepository(db)
 
     def create(self, vulnerability: str):
         conn = self.db.get_connection()
@@ -15,10 +19,12 @@ class SecurityVulnerabilityRepository:
             (vulnerability,)
         )
 
-        conn.commit()
         internal_id = cursor.lastrowid
         external_id = self.id_mapper.get_external_id(internal_id, 'vulnerability')
 
+        conn.commit()
+        self.dimensions.invalidate()
+
         return {
             "id": external_id,
             "vulnerability": vulnerability
@@ -43,7 +49,7 @@ class SecurityVulnerabilityRepository:
         conn = self.db.get_connection()
         cursor = conn.cursor(dictionary=True)
         
-        internal_id = self.id_mapper.get_internal_id(external_id)
+        internal_id = self.id_mapper.get_internal_id(external_id, 'vulnerability')
         if internal_id is None:
             return None
 
@@ -65,7 +71,7 @@ class SecurityVulnerabilityRepository:
         conn = self.db.get_connection()
         cursor = conn.cursor(dictionary=True)
         
-        internal_id = self.id_mapper.get_internal_id(external_id)
+        internal_id = self.id_mapper.get_internal_id(external_id, 'vulnerability')
         if internal_id is None:
             return None
 
@@ -78,6 +84,7 @@ class SecurityVulnerabilityRepository:
             return None
         
         conn.commit()
+        self.dimensions.invalidate()
 
         return {
             "id": external_id,
@@ -88,7 +95,7 @@ class SecurityVulnerabilityRepository:
         conn = self.db.get_connection()
         cursor = conn.cursor(dictionary=True)
         
-        internal_id = self.id_mapper.get_internal_id(external_id)
+        internal_id = self.id_mapper.get_internal_id(external_id, 'vulnerability')
         if internal_id is None:
             return False
 
@@ -101,8 +108,10 @@ class SecurityVulnerabilityRepository:
             if cursor.rowcount == 0:
                 return False
 
-            conn.commit()
             self.id_mapper.clear_mapping(external_id)
+
+            conn.commit()
+            self.dimensions.invalidate()
             return True
 
         except mysql.connector.Error as err:
@@ -119,50 +128,31 @@ class SecurityVulnerabilityRepository:
         - Total de vulnerabilidades
         - Uso de cada vulnerabilidade em ataques
         - Impacto financeiro por vulnerabilidade
-        """
-        conn = self.db.get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # Total de vulnerabilidades
-        cursor.execute("SELECT COUNT(*) AS total FROM Security_Vulnerabilities")
-        total = cursor.fetchone()["total"]
 
-        # Uso de cada vulnerabilidade em ataques
-        cursor.execute(
-            """
-            SELECT
-                sv.Id AS vulnerability_id,
-                sv.Vulnerability AS vulnerability,
-                COUNT(gct.Id) AS usage_count,
-                SUM(gct.`Financial Loss (in Million $)`) AS total_financial_loss,
-                AVG(gct.`Financial Loss (in Million $)`) AS avg_financial_loss,
-                SUM(gct.`Number of Affected Users`) AS total_affected_users,
-                AVG(gct.`Number of Affected Users`) AS avg_affected_users
-            FROM Security_Vulnerabilities sv
-            LEFT JOIN global_cyber_threats gct ON gct.`Security Vulnerability Type` = sv.Id
-            GROUP BY sv.Id, sv.Vulnerability
-            ORDER BY usage_count DESC
-            """
-        )
-        usage_stats = cursor.fetchall()
+        O uso por vulnerabilidade é lido de incident_aggregates, sem varrer global_cyber_threats.
+        """
+        usage_stats = self.aggregates.by_lookup("security_vulnerability", "Security_Vulnerabilities", "Vulnerability")
 
         result = {
-            "total_vulnerabilities": total,
+            "total_vulnerabilities": len(usage_stats),
             "vulnerabilities": []
         }
 
         for item in usage_stats:
-            external_id = self.id_mapper.get_external_id(item["vulnerability_id"], 'vulnerability')
+            external_id = self.id_mapper.get_external_id(item["id"], 'vulnerability')
+            usage_count = item["incident_count"]
+
             result["vulnerabilities"].append({
                 "vulnerability": {
                     "id": external_id,
-                    "vulnerability": item["vulnerability"]
+                    "vulnerability": item["name"]
                 },
-                "usage_count": item["usage_count"] or 0,
-                "total_financial_loss": float(item["total_financial_loss"] or 0),
-                "avg_financial_loss": float(item["avg_financial_loss"] or 0),
-                "total_affected_users": item["total_affected_users"] or 0,
-                "avg_affected_users": float(item["avg_affected_users"] or 0)
+                "usage_count": usage_count,
+                "total_financial_loss": float(item["total_financial_loss"]),
+                # Médias sobre os valores não NULL, como AVG()
+                "avg_financial_loss": float(item["total_financial_loss"] / item["financial_loss_count"]) if item["financial_loss_count"] else 0.0,
+                "total_affected_users": item["total_affected_users"],
+                "avg_affected_users": item["total_affected_users"] / item["affected_users_count"] if item["affected_users_count"] else 0.0
             })
 
-        return result
\ No newline at end of file
+        return result
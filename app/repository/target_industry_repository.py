@@ -1,8 +1,10 @@
 import mysql.connector
+from utils.dimension_cache import DimensionCache
 
 class TargetIndustryRepository:
     def __init__(self, db):
         self.db = db
+        self.dimensions = DimensionCache(db)
 
     def create(self, industry: str):
         conn = self.db.get_connection()
@@ -14,6 +16,7 @@ class TargetIndustryRepository:
         )
 
         conn.commit()
+        self.dimensions.invalidate()
 
         return {
             "id": cursor.lastrowid,
@@ -51,6 +54,7 @@ class TargetIndustryRepository:
             return None
         
         conn.commit()
+        self.dimensions.invalidate()
 
         return {
             "id": id,
@@ -71,6 +75,7 @@ class TargetIndustryRepository:
                 return False
 
             conn.commit()
+            self.dimensions.invalidate()
             return True
 
         except mysql.connector.Error as err:
@@ -0,0 +1,107 @@
+"""
+Servidor de produção da API (em vez de `python main.py`, que usa o
+servidor de desenvolvimento do Werkzeug com o debugger ligado).
+
+Uso:
+    python serve.py
+
+Com gunicorn (Linux/macOS) corre WEB_WORKERS processos com WEB_THREADS
+threads cada (configuração em gunicorn.conf.py), ou, com
+WEB_WORKER_CLASS=gevent, WEB_WORKER_CONNECTIONS greenlets por processo.
+Sem gunicorn (Windows) usa waitress: um processo com WEB_THREADS threads.
+"""
+import os
+import sys
+from dotenv import load_dotenv
+
+# O .env é lido antes de calcular DB_POOL_SIZE, que o database.py lê no import
+load_dotenv()
+
+# Endereço de escuta (host:porta)
+WEB_BIND = os.getenv("WEB_BIND", "0.0.0.0:5000")
+
+# Modelo dos workers do gunicorn: "gthread" (threads) ou "gevent"
+# (greenlets; requer gevent e usa o driver PyMySQL, ver drivers.py)
+WEB_WORKER_CLASS = os.getenv("WEB_WORKER_CLASS", "gthread")
+
+# Processos (gunicorn): um por núcleo; as threads cobrem a espera pelo MySQL
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "0")) or os.cpu_count() or 1
+
+# Threads por processo
+WEB_THREADS = int(os.getenv("WEB_THREADS", "4"))
+
+# Clientes em simultâneo por processo no modo gevent
+WEB_WORKER_CONNECTIONS = int(os.getenv("WEB_WORKER_CONNECTIONS", "1000"))
+
+# Pedidos com conexão MySQL em simultâneo por processo no modo gevent; os
+# restantes greenlets esperam (sem bloquear o processo) por uma conexão livre
+GEVENT_DB_CONCURRENCY = int(os.getenv("GEVENT_DB_CONCURRENCY", "30"))
+
+# Limite de conexões MySQL de todos os processos (0 = sem limite)
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "0"))
+
+# Aplicação WSGI: as threads de fundo são iniciadas por worker (gunicorn.conf.py);
+# a app recusa arrancar com migrações por aplicar
+APP = "main:create_app(start_background=False, check_schema=True)"
+
+
+def pool_size(workers: int, threads: int) -> int:
+    """
+    Conexões do pool de cada processo: uma por thread mais duas (threads
+    de fundo e respostas em streaming, que usam uma conexão própria), ou
+    a parte de DB_MAX_CONNECTIONS que cabe a cada processo.
+    """
+    if DB_MAX_CONNECTIONS:
+        return max(2, DB_MAX_CONNECTIONS // workers)
+
+    return threads + 2
+
+
+def configure_pool(workers: int, threads: int):
+    """
+    Define DB_POOL_SIZE (e, no modo gevent, DB_DRIVER) se não tiverem sido
+    dados, antes de importar a app.
+    """
+    if WEB_WORKER_CLASS == "gevent":
+        threads = GEVENT_DB_CONCURRENCY
+        os.environ.setdefault("DB_DRIVER", "pymysql")
+
+    os.environ.setdefault("DB_POOL_SIZE", str(pool_size(workers, threads)))
+
+
+def run_gunicorn():
+    from gunicorn.app.wsgiapp import run
+
+    directory = os.path.dirname(os.path.abspath(__file__))
+    sys.argv = [
+        "gunicorn",
+        "--config", os.path.join(directory, "gunicorn.conf.py"),
+        "--chdir", directory,
+        APP,
+    ]
+    run()
+
+
+def run_waitress():
+    from waitress import serve
+
+    configure_pool(1, WEB_THREADS)
+
+    import main
+
+    app = main.create_app(check_schema=True)
+    serve(
+        app,
+        listen=WEB_BIND,
+        threads=WEB_THREADS,
+        channel_timeout=int(os.getenv("WEB_TIMEOUT", "30")),
+    )
+
+
+if __name__ == "__main__":
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        run_waitress()
+    else:
+        run_gunicorn()
@@ -0,0 +1,45 @@
+from decimal import Decimal
+
+class AnalyticsService:
+    def __init__(self, cube, sketches, dimensions):
+        self.cube = cube
+        self.sketches = sketches
+        self.dimensions = dimensions
+
+    def cube_query(self, group_by: list, filters: dict, metrics: list, approx: bool = False):
+        """
+        Grupos do cubo (ou dos sketches, com `approx`) com as dimensões de
+        lookup como {"id", "name"} e as métricas como números JSON.
+        """
+        if approx:
+            items = self.sketches.query(group_by, metrics)
+        else:
+            items = self.cube.query(group_by, filters, metrics)
+
+        groups = []
+
+        for item in items:
+            group = {}
+
+            for dimension, value in item.pop("key").items():
+                _, table = self.cube.DIMENSIONS[dimension]
+
+                if table is not None and value is not None:
+                    value = {"id": value, "name": self.dimensions.name(table, value)}
+
+                group[dimension] = value
+
+            for metric, value in item.items():
+                group[metric] = float(value) if isinstance(value, (Decimal, float)) else value
+
+            groups.append(group)
+
+        return groups
+
+    def approx_stale_since(self):
+        """
+        Instante (ISO 8601) da primeira alteração ou remoção de incidentes
+        ainda não refletida nos sketches de `approx`, ou None.
+        """
+        dirty_since = self.sketches.dirty_since()
+        return None if dirty_since is None else dirty_since.isoformat()
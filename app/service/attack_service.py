@@ -2,22 +2,25 @@ class AttackService:
     def __init__(self, repository):
         self.repo = repository
 
-    def create(self, attack_type: int, target_industry: int,
+    def create(self, attack_type: int, attack_source: int, target_industry: int,
                country: str, year: int, financial_loss: float, affected_users: int):
-        return self.repo.create(attack_type, target_industry, 
+        return self.repo.create(attack_type, attack_source, target_industry,
                                 country, year, financial_loss, affected_users)
 
-    def list(self):
-        return self.repo.list()
+    def create_many(self, attacks: list[tuple], before_commit=None):
+        return self.repo.create_many(attacks, before_commit)
+
+    def list(self, limit: int, after: dict | None = None, filters: dict | None = None, sort: str = "-id"):
+        return self.repo.list(limit, after, filters, sort)
+
+    def stream(self, chunk_size: int = 1000, filters: dict | None = None, sort: str = "-id"):
+        return self.repo.stream(chunk_size, filters, sort)
 
     def get_by_id(self, external_id: str):
         return self.repo.get_by_id(external_id)
     
-    def update(self, external_id: str, attack_type: int = None,
-               target_industry: int = None, country: str = None, year: int = None,
-               financial_loss: float = None, affected_users: int = None):
-        return self.repo.update(external_id, attack_type, target_industry,
-                               country, year, financial_loss, affected_users)
+    def update(self, external_id: str, fields: dict):
+        return self.repo.update(external_id, fields)
     
     def delete(self, external_id: str):
         return self.repo.delete(external_id)
@@ -5,68 +5,27 @@ class CyberThreatService:
     def create(self, country: str, year: int, attack_type: int, target_industry: int, financial_loss: float, affected_users: int, security_vulnerability: int, defense_mechanism: int, resolution_time: int):
         return self.repo.create(country, year, attack_type, target_industry, financial_loss, affected_users, security_vulnerability, defense_mechanism, resolution_time)
 
-    def list(self):
-        return self.repo.list()
+    def create_many(self, incidents: list[tuple], before_commit=None):
+        return self.repo.create_many(incidents, before_commit)
+
+    def list(self, limit: int, after: dict | None = None, filters: dict | None = None, sort: str = "id"):
+        return self.repo.list(limit, after, filters, sort)
+
+    def stream(self, chunk_size: int = 1000, filters: dict | None = None, sort: str = "id"):
+        return self.repo.stream(chunk_size, filters, sort)
 
     def get_by_id(self, id: int):
         return self.repo.get_by_id(id)
     
-    def update(
-        self,
-        id: int,
-        country: str | None,
-        year: int | None,
-        attack_type: int | None,
-        target_industry: int | None,
-        financial_loss: float | None,
-        affected_users: int | None,
-        security_vulnerability: int | None,
-        defense_mechanism: int | None,
-        resolution_time: int | None
-    ):
-        current = self.repo.get_by_id(id)
-
-        if current is None:
-            return None
+    def update(self, id: int, fields: dict):
+        return self.repo.update(id, fields)
 
-        country = country if country is not None else current["Country"]
-        year = year if year is not None else current["Year"]
-        attack_type = attack_type if attack_type is not None else current["Attack Type"]["id"]
-        target_industry = target_industry if target_industry is not None else current["Target Industry"]["id"]
-        financial_loss = financial_loss if financial_loss is not None else current["Financial Loss (in Million $)"]
-        affected_users = affected_users if affected_users is not None else current["Number of Affected Users"]
-        security_vulnerability = (
-            security_vulnerability
-            if security_vulnerability is not None
-            else current["Security Vulnerability Type"]["id"]
-        )
-        defense_mechanism = (
-            defense_mechanism
-            if defense_mechanism is not None
-            else current["Defense Mechanism Used"]["id"]
-        )
-        resolution_time = (
-            resolution_time
-            if resolution_time is not None
-            else current["Incident Resolution Time (in Hours)"]
-        )
-
-        return self.repo.update(
-            id,
-            country,
-            year,
-            attack_type,
-            target_industry,
-            financial_loss,
-            affected_users,
-            security_vulnerability,
-            defense_mechanism,
-            resolution_time
-        )
-    
     def delete(self, id: int):
         return self.repo.delete(id)
     
+    def breakdown(self):
+        return self.repo.breakdown()
+
     def attack_type_percentage(self):
         return self.repo.attack_type_percentage()
     
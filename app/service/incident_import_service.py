@@ -0,0 +1,222 @@
+import codecs
+import csv
+import json
+import os
+from decimal import Decimal, InvalidOperation
+from utils.column_limits import column_error
+
+# Incidentes por bloco (cada bloco é inserido e confirmado de uma vez)
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+
+# Máximo de erros por linha guardados no resumo (os restantes só são contados)
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "100"))
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+
+def read_csv(stream):
+    """
+    Registos (dicts) de um CSV com cabeçalho, lidos linha a linha de um
+    stream binário. Os registos com UTF-8 inválido dão a mensagem de erro.
+    """
+    invalid_lines = []
+
+    def lines():
+        for number, line in enumerate(stream, start=1):
+            if number == 1:
+                line = line.removeprefix(codecs.BOM_UTF8)
+
+            try:
+                yield line.decode("utf-8")
+            except UnicodeDecodeError:
+                invalid_lines.append(number)
+                yield line.decode("utf-8", "replace")
+
+    reader = csv.DictReader(lines())
+
+    # Com UTF-8 inválido no cabeçalho os nomes das colunas não servem
+    reader.fieldnames
+    header_error = f"Invalid UTF-8 on line {invalid_lines[0]}" if invalid_lines else None
+    last_line = reader.line_num
+
+    for record in reader:
+        # Um registo pode ocupar várias linhas (campos entre aspas)
+        first_line, last_line = last_line + 1, reader.line_num
+        invalid = [number for number in invalid_lines if first_line <= number <= last_line]
+
+        if header_error is not None:
+            yield header_error
+        elif invalid:
+            yield f"Invalid UTF-8 on line {invalid[0]}"
+        else:
+            yield record
+
+
+def read_ndjson(stream):
+    """Registos (dicts) de um ficheiro NDJSON; as linhas inválidas dão a mensagem de erro."""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            # UnicodeDecodeError (UTF-8 inválido) é um ValueError
+            record = json.loads(line)
+        except ValueError:
+            record = None
+
+        yield record if isinstance(record, dict) else "Invalid record"
+
+
+class IncidentImportService:
+    """
+    Importação de ficheiros de incidentes (CSV ou NDJSON) em que as dimensões
+    vêm por nome ("Phishing", "Banking") em vez de Id.
+
+    O ficheiro é lido em streaming e inserido em blocos de IMPORT_CHUNK_SIZE
+    linhas, por isso a memória usada não depende do tamanho do ficheiro.
+    Cada bloco é confirmado ao ser inserido: se a base de dados falhar a
+    meio, os blocos anteriores ficam gravados e o resumo indica até onde se
+    chegou.
+    """
+
+    # Coluna de global_cyber_threats -> (nome do campo na API, tabela de
+    # lookup ou conversor). O cabeçalho pode usar qualquer um dos dois nomes.
+    _FIELDS = {
+        "Country": ("country", str),
+        "Year": ("year", int),
+        "Attack Type": ("attack_type", "Attack_Types"),
+        "Target Industry": ("target_industry", "Target_Industries"),
+        "Financial Loss (in Million $)": ("financial_loss", Decimal),
+        "Number of Affected Users": ("affected_users", int),
+        "Attack Source": ("attack_source", "Attack_Sources"),
+        "Security Vulnerability Type": ("security_vulnerability", "Security_Vulnerabilities"),
+        "Defense Mechanism Used": ("defense_mechanism", "Defense_Mechanisms"),
+        "Incident Resolution Time (in Hours)": ("resolution_time", int),
+    }
+
+    _OPTIONAL = {"Attack Source"}
+
+    def __init__(self, repository, dimensions):
+        self.repo = repository
+        self.dimensions = dimensions
+
+    def _name_maps(self):
+        """{tabela: {nome normalizado: Id}} das tabelas de lookup usadas no ficheiro."""
+        maps = {}
+
+        for _, kind in self._FIELDS.values():
+            if isinstance(kind, str):
+                maps[kind] = {
+                    str(name).strip().casefold(): id
+                    for id, name in self.dimensions.all(kind).items()
+                }
+
+        return maps
+
+    def _resolve(self, record, names):
+        """Converte um registo do ficheiro num tuplo pela ordem de IMPORT_COLUMNS."""
+        if isinstance(record, str):
+            return None, record
+
+        values = []
+
+        for column in self.repo.IMPORT_COLUMNS:
+            field, kind = self._FIELDS[column]
+            value = record.get(column, record.get(field))
+
+            if isinstance(value, str):
+                value = value.strip()
+
+            if value is None or value == "":
+                if column in self._OPTIONAL:
+                    values.append(None)
+                    continue
+                return None, f"Missing {field}"
+
+            if isinstance(kind, str):
+                id = names[kind].get(str(value).casefold())
+
+                if id is None:
+                    return None, f"Unknown {field} '{value}'"
+
+                values.append(id)
+                continue
+
+            try:
+                if kind is Decimal:
+                    value = Decimal(str(value))
+                    if not value.is_finite():
+                        raise InvalidOperation
+                elif kind is int:
+                    if isinstance(value, float) or isinstance(value, bool):
+                        raise ValueError
+                    value = int(value)
+                elif not isinstance(value, str):
+                    raise ValueError
+            except (ValueError, InvalidOperation):
+                return None, f"Invalid {field}"
+
+            error = column_error(field, value)
+            if error is not None:
+                return None, error
+
+            values.append(value)
+
+        return tuple(values), None
+
+    def run(self, records):
+        """
+        Importa os registos e produz o progresso depois de cada bloco:
+        {"processed", "imported", "rejected"}. O último resumo tem também
+        "errors" (primeiros IMPORT_MAX_ERRORS, com o nº da linha de dados),
+        "done" e, se a base de dados falhar, "error".
+
+        As linhas recusadas pelo MySQL são rejeitadas uma a uma, como as
+        inválidas, sem parar a importação.
+        """
+        summary = {"processed": 0, "imported": 0, "rejected": 0}
+        errors = []
+        names = self._name_maps()
+        rows, chunk = [], []
+
+        def reject(row, error):
+            summary["rejected"] += 1
+            if len(errors) < IMPORT_MAX_ERRORS:
+                errors.append({"row": row, "error": error})
+
+        def flush():
+            rejected = self.repo.import_rows(chunk)
+            if rejected is None:
+                return False
+
+            summary["imported"] += len(chunk) - len(rejected)
+            for position, error in sorted(rejected.items()):
+                reject(rows[position], error)
+
+            return True
+
+        for row, record in enumerate(records, start=1):
+            summary["processed"] += 1
+            values, error = self._resolve(record, names)
+
+            if error is not None:
+                reject(row, error)
+                continue
+
+            rows.append(row)
+            chunk.append(values)
+
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                if not flush():
+                    summary["error"] = f"Database error while importing rows up to {row}"
+                    break
+
+                rows, chunk = [], []
+                yield dict(summary)
+
+        if chunk and "error" not in summary:
+            if not flush():
+                summary["error"] = "Database error while importing the last rows"
+
+        yield {**summary, "errors": errors, "done": True}
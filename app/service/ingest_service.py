@@ -0,0 +1,294 @@
+import logging
+import os
+import threading
+import time
+import mysql.connector
+from utils.ingest_journal import IngestJournal
+
+# "async" ativa a ingestão assíncrona (202 + ticket) em POST /cyber_threats/ e /attacks/
+INGEST_MODE = os.getenv("INGEST_MODE", "sync")
+
+INGEST_JOURNAL_PATH = os.getenv(
+    "INGEST_JOURNAL_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ingest_journal.sqlite3")
+)
+
+# Registos por lote enviado ao MySQL
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+
+# Segundos entre verificações do diário quando não há novos registos
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "0.5"))
+
+# Segundos durante os quais o estado de um ticket concluído pode ser consultado
+INGEST_RETENTION = float(os.getenv("INGEST_RETENTION", "86400"))
+
+# Intervalo mínimo (segundos) entre limpezas de ingest_applied em cada processo
+_PRUNE_SECONDS = 60
+
+# Folga (segundos) da limpeza de ingest_applied para a latência entre o
+# append no diário e o commit no MySQL
+_PRUNE_MARGIN_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+class IngestUnavailable(Exception):
+    """Falha do MySQL (não dos dados) a gravar um lote; o lote volta à fila."""
+
+
+class IngestService:
+    """
+    Ingestão assíncrona (write-behind) de incidentes.
+
+    Os controllers gravam cada incidente validado no diário local
+    (`submit`) e respondem 202 com um ticket. Uma thread em segundo plano
+    lê o diário em lotes e chama o `create_many` do serviço registado para
+    a entidade, que insere o lote numa só transação.
+
+    Os tickets dos incidentes inseridos são gravados na tabela
+    `ingest_applied` na mesma transação que os incidentes: se o processo
+    falhar entre o commit no MySQL e a marcação no diário, o lote é repetido
+    mas os tickets já aplicados são ignorados (e os rejeitados voltam a ser
+    avaliados). Depois de cada lote são apagados os tickets anteriores ao
+    registo pendente mais antigo do diário (`_prune_applied`), que já não
+    podem ser repetidos.
+
+    Um registo só é rejeitado quando o MySQL recusa os dados dele. Falhas
+    do MySQL (conexão perdida, lock wait, deadlock) devolvem o lote ao
+    diário, para ser repetido mais tarde: nenhum registo aceite com 202 se
+    perde.
+    """
+    _instance = None
+
+    APPLIED_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS `ingest_applied` (
+          `ticket` char(36) NOT NULL,
+          `applied_at` timestamp NOT NULL DEFAULT current_timestamp(),
+          PRIMARY KEY (`ticket`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+    """
+
+    def __new__(cls, db=None):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance.db = db
+            cls._instance.enabled = INGEST_MODE == "async"
+            cls._instance.writers = {}
+            cls._instance._journal = None
+            cls._instance._journal_lock = threading.Lock()
+            cls._instance._wake = threading.Event()
+            cls._instance._thread = None
+            cls._instance._pruned_at = 0.0
+
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=cls._instance._after_fork)
+
+        return cls._instance
+
+    def _after_fork(self):
+        # A thread e a conexão SQLite do diário não passam para o processo
+        # filho: são recriadas por `start` e no próximo acesso ao diário
+        self._journal = None
+        self._journal_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @property
+    def journal(self) -> IngestJournal:
+        if self._journal is None:
+            with self._journal_lock:
+                if self._journal is None:
+                    self._journal = IngestJournal(INGEST_JOURNAL_PATH)
+
+        return self._journal
+
+    def register(self, entity: str, create_many):
+        """
+        Regista a função que grava um lote da entidade:
+        create_many(list[tuple], before_commit) -> (nº criados, {posição: erro})
+        ou None se o MySQL recusar os dados; `before_commit(cursor, posições
+        inseridas)` tem de correr na transação do lote, antes do commit.
+        """
+        self.writers[entity] = create_many
+
+    def submit(self, entity: str, values: tuple) -> str:
+        """Grava o incidente no diário e retorna o ticket."""
+        ticket = self.journal.append(entity, list(values))
+        self._wake.set()
+
+        return ticket
+
+    def status(self, ticket: str):
+        return self.journal.status(ticket)
+
+    def start(self):
+        """Inicia a thread de escrita (uma por processo)."""
+        if not self.enabled or self._thread is not None:
+            return
+
+        self._thread = threading.Thread(target=self._run, name="ingest-flusher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        schema_ready = False
+        failures = 0
+
+        while True:
+            try:
+                if not schema_ready:
+                    self._create_schema()
+                    schema_ready = True
+
+                if self.flush() > 0:
+                    failures = 0
+                    continue
+
+                self.journal.prune(INGEST_RETENTION)
+                self._prune_applied()
+                failures = 0
+            except Exception:
+                failures += 1
+                logger.exception("Ingest flush failed (attempt %s)", failures)
+            finally:
+                self.db.release_connection()
+
+            # Espera por novos registos, ou mais tempo se o MySQL estiver em baixo
+            self._wake.wait(INGEST_FLUSH_INTERVAL * min(2 ** failures, 60))
+            self._wake.clear()
+
+    def _create_schema(self):
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(self.APPLIED_SCHEMA)
+
+    def flush(self) -> int:
+        """Aplica um lote do diário no MySQL. Retorna o nº de registos processados."""
+        batch = self.journal.claim(INGEST_BATCH_SIZE)
+
+        if not batch:
+            return 0
+
+        try:
+            results = self._apply(batch)
+        except Exception:
+            self.journal.release([ticket for ticket, _, _ in batch])
+            raise
+
+        self.journal.finish(results)
+        self._prune_applied()
+
+        return len(batch)
+
+    def _prune_applied(self):
+        """
+        Apaga de ingest_applied os tickets gravados antes do registo pendente
+        mais antigo do diário (com folga de _PRUNE_MARGIN_SECONDS), no máximo
+        uma vez por minuto. Um ticket só é consultado enquanto o registo dele
+        está pendente, e nenhum registo pendente pode ter sido aplicado antes
+        de ser criado. Nunca lança exceções.
+
+        A idade é calculada no relógio local e aplicada ao NOW() do MySQL,
+        por isso a diferença entre os relógios não conta. Com vários diários
+        (ex.: várias máquinas) no mesmo MySQL, só conta o diário local.
+        """
+        now = time.monotonic()
+        if now - self._pruned_at < _PRUNE_SECONDS:
+            return
+        self._pruned_at = now
+
+        conn = self.db.get_connection()
+
+        try:
+            oldest = self.journal.oldest_pending()
+            age = 0.0 if oldest is None else max(time.time() - oldest, 0.0)
+
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM ingest_applied WHERE applied_at < NOW() - INTERVAL %s SECOND",
+                (int(age) + _PRUNE_MARGIN_SECONDS,)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.exception("Could not prune ingest_applied")
+
+    def _apply(self, batch) -> dict:
+        results = {}
+        applied = self._already_applied([ticket for ticket, _, _ in batch])
+
+        by_entity = {}
+        for ticket, entity, payload in batch:
+            if ticket in applied:
+                results[ticket] = None
+            else:
+                by_entity.setdefault(entity, []).append((ticket, tuple(payload)))
+
+        for entity, items in by_entity.items():
+            writer = self.writers.get(entity)
+
+            if writer is None:
+                results.update((ticket, f"Unknown entity '{entity}'") for ticket, _ in items)
+                continue
+
+            results.update(self._write(writer, items))
+
+        return results
+
+    def _already_applied(self, tickets) -> set:
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+
+        placeholders = ", ".join(["%s"] * len(tickets))
+        cursor.execute(
+            f"SELECT ticket FROM ingest_applied WHERE ticket IN ({placeholders})",
+            tuple(tickets)
+        )
+
+        return {row[0] for row in cursor.fetchall()}
+
+    def _write(self, writer, items) -> dict:
+        results = self._write_batch(writer, items)
+
+        if results is not None:
+            return results
+
+        # O MySQL recusou os dados do lote: repete um a um para isolar os
+        # registos inválidos (uma falha do MySQL interrompe e devolve o lote)
+        results = {}
+
+        for item in items:
+            outcome = self._write_batch(writer, [item])
+
+            if outcome is not None:
+                results.update(outcome)
+            elif self._already_applied([item[0]]):
+                # Ticket gravado por outro worker com o mesmo registo
+                results[item[0]] = None
+            else:
+                results[item[0]] = "Invalid data"
+
+        return results
+
+    def _write_batch(self, writer, items):
+        """
+        Grava os incidentes e os tickets dos que foram inseridos numa só
+        transação. Retorna {ticket: erro ou None}, ou None se o MySQL recusar
+        os dados; levanta IngestUnavailable se o MySQL falhar.
+        """
+        def record_tickets(cursor, positions):
+            cursor.executemany(
+                "INSERT INTO ingest_applied (ticket) VALUES (%s)",
+                [(items[position][0],) for position in positions]
+            )
+
+        try:
+            outcome = writer([values for _, values in items], record_tickets)
+        except mysql.connector.Error as error:
+            raise IngestUnavailable(f"{len(items)} records could not be written: {error}") from error
+
+        if outcome is None:
+            return None
+
+        _, rejected = outcome
+
+        return {ticket: rejected.get(position) for position, (ticket, _) in enumerate(items)}
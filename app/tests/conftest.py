@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos da app importam-se a partir da pasta app/ (como em main.py)
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# Os testes não precisam do MySQL nem do Swagger
+os.environ.setdefault("ID_CODEC_KEY", "test-key")
+os.environ.setdefault("API_DOCS", "0")
+
+
+@pytest.fixture
+def client():
+    """Cliente de teste da app Flask, sem threads em segundo plano."""
+    from main import create_app
+
+    app = create_app(start_background=False)
+    return app.test_client()
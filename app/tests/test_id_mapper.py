@@ -0,0 +1,66 @@
+import uuid
+
+import pytest
+
+from utils.id_mapper import IdMapper
+
+
+@pytest.fixture
+def mapper():
+    return IdMapper()
+
+
+@pytest.mark.parametrize("entity_type", IdMapper.ENTITY_TYPES)
+@pytest.mark.parametrize("internal_id", [0, 1, 42, 2 ** 31 - 1, 2 ** 64 - 1])
+def test_round_trip(mapper, entity_type, internal_id):
+    external_id = mapper.get_external_id(internal_id, entity_type)
+
+    assert str(uuid.UUID(external_id)) == external_id
+    assert mapper.decode(external_id) == (entity_type, internal_id)
+    assert mapper.get_internal_id(external_id, entity_type) == internal_id
+
+
+def test_ids_are_distinct_per_entity(mapper):
+    external_ids = {mapper.get_external_id(7, entity_type) for entity_type in IdMapper.ENTITY_TYPES}
+
+    assert len(external_ids) == len(IdMapper.ENTITY_TYPES)
+
+
+def test_other_entity_type_is_rejected(mapper):
+    external_id = mapper.get_external_id(7, "attack")
+
+    assert mapper.get_internal_id(external_id, "defense") is None
+
+
+@pytest.mark.parametrize("external_id", [
+    str(uuid.uuid4()),
+    str(uuid.uuid5(IdMapper.NAMESPACE, "attack_7")),
+    str(uuid.UUID(int=0)),
+])
+def test_foreign_uuid_is_rejected(mapper, external_id):
+    assert mapper.decode(external_id) is None
+
+
+@pytest.mark.parametrize("external_id", ["", "not-a-uuid", None, 123])
+def test_malformed_id_is_rejected(mapper, external_id):
+    assert mapper.decode(external_id) is None
+
+
+def test_other_key_is_rejected(mapper, monkeypatch):
+    external_id = mapper.get_external_id(7, "attack")
+
+    # Outro processo (ou instalação) com outra ID_CODEC_KEY
+    monkeypatch.setattr(IdMapper, "_instance", None)
+    monkeypatch.setenv("ID_CODEC_KEY", "another-key")
+    other = IdMapper()
+
+    assert other is not mapper
+    assert other.decode(external_id) is None
+    assert mapper.decode(other.get_external_id(7, "attack")) is None
+
+
+def test_tampered_id_is_rejected(mapper):
+    external_id = mapper.get_external_id(7, "attack")
+    tampered = uuid.UUID(int=uuid.UUID(external_id).int ^ 1)
+
+    assert mapper.decode(str(tampered)) is None
@@ -0,0 +1,167 @@
+import base64
+import json
+import sqlite3
+from decimal import Decimal
+
+import pytest
+
+from utils.filters import INCIDENT_SORTS, check_cursor_sort, compile_sort, sort_position
+from utils.pagination import decode_cursor, encode_cursor
+
+# (Id, Country, Year, perda, utilizadores, horas): valores repetidos e NULL
+# em todas as colunas ordenáveis, para os cursores cruzarem essas fronteiras
+ROWS = [
+    (1, "Portugal", 2020, "10.50", 100, 5),
+    (2, None, None, None, None, None),
+    (3, "Brazil", 2019, "3.25", 500, 48),
+    (4, "Portugal", 2020, "10.50", 100, 5),
+    (5, None, None, None, None, None),
+    (6, "Angola", 2023, "0.75", 20, 1),
+    (7, "Brazil", None, "3.25", None, 48),
+    (8, None, 2019, None, 500, None),
+    (9, "Angola", 2023, "99.99", 20, 72),
+]
+
+SORTS = [prefix + name for name in INCIDENT_SORTS for prefix in ("", "-")]
+
+
+@pytest.fixture(scope="module")
+def table():
+    # SQLite ordena os NULL como o MySQL: primeiro em ASC, no fim em DESC
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        """
+        CREATE TABLE global_cyber_threats (
+            Id INTEGER PRIMARY KEY,
+            Country TEXT,
+            Year INTEGER,
+            `Financial Loss (in Million $)` NUMERIC,
+            `Number of Affected Users` INTEGER,
+            `Incident Resolution Time (in Hours)` INTEGER
+        )
+        """
+    )
+    conn.executemany("INSERT INTO global_cyber_threats VALUES (?, ?, ?, ?, ?, ?)", ROWS)
+    yield conn
+    conn.close()
+
+
+def _page(table, sort, after, limit):
+    """Uma página como nos repositórios: (linhas no formato de _SELECT, posição seguinte)."""
+    keyset, params, order_by = compile_sort(sort, after)
+
+    rows = table.execute(
+        f"""
+        SELECT gct.Id, gct.Country AS Country, gct.Year AS Year,
+            gct.`Financial Loss (in Million $)` AS financial_loss,
+            gct.`Number of Affected Users` AS affected_users,
+            gct.`Incident Resolution Time (in Hours)` AS resolution_time
+        FROM global_cyber_threats gct
+        WHERE 1 = 1 {keyset}
+        {order_by}
+        LIMIT ?
+        """.replace("%s", "?"),
+        (*params, limit + 1)
+    ).fetchall()
+
+    page = [
+        {
+            "Id": id, "Country": country, "Year": year,
+            "financial_loss": None if loss is None else Decimal(str(loss)).quantize(Decimal("0.01")),
+            "affected_users": users, "resolution_time": hours,
+        }
+        for id, country, year, loss, users, hours in rows[:limit]
+    ]
+
+    if len(rows) <= limit:
+        return page, None
+
+    return page, sort_position(sort, page[-1]["Id"], page[-1])
+
+
+@pytest.mark.parametrize("limit", [1, 2, 4])
+@pytest.mark.parametrize("sort", SORTS)
+def test_keyset_round_trip(table, sort, limit):
+    _, _, order_by = compile_sort(sort, None)
+    expected = [row[0] for row in table.execute(f"SELECT gct.Id FROM global_cyber_threats gct {order_by}")]
+
+    seen = []
+    after = None
+
+    while True:
+        page, position = _page(table, sort, after, limit)
+        seen.extend(row["Id"] for row in page)
+
+        if position is None:
+            break
+
+        # O cliente só vê o cursor opaco
+        after = decode_cursor(encode_cursor(position))
+        check_cursor_sort(after, sort)
+
+    assert seen == expected
+
+
+def test_descending_sort_puts_nulls_last(table):
+    page, _ = _page(table, "-year", None, len(ROWS))
+    years = [row["Year"] for row in page]
+
+    assert years[-3:] == [None, None, None]
+    assert years[:-3] == sorted(years[:-3], reverse=True)
+
+
+def test_decimal_position_is_text():
+    row = {"financial_loss": Decimal("10.50")}
+
+    assert sort_position("financial_loss", 1, row) == {"id": 1, "sort": "financial_loss", "value": "10.50"}
+
+
+def test_cursor_of_other_sort_is_rejected():
+    after = decode_cursor(encode_cursor(sort_position("year", 3, {"Year": 2019})))
+
+    with pytest.raises(ValueError):
+        check_cursor_sort(after, "-year")
+    with pytest.raises(ValueError):
+        check_cursor_sort(after, "id")
+
+
+def _raw_cursor(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+INVALID_CURSORS = [
+    "not a cursor",
+    encode_cursor({"id": 1})[:-2],
+    _raw_cursor(b"\xff\xfe"),
+    _raw_cursor(json.dumps([1]).encode()),
+    _raw_cursor(json.dumps({"value": 1}).encode()),
+    _raw_cursor(json.dumps({"id": "1"}).encode()),
+    _raw_cursor(json.dumps({"id": True}).encode()),
+    _raw_cursor(json.dumps({"id": 1, "sort": "year", "value": [2020]}).encode()),
+    _raw_cursor(json.dumps({"id": 1, "sort": "year", "value": {"a": 1}}).encode()),
+    _raw_cursor(json.dumps({"id": 1, "sort": "year", "value": False}).encode()),
+    _raw_cursor(json.dumps({"id": 1, "sort": ["year"], "value": 2020}).encode()),
+]
+
+
+@pytest.mark.parametrize("cursor", INVALID_CURSORS)
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("route", ["/cyber_threats/", "/attacks/"])
+@pytest.mark.parametrize("cursor", INVALID_CURSORS)
+def test_invalid_cursor_returns_400(client, route, cursor):
+    response = client.get(route, query_string={"after": cursor, "sort": "year"})
+
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid cursor"}
+
+
+def test_cursor_of_other_sort_returns_400(client):
+    cursor = encode_cursor(sort_position("year", 3, {"Year": 2019}))
+    response = client.get("/cyber_threats/", query_string={"after": cursor, "sort": "-year"})
+
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Cursor does not match sort"}
@@ -0,0 +1,59 @@
+import math
+from decimal import Decimal, InvalidOperation
+
+# Limites dos tipos das colunas de global_cyber_threats (cybersecurity_threats.sql)
+INT_MIN, INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+def _varchar(length: int):
+    return lambda value: len(value) <= length, f"must have at most {length} characters"
+
+
+def _int():
+    return lambda value: INT_MIN <= value <= INT_MAX, f"must be between {INT_MIN} and {INT_MAX}"
+
+
+def _decimal(precision: int, scale: int):
+    limit = Decimal(10) ** (precision - scale)
+
+    def check(value) -> bool:
+        try:
+            # Como o MySQL: arredonda às casas decimais da coluna antes de comparar
+            return abs(round(Decimal(str(value)), scale)) < limit
+        except InvalidOperation:
+            return False
+
+    return check, f"must be less than {limit} in absolute value"
+
+
+# Campo da API -> (verificação, mensagem) do tipo da coluna
+FIELD_LIMITS = {
+    "country": _varchar(50),
+    "year": _int(),
+    "attack_type": _int(),
+    "attack_source": _int(),
+    "target_industry": _int(),
+    "financial_loss": _decimal(10, 2),
+    "affected_users": _int(),
+    "security_vulnerability": _int(),
+    "defense_mechanism": _int(),
+    "resolution_time": _int(),
+}
+
+
+def column_error(field: str, value):
+    """
+    Mensagem de erro se `value` (já com o tipo Python certo) não cabe na
+    coluna de `field`, ou None. Evita que uma linha fora dos limites faça o
+    MySQL recusar o INSERT inteiro (DataError).
+    """
+    # bool é subclasse de int; NaN e infinito não existem no MySQL
+    if isinstance(value, bool) or (isinstance(value, float) and not math.isfinite(value)):
+        return f"Invalid {field}"
+
+    check, message = FIELD_LIMITS[field]
+
+    if not check(value):
+        return f"{field} {message}"
+
+    return None
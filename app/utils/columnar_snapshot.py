@@ -0,0 +1,223 @@
+import array
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:  # dependência opcional: sem numpy o snapshot fica desativado
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock (nem symlinks sem privilégios) o snapshot fica desativado
+    fcntl = None
+
+# Diretório do snapshot colunar (vazio = desativado)
+COLUMNAR_SNAPSHOT_PATH = os.getenv("COLUMNAR_SNAPSHOT_PATH", "")
+
+# Idade máxima (s) do snapshot antes de ser reconstruído
+COLUMNAR_SNAPSHOT_SECONDS = float(os.getenv("COLUMNAR_SNAPSHOT_SECONDS", "60"))
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot:
+    """Colunas (arrays numpy só de leitura, mapeados do disco) de uma geração do snapshot."""
+
+    def __init__(self, directory: str, columns: dict, built_at: float):
+        self.directory = directory
+        self.columns = columns
+        self.built_at = built_at
+
+    def __len__(self):
+        return len(self.columns["attack_type"])
+
+    def counts(self, column: str) -> dict:
+        """{valor: nº de incidentes} de uma coluna de Ids (0 = NULL fica de fora)."""
+        values = self.columns[column]
+        if not len(values):
+            return {}
+
+        counts = np.bincount(values)
+        return {int(value): int(counts[value]) for value in np.flatnonzero(counts) if value != 0}
+
+
+class ColumnarSnapshot:
+    """
+    Snapshot colunar de global_cyber_threats em ficheiros .npy, partilhado
+    por todos os workers através de mmap (as páginas ficam uma só vez na
+    cache do sistema operativo).
+
+    - Cada reconstrução escreve uma nova geração num diretório próprio e
+      troca o symlink `current` com os.replace, por isso os leitores veem
+      sempre uma geração completa.
+    - Um lock de ficheiro (flock) garante que só um processo reconstrói;
+      os outros continuam a ler a geração atual.
+    - Só guarda as colunas de Ids das dimensões usadas pelas rotas de
+      percentagem (ver CyberThreatRepository._SNAPSHOT_COLUMNS); Ids NULL
+      ficam a 0.
+
+    Ativado com COLUMNAR_SNAPSHOT_PATH (requer numpy e um sistema POSIX,
+    por causa do flock e do symlink). Os dados podem estar atrasados até
+    COLUMNAR_SNAPSHOT_SECONDS em relação ao MySQL, mesmo depois de escritas
+    do próprio processo: as escritas não reconstroem o snapshot.
+    """
+    _instance = None
+
+    # coluna do snapshot -> coluna em global_cyber_threats
+    COLUMNS = {
+        "attack_type": "Attack Type",
+        "target_industry": "Target Industry",
+        "security_vulnerability": "Security Vulnerability Type",
+        "defense_mechanism": "Defense Mechanism Used",
+    }
+
+    def __new__(cls, db=None):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance.db = db
+            cls._instance.path = COLUMNAR_SNAPSHOT_PATH
+            cls._instance.enabled = bool(COLUMNAR_SNAPSHOT_PATH) and np is not None and fcntl is not None
+            cls._instance._snapshot = None
+            cls._instance._lock = threading.Lock()
+            cls._instance._thread = None
+
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=cls._instance._after_fork)
+
+        return cls._instance
+
+    def _after_fork(self):
+        # A thread de atualização não passa para o processo filho (ver `start`)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def _current_link(self) -> str:
+        return os.path.join(self.path, "current")
+
+    def current(self):
+        """Geração atual (Snapshot), ou None se desativado ou ainda não construído."""
+        if not self.enabled:
+            return None
+
+        try:
+            target = os.readlink(self._current_link)
+        except OSError:
+            return None
+
+        snapshot = self._snapshot
+        if snapshot is not None and os.path.basename(snapshot.directory) == target:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or os.path.basename(snapshot.directory) != target:
+                snapshot = self._snapshot = self._open(os.path.join(self.path, target))
+
+        return snapshot
+
+    def _open(self, directory: str) -> Snapshot:
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as file:
+            meta = json.load(file)
+
+        columns = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in self.COLUMNS
+        }
+
+        return Snapshot(directory, columns, meta["built_at"])
+
+    def build(self):
+        """Lê global_cyber_threats (em streaming) e publica uma nova geração."""
+        columns = {name: array.array("i") for name in self.COLUMNS}
+
+        conn = self.db.get_connection()
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(
+            "SELECT "
+            + ", ".join(f"`{column}`" for column in self.COLUMNS.values())
+            + " FROM global_cyber_threats"
+        )
+
+        appenders = [columns[name].append for name in self.COLUMNS]
+
+        for values in cursor:
+            for append, value in zip(appenders, values):
+                append(0 if value is None else value)
+
+        generation = f"gen-{time.time_ns()}"
+        directory = os.path.join(self.path, generation)
+        os.makedirs(directory)
+
+        for name, values in columns.items():
+            np.save(os.path.join(directory, f"{name}.npy"), np.frombuffer(values, dtype=values.typecode))
+
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as file:
+            json.dump({"built_at": time.time()}, file)
+
+        try:
+            previous = os.readlink(self._current_link)
+        except OSError:
+            previous = None
+
+        # Troca atómica do symlink: os leitores veem a geração antiga ou a nova
+        link = os.path.join(self.path, f".current-{generation}")
+        os.symlink(generation, link)
+        os.replace(link, self._current_link)
+
+        # A geração anterior fica para quem já leu o symlink mas ainda não a abriu
+        self._prune(keep={generation, previous})
+
+    def _prune(self, keep: set):
+        """Apaga gerações antigas (os ficheiros mapeados por leitores continuam válidos até fecharem)."""
+        for name in os.listdir(self.path):
+            if name.startswith("gen-") and name not in keep:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Reconstrói o snapshot se tiver mais de COLUMNAR_SNAPSHOT_SECONDS (ou
+        com `force`), desde que nenhum outro processo o esteja a fazer.
+        Retorna True se reconstruiu.
+        """
+        if not self.enabled:
+            return False
+
+        os.makedirs(self.path, exist_ok=True)
+
+        with open(os.path.join(self.path, ".lock"), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+
+            snapshot = self.current()
+            if not force and snapshot is not None and time.time() - snapshot.built_at < COLUMNAR_SNAPSHOT_SECONDS:
+                return False
+
+            self.build()
+            return True
+
+    def start(self):
+        """Inicia a thread que mantém o snapshot atualizado (uma por processo)."""
+        if not self.enabled or self._thread is not None:
+            return
+
+        self._thread = threading.Thread(target=self._run, name="columnar-snapshot", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Columnar snapshot refresh failed")
+            finally:
+                self.db.release_connection()
+
+            time.sleep(max(COLUMNAR_SNAPSHOT_SECONDS / 4, 1))
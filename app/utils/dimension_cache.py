@@ -0,0 +1,171 @@
+import os
+import time
+import threading
+from utils.id_mapper import IdMapper
+
+
+class References(dict):
+    """
+    {Id: {chave do Id: Id, chave do nome: nome}} de uma tabela de lookup. Os
+    dicts são partilhados por todas as linhas que os referem (não alterar).
+    Um Id desconhecido é resolvido por `DimensionCache.name`, que recarrega
+    o cache.
+    """
+
+    __slots__ = ("_missing",)
+
+    def __init__(self, items, missing):
+        super().__init__(items)
+        self._missing = missing
+
+    def __missing__(self, id):
+        return self._missing(id)
+
+class DimensionCache:
+    """
+    Cache em memória das tabelas de lookup (poucas linhas cada), usado para
+    resolver nomes sem JOIN nas consultas de incidentes.
+
+    - Carregado no arranque da aplicação (ou no primeiro uso).
+    - Invalidado pelos create/update/delete dos repositórios de lookup.
+    - Recarregado após DIMENSION_CACHE_TTL segundos, ou quando aparece um Id
+      desconhecido, para apanhar alterações feitas por outros processos.
+    """
+    _instance = None
+
+    # tabela -> coluna com o nome
+    TABLES = {
+        "Attack_Types": "Type",
+        "Target_Industries": "Industry",
+        "Security_Vulnerabilities": "Vulnerability",
+        "Defense_Mechanisms": "Mechanism",
+        "Attack_Sources": "Source",
+    }
+
+    def __new__(cls, db=None):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance.db = db
+            cls._instance.ttl = float(os.getenv("DIMENSION_CACHE_TTL", "60"))
+            cls._instance._tables = None
+            cls._instance._loaded_at = 0.0
+            cls._instance._lock = threading.Lock()
+            cls._instance._references = {}
+
+        return cls._instance
+
+    def load(self):
+        """Lê todas as tabelas de lookup numa só consulta e substitui o cache."""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(
+            " UNION ALL ".join(
+                f"SELECT '{table}', Id, `{name_column}` FROM {table}"
+                for table, name_column in self.TABLES.items()
+            )
+        )
+
+        tables = {table: {} for table in self.TABLES}
+        for table, id, name in cursor.fetchall():
+            tables[table][id] = name
+
+        # Troca atómica: leitores concorrentes veem o cache antigo ou o novo
+        self._tables = tables
+        self._loaded_at = time.monotonic()
+
+        return tables
+
+    def invalidate(self):
+        self._tables = None
+
+    def _current(self):
+        tables = self._tables
+
+        if tables is None or time.monotonic() - self._loaded_at > self.ttl:
+            with self._lock:
+                # Outra thread pode ter recarregado enquanto esperávamos
+                if self._tables is None or self._tables is tables:
+                    return self.load()
+                return self._tables
+
+        return tables
+
+    def name(self, table: str, id: int):
+        """Nome do registo `id` da tabela de lookup (None se `id` for None ou não existir)."""
+        if id is None:
+            return None
+
+        tables = self._current()
+        names = tables[table]
+
+        if id not in names:
+            # Criado por outro processo depois do último carregamento
+            with self._lock:
+                if self._tables is None or self._tables is tables:
+                    tables = self.load()
+                else:
+                    tables = self._tables
+            names = tables[table]
+
+        return names.get(id)
+
+    def references(self, table: str, id_key: str, name_key: str, entity_type: str = None) -> References:
+        """
+        Objetos {id_key: Id, name_key: nome} de todos os registos da tabela,
+        reutilizados até o cache ser recarregado. Com `entity_type`, o Id é o
+        ID externo (IdMapper) dessa entidade.
+        """
+        tables = self._current()
+        key = (table, id_key, name_key, entity_type)
+        cached = self._references.get(key)
+
+        if cached is not None and cached[0] is tables:
+            return cached[1]
+
+        external_id = IdMapper().get_external_id
+
+        def build(id, name):
+            return {id_key: external_id(id, entity_type) if entity_type and id is not None else id, name_key: name}
+
+        def missing(id):
+            return build(id, self.name(table, id))
+
+        references = References(
+            ((id, build(id, name)) for id, name in tables[table].items()),
+            missing
+        )
+        self._references[key] = (tables, references)
+
+        return references
+
+    def all(self, table: str) -> dict:
+        """Todos os registos da tabela de lookup, como {Id: nome}."""
+        return dict(self._current()[table])
+
+    def unknown_references(self, rows, foreign_keys) -> dict:
+        """
+        Verifica as chaves estrangeiras de um lote de linhas.
+
+        `foreign_keys` é uma sequência de (posição na linha, tabela de lookup,
+        nome do campo). Retorna {posição da linha: "Unknown <campo>"} para as
+        linhas que referenciam Ids inexistentes. Se houver alguma, o cache é
+        recarregado uma vez (os Ids podem ter sido criados por outro processo).
+        """
+        for attempt in range(2):
+            if attempt:
+                self.invalidate()
+
+            known = {table: self.all(table) for _, table, _ in foreign_keys}
+            unknown = {}
+
+            for position, row in enumerate(rows):
+                for index, table, field in foreign_keys:
+                    if row[index] not in known[table]:
+                        unknown[position] = f"Unknown {field}"
+                        break
+
+            if not unknown:
+                break
+
+        return unknown
@@ -0,0 +1,199 @@
+from decimal import Decimal, InvalidOperation
+
+# Filtros das listagens de incidentes (/cyber_threats/, /attacks/):
+# parâmetro da query string -> (coluna de global_cyber_threats, operador, tipo)
+# Os filtros "in" aceitam vários valores separados por vírgula.
+INCIDENT_FILTERS = {
+    "year": ("Year", "in", int),
+    "year_from": ("Year", ">=", int),
+    "year_to": ("Year", "<=", int),
+    "country": ("Country", "in", str),
+    "attack_type": ("Attack Type", "in", int),
+    "attack_source": ("Attack Source", "in", int),
+    "target_industry": ("Target Industry", "in", int),
+    "security_vulnerability": ("Security Vulnerability Type", "in", int),
+    "defense_mechanism": ("Defense Mechanism Used", "in", int),
+    "min_loss": ("Financial Loss (in Million $)", ">=", Decimal),
+    "max_loss": ("Financial Loss (in Million $)", "<=", Decimal),
+    "min_users": ("Number of Affected Users", ">=", int),
+    "max_users": ("Number of Affected Users", "<=", int),
+}
+
+# Ordenações: valor de `sort` (prefixo "-" para descendente) -> coluna
+INCIDENT_SORTS = {
+    "id": "Id",
+    "year": "Year",
+    "country": "Country",
+    "financial_loss": "Financial Loss (in Million $)",
+    "affected_users": "Number of Affected Users",
+    "resolution_time": "Incident Resolution Time (in Hours)",
+}
+
+# Chave do valor de ordenação nas linhas dos SELECT dos repositórios
+_SORT_ROW_KEYS = {
+    "year": "Year",
+    "country": "Country",
+    "financial_loss": "financial_loss",
+    "affected_users": "affected_users",
+    "resolution_time": "resolution_time",
+}
+
+
+# Máximo de valores num filtro "in"
+MAX_FILTER_VALUES = 100
+
+
+def _convert(name: str, kind, raw: str):
+    try:
+        if kind is Decimal:
+            value = Decimal(raw)
+            if not value.is_finite():
+                raise InvalidOperation
+            return value
+        if kind is int:
+            return int(raw)
+    except (ValueError, InvalidOperation):
+        raise ValueError(f"Invalid {name}")
+
+    if not raw:
+        raise ValueError(f"Invalid {name}")
+
+    return raw
+
+
+def parse_filters(args) -> dict:
+    """
+    Lê os filtros de INCIDENT_FILTERS da query string.
+
+    Returns:
+        {filtro: valor} ("in" dá uma lista). Lança ValueError com a
+        mensagem para o cliente.
+    """
+    filters = {}
+
+    for name, (_, operator, kind) in INCIDENT_FILTERS.items():
+        raw = args.get(name)
+        if raw is None:
+            continue
+
+        if operator == "in":
+            values = [_convert(name, kind, part.strip()) for part in raw.split(",")]
+
+            if len(values) > MAX_FILTER_VALUES:
+                raise ValueError(f"At most {MAX_FILTER_VALUES} values in {name}")
+
+            filters[name] = values
+        else:
+            filters[name] = _convert(name, kind, raw.strip())
+
+    return filters
+
+
+def parse_sort(args, default: str = "id") -> str:
+    """Lê `sort` (ex.: `year`, `-financial_loss`). Lança ValueError se não for suportado."""
+    sort = args.get("sort", default)
+
+    if sort.lstrip("-") not in INCIDENT_SORTS:
+        raise ValueError(f"sort must be one of: {', '.join(INCIDENT_SORTS)} (prefix '-' for descending)")
+
+    return sort
+
+
+def compile_filters(filters: dict, alias: str = "gct"):
+    """
+    Converte os filtros numa condição SQL parametrizada ("AND ..." para
+    juntar a um WHERE existente).
+
+    Returns:
+        (sql, params)
+    """
+    clauses = []
+    params = []
+
+    for name, value in filters.items():
+        column, operator, _ = INCIDENT_FILTERS[name]
+        column = f"{alias}.`{column}`"
+
+        if operator == "in":
+            if len(value) == 1:
+                clauses.append(f"{column} = %s")
+            else:
+                clauses.append(f"{column} IN ({', '.join(['%s'] * len(value))})")
+            params.extend(value)
+        else:
+            clauses.append(f"{column} {operator} %s")
+            params.append(value)
+
+    sql = "".join(f" AND {clause}" for clause in clauses)
+
+    return sql, params
+
+
+def compile_sort(sort: str, after: dict | None, alias: str = "gct"):
+    """
+    ORDER BY e condição de keyset para a ordenação `sort`, com Id como
+    desempate. As linhas com a coluna a NULL ficam no início em ordem
+    ascendente e no fim em ordem descendente (como no MySQL).
+
+    Returns:
+        (condição "AND ..." ou "", params, ORDER BY)
+    """
+    descending = sort.startswith("-")
+    column = INCIDENT_SORTS[sort.lstrip("-")]
+    direction = "DESC" if descending else "ASC"
+    id_column = f"{alias}.Id"
+
+    if column == "Id":
+        order_by = f"ORDER BY {id_column} {direction}"
+        if after is None:
+            return "", [], order_by
+        return f" AND {id_column} {'<' if descending else '>'} %s", [after["id"]], order_by
+
+    column = f"{alias}.`{column}`"
+    order_by = f"ORDER BY {column} {direction}, {id_column} {direction}"
+
+    if after is None:
+        return "", [], order_by
+
+    value = after.get("value")
+    id = after["id"]
+    following = "<" if descending else ">"
+
+    if value is None:
+        if descending:
+            # NULLs no fim: só faltam os NULL seguintes
+            condition = f"({column} IS NULL AND {id_column} < %s)"
+        else:
+            # NULLs no início: faltam os NULL seguintes e todos os não-NULL
+            condition = f"(({column} IS NULL AND {id_column} > %s) OR {column} IS NOT NULL)"
+        return f" AND {condition}", [id], order_by
+
+    condition = f"({column} {following} %s OR ({column} = %s AND {id_column} {following} %s)"
+    if descending:
+        condition += f" OR {column} IS NULL"
+    condition += ")"
+
+    return f" AND {condition}", [value, value, id], order_by
+
+
+def sort_position(sort: str, id: int, row: dict) -> dict:
+    """Posição da última linha de uma página, para o cursor `after`."""
+    position = {"id": id}
+
+    field = sort.lstrip("-")
+    if field != "id":
+        value = row[_SORT_ROW_KEYS[field]]
+        position["sort"] = sort
+        position["value"] = str(value) if isinstance(value, Decimal) else value
+
+    return position
+
+
+def check_cursor_sort(after: dict | None, sort: str):
+    """O cursor só é válido para a ordenação com que foi criado."""
+    if after is None:
+        return
+
+    expected = sort if sort.lstrip("-") != "id" else None
+    if after.get("sort") != expected:
+        raise ValueError("Cursor does not match sort")
@@ -0,0 +1,198 @@
+import csv
+import decimal
+import io
+import json
+from flask import request
+
+try:
+    import msgpack
+except ImportError:  # dependência opcional: sem msgpack o formato não é oferecido
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # dependência opcional: sem pyarrow o formato não é oferecido
+    pa = None
+
+JSON_MIMETYPE = "application/json"
+MSGPACK_MIMETYPE = "application/msgpack"
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+CSV_MIMETYPE = "text/csv"
+
+# `?format=` -> mimetype (alternativa ao header Accept, ex.: downloads no browser)
+FORMATS = {
+    "json": JSON_MIMETYPE,
+    "msgpack": MSGPACK_MIMETYPE,
+    "arrow": ARROW_MIMETYPE,
+    "csv": CSV_MIMETYPE,
+}
+
+
+def available_mimetypes() -> list:
+    """Mimetypes que a app consegue produzir, com JSON primeiro (preferido em empate)."""
+    mimetypes = [JSON_MIMETYPE]
+
+    if msgpack is not None:
+        mimetypes.append(MSGPACK_MIMETYPE)
+    if pa is not None:
+        mimetypes.append(ARROW_MIMETYPE)
+    mimetypes.append(CSV_MIMETYPE)
+
+    return mimetypes
+
+
+def negotiated_mimetype():
+    """
+    Formato pedido para a resposta de um GET (`?format=` ou header Accept),
+    ou None para JSON. Formatos cuja dependência não está instalada são
+    ignorados (a resposta fica em JSON).
+    """
+    if request.method not in ("GET", "HEAD"):
+        return None
+
+    available = available_mimetypes()
+    name = request.args.get("format")
+
+    if name is not None:
+        mimetype = FORMATS.get(name)
+    else:
+        mimetype = request.accept_mimetypes.best_match(available)
+
+    if mimetype not in available or mimetype == JSON_MIMETYPE:
+        return None
+
+    return mimetype
+
+
+def records(obj) -> list:
+    """
+    Converte uma resposta da API em linhas planas ({coluna: valor}) para
+    formatos tabulares:
+
+    - uma lista dá uma linha por elemento;
+    - num dict, cada lista de objetos (ex.: `by_type` das estatísticas) dá
+      uma linha por elemento com a coluna `section` = chave; os restantes
+      valores (totais) ficam numa primeira linha com `section` vazia;
+    - objetos aninhados são achatados com `.` (ex.: `attack_type.id`).
+    """
+    if isinstance(obj, list):
+        return [_flatten(item) for item in obj]
+
+    if not isinstance(obj, dict):
+        return [{"value": obj}]
+
+    sections = {key: value for key, value in obj.items() if _is_table(value)}
+    if not sections:
+        return [_flatten(obj)]
+
+    rows = []
+    summary = {key: value for key, value in obj.items() if key not in sections}
+    if summary:
+        rows.append({"section": None, **_flatten(summary)})
+
+    for section, items in sections.items():
+        rows.extend({"section": section, **_flatten(item)} for item in items)
+
+    return rows
+
+
+def _is_table(value) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(item, dict) for item in value)
+
+
+def _flatten(value, prefix: str = "", row: dict = None) -> dict:
+    row = {} if row is None else row
+
+    if not isinstance(value, dict):
+        row[prefix or "value"] = value
+        return row
+
+    for key, item in value.items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+
+        if isinstance(item, dict) and item:
+            _flatten(item, name, row)
+        else:
+            row[name] = item
+
+    return row
+
+
+def _columns(rows: list) -> list:
+    """Colunas de todas as linhas, pela ordem em que aparecem."""
+    columns = {}
+    for row in rows:
+        columns.update(dict.fromkeys(row))
+
+    return list(columns)
+
+
+def _cell(value, default, number=str):
+    """Valor de uma célula tabular: escalares nativos, Decimal via `number` e o resto em JSON."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, decimal.Decimal):
+        return number(value)
+    if not isinstance(value, (list, dict)):
+        value = default(value)
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=default, separators=(",", ":"))
+
+    return value
+
+
+def to_msgpack(obj, default) -> bytes:
+    return msgpack.packb(obj, default=default, datetime=False)
+
+
+def to_csv(obj, default) -> bytes:
+    rows = records(obj)
+    output = io.StringIO()
+
+    writer = csv.writer(output)
+    columns = _columns(rows)
+    writer.writerow(columns)
+
+    for row in rows:
+        writer.writerow(_cell(row.get(column), default) for column in columns)
+
+    return output.getvalue().encode()
+
+
+def to_arrow(obj, default) -> bytes:
+    """Tabela Arrow (IPC stream); Decimal vira float64 para leitura direta em pandas/polars."""
+    rows = records(obj)
+    columns = _columns(rows)
+
+    arrays = {}
+    for column in columns:
+        values = [_cell(row.get(column), default, float) for row in rows]
+
+        try:
+            arrays[column] = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Coluna com tipos mistos (ex.: `value` de secções diferentes): texto
+            arrays[column] = pa.array([None if value is None else str(value) for value in values])
+
+    table = pa.table(arrays)
+    sink = pa.BufferOutputStream()
+
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    return sink.getvalue().to_pybytes()
+
+
+ENCODERS = {
+    MSGPACK_MIMETYPE: to_msgpack,
+    ARROW_MIMETYPE: to_arrow,
+    CSV_MIMETYPE: to_csv,
+}
+
+
+def encode(obj, mimetype: str, default) -> bytes:
+    """
+    Serializa `obj` no formato `mimetype`; `default` converte os valores
+    que o formato não suporta (o mesmo hook do provider JSON).
+    """
+    return ENCODERS[mimetype](obj, default)
@@ -1,70 +1,226 @@
-import uuid
 import hashlib
-import base64
+import os
+import struct
+import uuid
+import mysql.connector
 
 class IdMapper:
     """
     Classe para mapear IDs internos da base de dados para IDs externos da API.
-    Usa UUID v4 para gerar IDs únicos e seguros para exposição externa.
+
+    O ID externo é o par (tipo de entidade, ID interno) cifrado com uma chave
+    (ID_CODEC_KEY) e formatado como UUID. Como a cifra é reversível, os dois
+    sentidos são calculados sem tabela nem memória por entidade, e todos os
+    processos com a mesma chave geram e aceitam os mesmos IDs.
+
+    Os UUID v5 publicados por versões anteriores continuam a ser aceites:
+    são procurados na tabela `external_ids` (ver `backfill`).
     """
     _instance = None
-    _internal_to_external = {}
-    _external_to_internal = {}
 
-    def __new__(cls):
+    NAMESPACE = uuid.UUID('6ba7b810-9dad-11d1-80b4-00c04fd430c8')
+
+    # Tipo de entidade -> código gravado no ID (nunca reutilizar um código)
+    ENTITY_TYPES = {
+        "attack": 1,
+        "defense": 2,
+        "vulnerability": 3,
+        "attack_type": 4,
+        "target_industry": 5,
+        "incident": 6,
+    }
+    _ENTITY_NAMES = {code: name for name, code in ENTITY_TYPES.items()}
+
+    # Bloco de 16 bytes: marca, código da entidade, 3 bytes a zero e o ID.
+    # A marca e os zeros permitem reconhecer um UUID que não foi gerado aqui.
+    _BLOCK = struct.Struct(">4sB3sQ")
+    _MAGIC = b"DIVA"
+    _PADDING = b"\0\0\0"
+    _ROUNDS = 4
+
+    # Entidades com UUID v5 antigos -> tabela com os IDs internos
+    TABLES = {
+        "attack": "global_cyber_threats",
+        "defense": "Defense_Mechanisms",
+        "vulnerability": "Security_Vulnerabilities",
+    }
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS `external_ids` (
+          `external_id` char(36) NOT NULL,
+          `entity_type` varchar(32) NOT NULL,
+          `internal_id` int(11) NOT NULL,
+          PRIMARY KEY (`external_id`),
+          UNIQUE KEY `entity` (`entity_type`, `internal_id`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+    """
+
+    def __new__(cls, db=None):
         if cls._instance is None:
+            key = os.getenv("ID_CODEC_KEY")
+
+            # Sem chave própria, qualquer pessoa com o código poderia
+            # decifrar ou forjar IDs: a API recusa arrancar
+            if not key:
+                raise RuntimeError("ID_CODEC_KEY is not set: define a secret key (see LEIA-ME-PRIMEIRO.md)")
+
             cls._instance = super().__new__(cls)
+            cls._instance.db = None
+            cls._instance.key = hashlib.sha256(key.encode()).digest()
+        if db is not None:
+            cls._instance.db = db
         return cls._instance
 
+    def _round(self, number: int, half: int) -> int:
+        digest = hashlib.blake2b(
+            bytes((number,)) + half.to_bytes(8, "big"), key=self.key, digest_size=8
+        ).digest()
+        return int.from_bytes(digest, "big")
+
+    def _encrypt(self, block: bytes) -> bytes:
+        # Rede de Feistel com metades de 64 bits
+        left = int.from_bytes(block[:8], "big")
+        right = int.from_bytes(block[8:], "big")
+
+        for number in range(self._ROUNDS):
+            left, right = right, left ^ self._round(number, right)
+
+        return left.to_bytes(8, "big") + right.to_bytes(8, "big")
+
+    def _decrypt(self, block: bytes) -> bytes:
+        left = int.from_bytes(block[:8], "big")
+        right = int.from_bytes(block[8:], "big")
+
+        for number in reversed(range(self._ROUNDS)):
+            left, right = right ^ self._round(number, left), left
+
+        return left.to_bytes(8, "big") + right.to_bytes(8, "big")
+
     def get_external_id(self, internal_id: int, entity_type: str) -> str:
         """
         Converte um ID interno da BD para um ID externo da API.
-        
+
         Args:
             internal_id: ID interno da base de dados
             entity_type: Tipo da entidade (ex: 'defense', 'vulnerability', 'attack', 'incident')
-        
+
         Returns:
             ID externo (UUID string)
         """
-        key = f"{entity_type}_{internal_id}"
-        
-        if key not in self._internal_to_external:
-            # Gera um UUID baseado no tipo e ID interno para consistência
-            # Usa hash para garantir que o mesmo ID interno sempre gere o mesmo UUID
-            seed = f"{entity_type}_{internal_id}".encode()
-            namespace = uuid.UUID('6ba7b810-9dad-11d1-80b4-00c04fd430c8')
-            external_id = str(uuid.uuid5(namespace, seed.decode()))
-            self._internal_to_external[key] = external_id
-            self._external_to_internal[external_id] = internal_id
-        
-        return self._internal_to_external[key]
-
-    def get_internal_id(self, external_id: str) -> int:
+        block = self._BLOCK.pack(
+            self._MAGIC, self.ENTITY_TYPES[entity_type], self._PADDING, internal_id
+        )
+        return str(uuid.UUID(bytes=self._encrypt(block)))
+
+    def decode(self, external_id: str):
+        """
+        Decifra um ID externo gerado por `get_external_id`.
+
+        Returns:
+            (entity_type, internal_id), ou None se o ID não foi gerado com esta chave
+        """
+        try:
+            block = uuid.UUID(external_id).bytes
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+        magic, code, padding, internal_id = self._BLOCK.unpack(self._decrypt(block))
+
+        if magic != self._MAGIC or padding != self._PADDING or code not in self._ENTITY_NAMES:
+            return None
+
+        return self._ENTITY_NAMES[code], internal_id
+
+    def get_internal_id(self, external_id: str, entity_type: str = None) -> int:
         """
         Converte um ID externo da API para um ID interno da BD.
-        
+
         Args:
             external_id: ID externo (UUID string)
-        
+            entity_type: Se indicado, IDs de outro tipo de entidade são rejeitados
+
         Returns:
-            ID interno da base de dados
+            ID interno da base de dados, ou None se o UUID não for conhecido
         """
-        return self._external_to_internal.get(external_id)
+        entry = self.decode(external_id) or self._legacy_lookup(external_id)
+
+        if entry is None or (entity_type is not None and entry[0] != entity_type):
+            return None
+
+        return entry[1]
+
+    def _legacy_lookup(self, external_id: str):
+        """Procura um UUID v5 antigo na tabela `external_ids`."""
+        conn = self.db.get_connection()
+        cursor = conn.cursor(buffered=True)
+
+        try:
+            cursor.execute(
+                "SELECT entity_type, internal_id FROM external_ids WHERE external_id = %s",
+                (external_id,)
+            )
+        except mysql.connector.Error as err:
+            # Instalação nova, sem UUIDs antigos para resolver
+            if err.errno == 1146:
+                return None
+            raise
+
+        row = cursor.fetchone()
+        if row is None:
+            return None
+
+        return row[0], row[1]
 
     def clear_mapping(self, external_id: str):
         """
-        Remove um mapeamento quando uma entidade é deletada.
+        Remove o UUID antigo (se existir) de uma entidade que foi deletada.
+        Deve ser chamado antes do commit do repositório, na mesma transação.
         """
-        if external_id in self._external_to_internal:
-            internal_id = self._external_to_internal[external_id]
-            # Encontra e remove a chave correspondente
-            for key, ext_id in list(self._internal_to_external.items()):
-                if ext_id == external_id:
-                    del self._internal_to_external[key]
-                    break
-            del self._external_to_internal[external_id]
+        entry = self.decode(external_id) or self._legacy_lookup(external_id)
+        if entry is None:
+            return
+
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                "DELETE FROM external_ids WHERE entity_type = %s AND internal_id = %s",
+                entry
+            )
+        except mysql.connector.Error as err:
+            if err.errno != 1146:
+                raise
+
+    def backfill(self, chunk_size: int = 1000) -> int:
+        """
+        Cria a tabela `external_ids` (se necessário) e grava o UUID v5 antigo
+        de todas as entidades já existentes, para que os IDs publicados antes
+        da cifra continuem válidos. Pode ser executado várias vezes.
+
+        Returns:
+            Número de mapeamentos processados
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(self.SCHEMA)
+
+        total = 0
 
+        for entity_type, table in self.TABLES.items():
+            cursor.execute(f"SELECT Id FROM {table}")
+            ids = [row[0] for row in cursor.fetchall()]
 
+            for start in range(0, len(ids), chunk_size):
+                cursor.executemany(
+                    "INSERT IGNORE INTO external_ids (external_id, entity_type, internal_id) VALUES (%s, %s, %s)",
+                    [
+                        (str(uuid.uuid5(self.NAMESPACE, f"{entity_type}_{internal_id}")), entity_type, internal_id)
+                        for internal_id in ids[start:start + chunk_size]
+                    ]
+                )
+                conn.commit()
 
+            total += len(ids)
 
+        return total
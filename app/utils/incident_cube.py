@@ -0,0 +1,648 @@
+import logging
+import math
+import os
+import time
+import threading
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR
+
+# Segundos entre leituras de incident_changes (escritas de outros processos)
+CUBE_SYNC_SECONDS = float(os.getenv("CUBE_SYNC_SECONDS", "1"))
+
+# Segundos durante os quais um número em falta na sequência de
+# incident_changes é esperado (transação ainda sem commit). Depois disso a
+# transação é dada como desfeita e o número deixa de ser esperado.
+CUBE_GAP_SECONDS = float(os.getenv("CUBE_GAP_SECONDS", "120"))
+
+# Segundos que as linhas de incident_changes são guardadas. Um processo sem
+# consultas ao cubo durante mais tempo do que isto (menos CUBE_GAP_SECONDS)
+# recarrega-o inteiro.
+CUBE_CHANGES_RETENTION_SECONDS = float(os.getenv("CUBE_CHANGES_RETENTION_SECONDS", "3600"))
+
+# Segundos entre limpezas de incident_changes feitas por um processo
+_PRUNE_SECONDS = 60
+
+# Incidentes relidos por consulta (Id IN (...)) em `_refresh`
+_REFRESH_CHUNK_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def _set_bit(buffer: bytearray, id: int):
+    index = id >> 3
+    if index >= len(buffer):
+        buffer.extend(bytes(index - len(buffer) + 1))
+    buffer[index] |= 1 << (id & 7)
+
+
+def _to_int(buffer: bytearray) -> int:
+    return int.from_bytes(buffer, "little")
+
+
+class _SlicedColumn:
+    """
+    Métrica numérica em bit-slices: `slices[j]` tem o bit de cada incidente
+    cujo valor absoluto tem o bit j a 1, por isso a soma sobre um bitmap é
+    sum(2**j * popcount(slices[j] & bitmap)), sem percorrer as linhas.
+    `negative` marca os valores negativos e `present` os não NULL.
+    """
+
+    __slots__ = ("slices", "negative", "present")
+
+    def __init__(self, slices=(), negative=0, present=0):
+        self.slices = list(slices)
+        self.negative = negative
+        self.present = present
+
+    def sum(self, mask: int) -> int:
+        positive = mask & ~self.negative
+        negative = mask & self.negative
+        total = 0
+
+        for j, bits in enumerate(self.slices):
+            total += ((bits & positive).bit_count() - (bits & negative).bit_count()) << j
+
+        return total
+
+    def _magnitude(self, value: int):
+        """(maior, igual): incidentes com |valor| > value e |valor| == value (value >= 0)."""
+        greater = 0
+        equal = self.present
+
+        for j in range(max(len(self.slices), value.bit_length()) - 1, -1, -1):
+            bits = self.slices[j] if j < len(self.slices) else 0
+
+            if value >> j & 1:
+                equal &= bits
+            else:
+                greater |= equal & bits
+                equal &= ~bits
+
+        return greater, equal
+
+    def at_least(self, value: int) -> int:
+        """Bitmap dos incidentes com valor >= value."""
+        positive = self.present & ~self.negative
+
+        if value >= 0:
+            greater, equal = self._magnitude(value)
+            return (greater | equal) & positive
+
+        greater, _ = self._magnitude(-value)
+        return positive | (self.negative & ~greater)
+
+    def at_most(self, value: int) -> int:
+        """Bitmap dos incidentes com valor <= value (valores inteiros)."""
+        return self.present & ~self.at_least(value + 1)
+
+    def _select_magnitude(self, mask: int, k: int, largest: bool) -> int:
+        """k-ésimo menor (ou maior) |valor| entre os incidentes de `mask`, bit a bit."""
+        value = 0
+
+        for j in range(len(self.slices) - 1, -1, -1):
+            ones = mask & self.slices[j]
+            zeros = mask & ~self.slices[j]
+            first, second = (ones, zeros) if largest else (zeros, ones)
+            size = first.bit_count()
+
+            if k <= size:
+                mask = first
+                bit = largest
+            else:
+                k -= size
+                mask = second
+                bit = not largest
+
+            if bit:
+                value |= 1 << j
+
+        return value
+
+    def kth(self, mask: int, k: int) -> int:
+        """k-ésimo menor valor (k=1 é o mínimo) entre os incidentes de `mask` com valor."""
+        mask &= self.present
+        negative = mask & self.negative
+        negatives = negative.bit_count()
+
+        if k <= negatives:
+            return -self._select_magnitude(negative, k, largest=True)
+
+        return self._select_magnitude(mask & ~self.negative, k - negatives, largest=False)
+
+
+class _Snapshot:
+    """Estado imutável do cubo; as atualizações criam um novo (leitores não bloqueiam)."""
+
+    __slots__ = ("dimensions", "metrics", "alive")
+
+    def __init__(self, dimensions, metrics, alive):
+        self.dimensions = dimensions
+        self.metrics = metrics
+        self.alive = alive
+
+
+class IncidentCube:
+    """
+    Índices bitmap em memória sobre global_cyber_threats para análises por
+    qualquer combinação de dimensões (`/analytics/cube`).
+
+    Cada incidente é o bit `Id` de inteiros Python usados como bitmaps: um
+    bitmap por valor de cada dimensão e as métricas em bit-slices
+    (`_SlicedColumn`). Um grupo é a interseção (&) dos bitmaps dos seus
+    valores e as métricas saem de popcounts, sem consultar o MySQL.
+
+    - Carregado no primeiro uso. Não guarda as linhas, só os bitmaps.
+    - Triggers em global_cyber_threats registam o Id de cada INSERT, UPDATE e
+      DELETE em `incident_changes` (de qualquer processo, incluindo a API
+      FastAPI). A cada CUBE_SYNC_SECONDS, ou logo depois de `touch`, o cubo
+      lê as linhas novas de incident_changes, apaga os bits desses Ids em
+      todos os bitmaps e relê só esses incidentes.
+    - A sequência de incident_changes (`seq`) pode ter números em falta de
+      transações ainda abertas: esses números são esperados durante
+      CUBE_GAP_SECONDS (ver `_refresh`).
+    """
+    _instance = None
+
+    # dimensão -> (coluna em global_cyber_threats, tabela de lookup)
+    DIMENSIONS = {
+        "attack_type": ("Attack Type", "Attack_Types"),
+        "attack_source": ("Attack Source", "Attack_Sources"),
+        "target_industry": ("Target Industry", "Target_Industries"),
+        "security_vulnerability": ("Security Vulnerability Type", "Security_Vulnerabilities"),
+        "defense_mechanism": ("Defense Mechanism Used", "Defense_Mechanisms"),
+        "country": ("Country", None),
+        "year": ("Year", None),
+    }
+
+    # métrica -> (coluna, escala para guardar como inteiro)
+    MEASURES = {
+        "loss": ("Financial Loss (in Million $)", 100),
+        "users": ("Number of Affected Users", 1),
+        "resolution": ("Incident Resolution Time (in Hours)", 1),
+    }
+
+    # Métricas pedidas em `metrics`
+    METRICS = (
+        "count",
+        "distinct_countries",
+        "sum_loss", "avg_loss",
+        "sum_users", "avg_users",
+        "sum_resolution", "avg_resolution",
+        "p50_loss", "p95_loss", "p99_loss",
+        "p50_resolution", "p95_resolution", "p99_resolution",
+    )
+
+    # Percentis: prefixo da métrica -> percentil (nearest-rank)
+    PERCENTILES = {"p50": 50, "p95": 95, "p99": 99}
+
+    def __new__(cls, db=None):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance.db = db
+            cls._instance._snapshot = None
+            cls._instance._synced_at = 0.0
+            # Todas as alterações com seq <= _watermark estão no snapshot, e
+            # também as de `_applied` (seq > _watermark)
+            cls._instance._watermark = 0
+            cls._instance._applied = set()
+            cls._instance._touched = False
+            cls._instance._pruned_at = 0.0
+            cls._instance._lock = threading.Lock()
+
+        return cls._instance
+
+    def _select(self, where: str = ""):
+        columns = [column for column, _ in self.DIMENSIONS.values()]
+        columns.extend(column for column, _ in self.MEASURES.values())
+
+        return (
+            "SELECT Id, " + ", ".join(f"`{column}`" for column in columns)
+            + f" FROM global_cyber_threats {where}"
+        )
+
+    def _split(self, row):
+        """(Id, valores das dimensões, valores inteiros das métricas ou None)."""
+        id = row[0]
+        count = len(self.DIMENSIONS)
+        keys = row[1:count + 1]
+
+        measures = []
+        for value, (_, scale) in zip(row[count + 1:], self.MEASURES.values()):
+            measures.append(None if value is None else int(Decimal(value) * scale))
+
+        return id, keys, measures
+
+    def _targets(self, keys, measures):
+        """Bitmaps onde um incidente tem o seu bit (ver `_apply`)."""
+        yield ("alive",)
+
+        for dimension, key in zip(self.DIMENSIONS, keys):
+            yield ("dimension", dimension, key)
+
+        for measure, value in zip(self.MEASURES, measures):
+            if value is None:
+                continue
+
+            yield ("present", measure)
+            if value < 0:
+                yield ("negative", measure)
+                value = -value
+
+            j = 0
+            while value:
+                if value & 1:
+                    yield ("slice", measure, j)
+                value >>= 1
+                j += 1
+
+    CHANGES_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS `incident_changes` (
+          `seq` bigint(20) NOT NULL AUTO_INCREMENT,
+          `incident_id` int(11) NOT NULL,
+          `changed_at` timestamp NOT NULL DEFAULT current_timestamp(),
+          PRIMARY KEY (`seq`),
+          KEY `changed_at` (`changed_at`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+    """
+
+    # trigger -> (evento, linha cujo Id é registado); o Id nunca é alterado
+    CHANGE_TRIGGERS = {
+        "incident_changes_insert": ("INSERT", "NEW"),
+        "incident_changes_update": ("UPDATE", "NEW"),
+        "incident_changes_delete": ("DELETE", "OLD"),
+    }
+
+    @classmethod
+    def change_trigger(cls, name: str) -> str:
+        event, row = cls.CHANGE_TRIGGERS[name]
+
+        return f"""
+            CREATE TRIGGER `{name}` AFTER {event} ON global_cyber_threats
+            FOR EACH ROW INSERT INTO incident_changes (incident_id) VALUES ({row}.Id)
+        """
+
+    def load(self):
+        """Lê global_cyber_threats inteira (em streaming) e substitui o cubo."""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+
+        # Lido na mesma transação (e snapshot do InnoDB) que a tabela: as
+        # alterações mais recentes do que CUBE_GAP_SECONDS são relidas no
+        # `_refresh` seguinte, mesmo que já estejam na leitura completa
+        cursor.execute(
+            """
+            SELECT seq FROM incident_changes
+            WHERE changed_at < NOW() - INTERVAL %s SECOND
+            ORDER BY changed_at DESC, seq DESC
+            LIMIT 1
+            """,
+            (CUBE_GAP_SECONDS,)
+        )
+        row = cursor.fetchall()
+        watermark = row[0][0] if row else 0
+
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(self._select())
+
+        # Bitmaps construídos em bytearrays (um bit por Id) e convertidos no fim
+        dimension_bytes = {dimension: {} for dimension in self.DIMENSIONS}
+        measure_bytes = {measure: ([], bytearray(), bytearray()) for measure in self.MEASURES}
+        alive = bytearray()
+
+        for row in cursor:
+            id, keys, measures = self._split(row)
+            _set_bit(alive, id)
+
+            for dimension, key in zip(self.DIMENSIONS, keys):
+                bitmaps = dimension_bytes[dimension]
+                if key not in bitmaps:
+                    bitmaps[key] = bytearray()
+                _set_bit(bitmaps[key], id)
+
+            for measure, value in zip(self.MEASURES, measures):
+                if value is None:
+                    continue
+
+                slices, negative, present = measure_bytes[measure]
+                _set_bit(present, id)
+                if value < 0:
+                    _set_bit(negative, id)
+                    value = -value
+
+                j = 0
+                while value:
+                    if value & 1:
+                        while j >= len(slices):
+                            slices.append(bytearray())
+                        _set_bit(slices[j], id)
+                    value >>= 1
+                    j += 1
+
+        snapshot = _Snapshot(
+            dimensions={
+                dimension: {key: _to_int(buffer) for key, buffer in bitmaps.items()}
+                for dimension, bitmaps in dimension_bytes.items()
+            },
+            metrics={
+                measure: _SlicedColumn(
+                    [_to_int(buffer) for buffer in slices], _to_int(negative), _to_int(present)
+                )
+                for measure, (slices, negative, present) in measure_bytes.items()
+            },
+            alive=_to_int(alive),
+        )
+
+        self._snapshot = snapshot
+        self._watermark = watermark
+        self._applied = set()
+        self._synced_at = time.monotonic()
+
+        return snapshot
+
+    def touch(self):
+        """
+        Chamado pelos repositórios depois de um commit em global_cyber_threats:
+        a consulta seguinte lê incident_changes sem esperar CUBE_SYNC_SECONDS.
+        """
+        self._touched = True
+
+    def prune_changes(self):
+        """
+        Apaga de incident_changes as linhas com mais de
+        CUBE_CHANGES_RETENTION_SECONDS, no máximo uma vez por minuto em cada
+        processo. Chamado pelos repositórios depois do commit; nunca lança
+        exceções.
+        """
+        now = time.monotonic()
+        if now - self._pruned_at < _PRUNE_SECONDS:
+            return
+        self._pruned_at = now
+
+        conn = self.db.get_connection()
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM incident_changes WHERE changed_at < NOW() - INTERVAL %s SECOND",
+                (CUBE_CHANGES_RETENTION_SECONDS,)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.exception("Could not prune incident_changes")
+
+    def _sync(self) -> _Snapshot:
+        snapshot = self._snapshot
+        now = time.monotonic()
+
+        # Sem consultas há muito tempo: as alterações desde a última leitura
+        # podem já ter sido apagadas por `prune_changes`
+        if snapshot is None or now - self._synced_at > CUBE_CHANGES_RETENTION_SECONDS - CUBE_GAP_SECONDS:
+            with self._lock:
+                if self._snapshot is None or self._snapshot is snapshot:
+                    self._touched = False
+                    return self.load()
+                return self._snapshot
+
+        if not self._touched and now - self._synced_at < CUBE_SYNC_SECONDS:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is not snapshot:
+                return self._snapshot
+
+            self._touched = False
+
+            try:
+                return self._refresh(snapshot)
+            except Exception:
+                # Tenta outra vez na próxima consulta
+                self._touched = True
+                raise
+
+    def _refresh(self, snapshot: _Snapshot) -> _Snapshot:
+        """
+        Lê as alterações de incident_changes depois de `_watermark` e cria o
+        snapshot seguinte (só com `_lock`).
+
+        As alterações são aplicadas pela ordem em que são lidas, não pela de
+        `seq`. Um número em falta (transação ainda sem commit) trava
+        `_watermark`, mas as alterações seguintes já aplicadas ficam em
+        `_applied` e não são repetidas. Se o número continuar em falta depois
+        de CUBE_GAP_SECONDS, a transação é dada como desfeita.
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(
+            """
+            SELECT seq, incident_id, changed_at < NOW() - INTERVAL %s SECOND
+            FROM incident_changes
+            WHERE seq > %s
+            ORDER BY seq
+            """,
+            (CUBE_GAP_SECONDS, self._watermark)
+        )
+        changes = cursor.fetchall()
+
+        ids = {incident_id for seq, incident_id, _ in changes if seq not in self._applied}
+
+        if ids:
+            snapshot = self._apply(snapshot, cursor, ids)
+
+        watermark = self._watermark
+        for seq, _, settled in changes:
+            if seq != watermark + 1 and not settled:
+                break
+            watermark = seq
+
+        self._applied = {seq for seq, _, _ in changes if seq > watermark}
+        self._watermark = watermark
+        self._snapshot = snapshot
+        self._synced_at = time.monotonic()
+
+        return snapshot
+
+    def _apply(self, snapshot: _Snapshot, cursor, ids: set) -> _Snapshot:
+        """
+        Snapshot com os incidentes `ids` relidos: os seus bits são apagados
+        de todos os bitmaps e ligados de novo nos do estado atual (nenhum, se
+        o incidente foi apagado). Os bitmaps sem esses bits são partilhados
+        com o snapshot anterior.
+        """
+        ids = sorted(ids)
+
+        clear = bytearray()
+        for id in ids:
+            _set_bit(clear, id)
+        clear = _to_int(clear)
+
+        # bitmap (ver `_targets`) -> bits a ligar
+        buffers = {}
+        for start in range(0, len(ids), _REFRESH_CHUNK_SIZE):
+            chunk = ids[start:start + _REFRESH_CHUNK_SIZE]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(self._select(f"WHERE Id IN ({placeholders})"), tuple(chunk))
+
+            for row in cursor.fetchall():
+                id, keys, measures = self._split(row)
+                for target in self._targets(keys, measures):
+                    _set_bit(buffers.setdefault(target, bytearray()), id)
+
+        bits = {target: _to_int(buffer) for target, buffer in buffers.items()}
+
+        def update(bitmap: int, target: tuple) -> int:
+            if bitmap & clear:
+                bitmap &= ~clear
+            return bitmap | bits.get(target, 0)
+
+        dimensions = {}
+        for dimension, bitmaps in snapshot.dimensions.items():
+            keys = bitmaps.keys() | {
+                target[2] for target in bits if target[0] == "dimension" and target[1] == dimension
+            }
+
+            updated = {}
+            for key in keys:
+                bitmap = update(bitmaps.get(key, 0), ("dimension", dimension, key))
+                if bitmap:
+                    updated[key] = bitmap
+
+            dimensions[dimension] = updated
+
+        metrics = {}
+        for measure, column in snapshot.metrics.items():
+            width = max([len(column.slices)] + [
+                target[2] + 1 for target in bits if target[0] == "slice" and target[1] == measure
+            ])
+
+            metrics[measure] = _SlicedColumn(
+                [
+                    update(column.slices[j] if j < len(column.slices) else 0, ("slice", measure, j))
+                    for j in range(width)
+                ],
+                update(column.negative, ("negative", measure)),
+                update(column.present, ("present", measure)),
+            )
+
+        return _Snapshot(dimensions, metrics, update(snapshot.alive, ("alive",)))
+
+    @staticmethod
+    def _any_of(bitmaps: dict, keys) -> int:
+        result = 0
+        for key in keys:
+            result |= bitmaps.get(key, 0)
+        return result
+
+    def _filter(self, snapshot: _Snapshot, filters: dict) -> int:
+        """Bitmap dos incidentes que passam nos filtros (nomes de utils.filters.INCIDENT_FILTERS)."""
+        mask = snapshot.alive
+
+        for name, value in filters.items():
+            if name == "country":
+                # Como a collation do MySQL: sem distinguir maiúsculas
+                wanted = {country.casefold() for country in value}
+                bitmaps = snapshot.dimensions["country"]
+                mask &= self._any_of(
+                    bitmaps, [key for key in bitmaps if key is not None and key.casefold() in wanted]
+                )
+            elif name in self.DIMENSIONS:
+                mask &= self._any_of(snapshot.dimensions[name], value)
+            elif name in ("year_from", "year_to"):
+                bitmaps = snapshot.dimensions["year"]
+                mask &= self._any_of(bitmaps, [
+                    year for year in bitmaps
+                    if year is not None and (year >= value if name == "year_from" else year <= value)
+                ])
+            else:
+                measure = "loss" if name.endswith("_loss") else "users"
+                _, scale = self.MEASURES[measure]
+                scaled = Decimal(value) * scale
+                column = snapshot.metrics[measure]
+
+                if name.startswith("min_"):
+                    mask &= column.at_least(int(scaled.to_integral_value(ROUND_CEILING)))
+                else:
+                    mask &= column.at_most(int(scaled.to_integral_value(ROUND_FLOOR)))
+
+            if not mask:
+                break
+
+        return mask
+
+    def query(self, group_by, filters: dict, metrics):
+        """
+        Agrupa os incidentes filtrados pelas dimensões `group_by` e calcula as
+        `metrics` de cada grupo. Retorna [{"key": {dimensão: valor}, métrica:
+        valor}] sem grupos vazios, por ordem decrescente de nº de incidentes.
+        """
+        snapshot = self._sync()
+        mask = self._filter(snapshot, filters)
+
+        groups = [({}, mask)] if mask else []
+
+        for dimension in group_by:
+            bitmaps = snapshot.dimensions[dimension]
+            groups = [
+                ({**key, dimension: value}, group & bitmap)
+                for key, group in groups
+                for value, bitmap in bitmaps.items()
+                if group & bitmap
+            ]
+
+        results = []
+        for key, group in groups:
+            count = group.bit_count()
+            item = {"key": key}
+
+            if "count" in metrics:
+                item["count"] = count
+
+            if "distinct_countries" in metrics:
+                item["distinct_countries"] = len({
+                    country.casefold()
+                    for country, bitmap in snapshot.dimensions["country"].items()
+                    if country is not None and group & bitmap
+                })
+
+            for measure, (_, scale) in self.MEASURES.items():
+                sum_metric = f"sum_{measure}"
+                avg_metric = f"avg_{measure}"
+
+                if sum_metric not in metrics and avg_metric not in metrics:
+                    continue
+
+                column = snapshot.metrics[measure]
+                total = Decimal(column.sum(group)) / scale if scale != 1 else column.sum(group)
+
+                if sum_metric in metrics:
+                    item[sum_metric] = total
+                if avg_metric in metrics:
+                    present = (group & column.present).bit_count()
+                    item[avg_metric] = total / present if present else None
+
+            for measure, (_, scale) in self.MEASURES.items():
+                column = snapshot.metrics[measure]
+                present = None
+
+                for prefix, percentile in self.PERCENTILES.items():
+                    metric = f"{prefix}_{measure}"
+                    if metric not in metrics:
+                        continue
+
+                    if present is None:
+                        present = (group & column.present).bit_count()
+
+                    if not present:
+                        item[metric] = None
+                        continue
+
+                    # Sem ordenar: seleção do k-ésimo valor pelos bit-slices
+                    k = max(1, math.ceil(present * percentile / 100))
+                    value = column.kth(group, k)
+                    item[metric] = Decimal(value) / scale if scale != 1 else value
+
+            results.append((count, item))
+
+        results.sort(key=lambda result: result[0], reverse=True)
+
+        return [item for _, item in results]
@@ -0,0 +1,150 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+class IngestJournal:
+    """
+    Diário local (SQLite em modo WAL) das escritas aceites em modo assíncrono.
+
+    `append` só retorna depois de o registo estar gravado em disco
+    (synchronous=FULL), por isso um pedido respondido com 202 sobrevive a
+    uma falha do processo. Vários processos podem partilhar o mesmo ficheiro:
+    cada lote é reservado (`claim`) por um processo e volta a ficar
+    disponível se não for concluído dentro de `claim_timeout` segundos.
+    """
+
+    PENDING = "pending"
+    APPLIED = "applied"
+    REJECTED = "rejected"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS journal (
+          seq INTEGER PRIMARY KEY AUTOINCREMENT,
+          ticket TEXT NOT NULL UNIQUE,
+          entity TEXT NOT NULL,
+          payload TEXT NOT NULL,
+          status TEXT NOT NULL DEFAULT 'pending',
+          error TEXT,
+          created_at REAL NOT NULL,
+          claimed_by TEXT,
+          claimed_at REAL,
+          finished_at REAL
+        )
+    """
+
+    def __init__(self, path: str, claim_timeout: float = 60):
+        self.path = path
+        self.claim_timeout = claim_timeout
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(self.SCHEMA)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS journal_pending ON journal (status, seq)"
+        )
+
+    def append(self, entity: str, payload) -> str:
+        """Grava um registo pendente e retorna o ticket."""
+        ticket = str(uuid.uuid4())
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO journal (ticket, entity, payload, created_at) VALUES (?, ?, ?, ?)",
+                (ticket, entity, json.dumps(payload), time.time())
+            )
+
+        return ticket
+
+    def claim(self, limit: int):
+        """
+        Reserva até `limit` registos pendentes (os mais antigos primeiro) para
+        este processo. Retorna [(ticket, entity, payload)].
+        """
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    """
+                    SELECT ticket, entity, payload FROM journal
+                    WHERE status = 'pending' AND (claimed_by IS NULL OR claimed_at < ?)
+                    ORDER BY seq
+                    LIMIT ?
+                    """,
+                    (now - self.claim_timeout, limit)
+                ).fetchall()
+
+                self._conn.executemany(
+                    "UPDATE journal SET claimed_by = ?, claimed_at = ? WHERE ticket = ?",
+                    [(self.owner, now, ticket) for ticket, _, _ in rows]
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return [(ticket, entity, json.loads(payload)) for ticket, entity, payload in rows]
+
+    def finish(self, results: dict):
+        """Marca os registos como aplicados ou rejeitados: {ticket: None ou mensagem de erro}."""
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "UPDATE journal SET status = ?, error = ?, finished_at = ? WHERE ticket = ?",
+                    [
+                        (self.APPLIED if error is None else self.REJECTED, error, now, ticket)
+                        for ticket, error in results.items()
+                    ]
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def release(self, tickets):
+        """Devolve registos reservados à fila (ex.: MySQL indisponível)."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE journal SET claimed_by = NULL, claimed_at = NULL WHERE ticket = ?",
+                [(ticket,) for ticket in tickets]
+            )
+
+    def status(self, ticket: str):
+        """{"ticket", "status", "error"} de um ticket, ou None se não existir."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, error FROM journal WHERE ticket = ?",
+                (ticket,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return {"ticket": ticket, "status": row[0], "error": row[1]}
+
+    def oldest_pending(self):
+        """Instante (time.time()) do registo pendente mais antigo, ou None se não houver."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(created_at) FROM journal WHERE status = 'pending'"
+            ).fetchone()
+
+        return row[0]
+
+    def prune(self, older_than: float):
+        """Apaga registos concluídos há mais de `older_than` segundos."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM journal WHERE status != 'pending' AND finished_at < ?",
+                (time.time() - older_than,)
+            )
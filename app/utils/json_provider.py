@@ -0,0 +1,123 @@
+import dataclasses
+import decimal
+import json
+import os
+from datetime import date
+from flask import has_request_context
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+from utils.formats import negotiated_mimetype, encode
+
+try:
+    import orjson
+except ImportError:  # sem orjson usa o json da biblioteca padrão
+    orjson = None
+
+# Serialização de Decimal (ex.: `Financial Loss (in Million $)`):
+# "str" mantém o formato do provider do Flask ("1234.56"), "float" dá um número JSON
+JSON_DECIMAL = os.getenv("JSON_DECIMAL", "str")
+
+
+class RawJSON:
+    """
+    JSON já codificado (bytes), enviado tal como está: no topo de uma
+    resposta (`jsonify(RawJSON(...))`) ou dentro de outra estrutura.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Provider JSON da app: usa orjson (se instalado), não ordena as chaves e
+    serializa Decimal segundo JSON_DECIMAL. Datas continuam no formato HTTP,
+    como no provider do Flask.
+
+    Nos GET, `response` (e por isso `jsonify` e os dicts devolvidos pelas
+    rotas) respeita o formato negociado em utils.formats: MessagePack,
+    Arrow ou CSV em vez de JSON.
+    """
+
+    sort_keys = False
+
+    def __init__(self, app):
+        super().__init__(app)
+
+        if JSON_DECIMAL not in ("str", "float"):
+            raise ValueError("JSON_DECIMAL must be 'str' or 'float'")
+
+        self.decimal = str if JSON_DECIMAL == "str" else float
+        self.default = self._default
+
+    def _default(self, o):
+        if isinstance(o, decimal.Decimal):
+            return self.decimal(o)
+        if isinstance(o, RawJSON):
+            if orjson is not None and hasattr(orjson, "Fragment"):
+                return orjson.Fragment(o.data)
+            return json.loads(o.data)
+        if isinstance(o, date):
+            return http_date(o)
+        if dataclasses.is_dataclass(o) and not isinstance(o, type):
+            return dataclasses.asdict(o)
+        if hasattr(o, "__html__"):
+            return str(o.__html__())
+
+        raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+    def _pretty(self) -> bool:
+        # Como o provider do Flask: indentado em modo debug
+        return (self.compact is None and self._app.debug) or self.compact is False
+
+    def dumps_bytes(self, obj, pretty: bool = False) -> bytes:
+        if isinstance(obj, RawJSON):
+            return obj.data
+
+        if orjson is None:
+            kwargs = {"indent": 2} if pretty else {"separators": (",", ":")}
+            return json.dumps(obj, default=self._default, ensure_ascii=self.ensure_ascii, **kwargs).encode()
+
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+
+        return orjson.dumps(obj, default=self._default, option=option)
+
+    def dumps(self, obj, **kwargs) -> str:
+        if kwargs:
+            # Opções específicas do json (indent, ...): caminho do Flask
+            return super().dumps(obj, **kwargs)
+
+        return self.dumps_bytes(obj).decode()
+
+    def loads_raw(self, o):
+        """Valor Python de um RawJSON (para formatos que não aceitam JSON embutido)."""
+        return orjson.loads(o.data) if orjson is not None else json.loads(o.data)
+
+    def _default_binary(self, o):
+        # Como _default, mas RawJSON é decodificado (msgpack/CSV/Arrow)
+        if isinstance(o, RawJSON):
+            return self.loads_raw(o)
+
+        return self._default(o)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        mimetype = negotiated_mimetype() if has_request_context() else None
+
+        if mimetype is not None:
+            if isinstance(obj, RawJSON):
+                obj = self.loads_raw(obj)
+
+            response = self._app.response_class(encode(obj, mimetype, self._default_binary), mimetype=mimetype)
+        else:
+            data = self.dumps_bytes(obj, pretty=self._pretty())
+            response = self._app.response_class(data + b"\n", mimetype=self.mimetype)
+
+        if has_request_context():
+            response.vary.add("Accept")
+
+        return response
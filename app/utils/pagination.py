@@ -0,0 +1,85 @@
+import os
+import json
+import base64
+import binascii
+from urllib.parse import urlencode
+from flask import request, jsonify
+
+DEFAULT_PAGE_SIZE = int(os.getenv("PAGE_SIZE_DEFAULT", "100"))
+MAX_PAGE_SIZE = int(os.getenv("PAGE_SIZE_MAX", "1000"))
+
+
+def encode_cursor(position: dict) -> str:
+    """
+    Codifica a posição da última linha de uma página num cursor opaco.
+    O cliente só deve devolver o cursor tal como o recebeu.
+    """
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Operação inversa de `encode_cursor`. Lança ValueError se o cursor for inválido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(position, dict) or not _is_id(position.get("id")):
+        raise ValueError("Invalid cursor")
+
+    # `value` vai para os parâmetros do SQL: só escalares (Decimal vem como texto)
+    if not _is_scalar(position.get("value")) or not isinstance(position.get("sort"), (str, type(None))):
+        raise ValueError("Invalid cursor")
+
+    return position
+
+
+def _is_id(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_scalar(value) -> bool:
+    return value is None or (isinstance(value, (str, int, float)) and not isinstance(value, bool))
+
+
+def parse_page_args(args):
+    """
+    Lê `limit` e `after` da query string.
+
+    Returns:
+        (limit, after) onde `after` é a posição decodificada ou None
+        para a primeira página. Lança ValueError com a mensagem para o cliente.
+    """
+    limit = args.get("limit", DEFAULT_PAGE_SIZE)
+
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid limit")
+
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    after = args.get("after")
+
+    return limit, decode_cursor(after) if after else None
+
+
+def paginated_response(items: list, next_position: dict | None):
+    """
+    Devolve a página como array JSON (formato original da rota) e, se houver
+    mais linhas, o cursor da próxima página nos headers `X-Next-Cursor` e `Link`.
+    """
+    response = jsonify(items)
+
+    if next_position is not None:
+        cursor = encode_cursor(next_position)
+        args = request.args.to_dict(flat=False)
+        args["after"] = [cursor]
+
+        response.headers["X-Next-Cursor"] = cursor
+        response.headers["Link"] = f'<{request.base_url}?{urlencode(args, doseq=True)}>; rel="next"'
+
+    return response
@@ -0,0 +1,11 @@
+from flask import request
+
+
+def wants_representation() -> bool:
+    """True se o cliente pediu o recurso atualizado na resposta (`Prefer: return=representation`)."""
+    preferences = request.headers.get("Prefer", "")
+
+    return any(
+        preference.strip().lower() == "return=representation"
+        for preference in preferences.split(",")
+    )
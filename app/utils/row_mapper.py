@@ -0,0 +1,72 @@
+class Call:
+    """Folha de RowMapper: `function(row[coluna])`, com `function` dada em `bind`."""
+
+    __slots__ = ("function", "column")
+
+    def __init__(self, function: str, column: str):
+        self.function = function
+        self.column = column
+
+
+class Lookup:
+    """Folha de RowMapper: `mapping[row[coluna]]`, com `mapping` dado em `bind`."""
+
+    __slots__ = ("mapping", "column")
+
+    def __init__(self, mapping: str, column: str):
+        self.mapping = mapping
+        self.column = column
+
+
+class RowMapper:
+    """
+    Converte tuplos de um cursor (sem `dictionary=True`) no formato da API.
+
+    `shape` descreve o resultado: um dict cujas folhas são nomes de colunas
+    (o valor da coluna), `Call` ou `Lookup`; dicts dentro de `shape` dão
+    dicts aninhados. Na criação é gerada uma função que lê cada coluna pelo
+    índice e constrói o resultado com literais de dict, sem dicts
+    intermédios por linha.
+
+    As funções e mapeamentos referidos pelas folhas são dados em `bind`,
+    normalmente uma vez por consulta.
+    """
+
+    def __init__(self, columns, shape: dict):
+        self.columns = tuple(columns)
+        self.names = []
+        index = {column: position for position, column in enumerate(self.columns)}
+
+        def expression(node) -> str:
+            if isinstance(node, dict):
+                items = ", ".join(f"{key!r}: {expression(value)}" for key, value in node.items())
+                return "{" + items + "}"
+            if isinstance(node, Call):
+                self.names.append(node.function)
+                return f"{node.function}(row[{index[node.column]}])"
+            if isinstance(node, Lookup):
+                self.names.append(node.mapping)
+                return f"{node.mapping}[row[{index[node.column]}]]"
+            return f"row[{index[node]}]"
+
+        body = expression(shape)
+        self.names = sorted(set(self.names))
+
+        source = (
+            f"def bind({', '.join(self.names)}):\n"
+            f"    def map_row(row):\n"
+            f"        return {body}\n"
+            f"    return map_row\n"
+        )
+
+        namespace = {}
+        exec(compile(source, f"<RowMapper {', '.join(shape)}>", "exec"), namespace)
+        self._bind = namespace["bind"]
+        self.source = source
+
+    def bind(self, **functions):
+        """Função row -> resultado, com as funções/mapeamentos das folhas."""
+        return self._bind(**{name: functions[name] for name in self.names})
+
+    def position(self, column: str) -> int:
+        return self.columns.index(column)
@@ -0,0 +1,177 @@
+import hashlib
+import math
+import struct
+
+
+class HyperLogLog:
+    """
+    Contagem aproximada de valores distintos em memória fixa (2**precision
+    registos de um byte). Dois sketches com a mesma precisão juntam-se com
+    `merge` (máximo registo a registo), por isso cada processo pode manter o
+    seu e o resultado é o mesmo que um único sketch com todos os valores.
+
+    Erro padrão relativo: 1.04 / sqrt(2**precision) (1,6% com precision=12).
+    """
+
+    def __init__(self, precision: int = 12, registers: bytes = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+
+        if len(self.registers) != self.size:
+            raise ValueError("Invalid HyperLogLog registers")
+
+    def add(self, value):
+        digest = hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+        hashed = int.from_bytes(digest, "big")
+
+        index = hashed >> (64 - self.precision)
+        remaining = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+
+        # Correção para cardinalidades pequenas (linear counting)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        return bytes([self.precision]) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        return cls(data[0], data[1:])
+
+
+class TDigest:
+    """
+    Quantis aproximados (t-digest com fusão): os valores são agrupados em
+    centróides (média, peso) cujo peso máximo é 4·n·q·(1−q)/compression,
+    menor nas caudas. O erro de posição de um quantil q é no máximo cerca de
+    2·q·(1−q)/compression (com compression=100: 0,5% em p50, 0,1% em p95,
+    0,02% em p99). Os digests juntam-se com `merge`.
+    """
+
+    _HEADER = struct.Struct("<Hdd")
+    _CENTROID = struct.Struct("<dd")
+
+    def __init__(self, compression: int = 100):
+        self.compression = compression
+        self.centroids = []
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer = []
+
+    def add(self, value, weight: float = 1.0):
+        value = float(value)
+        self._buffer.append((value, weight))
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+        if len(self._buffer) >= 5 * self.compression:
+            self._compress()
+
+    def merge(self, other: "TDigest"):
+        other._compress()
+        self._buffer.extend(other.centroids)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+    def _compress(self):
+        if not self._buffer:
+            return
+
+        points = sorted(self.centroids + self._buffer)
+        self._buffer = []
+        total = sum(weight for _, weight in points)
+
+        merged = []
+        cumulative = 0.0
+        mean, weight = points[0]
+
+        for next_mean, next_weight in points[1:]:
+            q = (cumulative + (weight + next_weight) / 2) / total
+            limit = 4 * total * q * (1 - q) / self.compression
+
+            if weight + next_weight <= limit:
+                weight += next_weight
+                mean += (next_mean - mean) * next_weight / weight
+            else:
+                merged.append((mean, weight))
+                cumulative += weight
+                mean, weight = next_mean, next_weight
+
+        merged.append((mean, weight))
+
+        self.centroids = merged
+        self.total = total
+
+    def quantile(self, q: float):
+        """Valor aproximado do quantil q (0..1), ou None se o digest estiver vazio."""
+        self._compress()
+
+        if not self.centroids:
+            return None
+        if len(self.centroids) == 1:
+            return self.centroids[0][0]
+
+        target = q * self.total
+        cumulative = 0.0
+
+        # Interpolação linear entre os centros dos centróides (e min/max nas pontas)
+        previous_mean, previous_center = self.min, 0.0
+
+        for mean, weight in self.centroids:
+            center = cumulative + weight / 2
+
+            if target <= center:
+                if center == previous_center:
+                    return mean
+                return previous_mean + (mean - previous_mean) * (target - previous_center) / (center - previous_center)
+
+            previous_mean, previous_center = mean, center
+            cumulative += weight
+
+        if self.total == previous_center:
+            return self.max
+
+        return previous_mean + (self.max - previous_mean) * (target - previous_center) / (self.total - previous_center)
+
+    def to_bytes(self) -> bytes:
+        self._compress()
+
+        return self._HEADER.pack(self.compression, self.min, self.max) + b"".join(
+            self._CENTROID.pack(mean, weight) for mean, weight in self.centroids
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TDigest":
+        compression, minimum, maximum = cls._HEADER.unpack_from(data)
+
+        digest = cls(compression)
+        digest.min = minimum
+        digest.max = maximum
+        digest.centroids = [
+            digest._CENTROID.unpack_from(data, offset)
+            for offset in range(cls._HEADER.size, len(data), cls._CENTROID.size)
+        ]
+        digest.total = sum(weight for _, weight in digest.centroids)
+
+        return digest
@@ -0,0 +1,55 @@
+import os
+from flask import Response, current_app, request
+from database import db
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "1000"))
+
+
+def wants_ndjson() -> bool:
+    """True se o cliente pediu NDJSON (`Accept: application/x-ndjson` ou `?stream=1`)."""
+    if request.args.get("stream") == "1":
+        return True
+
+    best = request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+
+def ndjson_response(records, lines_per_write: int = 500):
+    """
+    Resposta em streaming com um objeto JSON por linha.
+
+    `records` é um iterador (normalmente `repository.stream()`); cada registo
+    é serializado e enviado em blocos de `lines_per_write` linhas, sem nunca
+    juntar a tabela inteira em memória.
+    """
+    # O provider JSON da app (Decimal, datas, ...) é capturado agora porque o
+    # gerador corre depois de o contexto do request ter terminado
+    dumps = current_app.json.dumps
+
+    def generate():
+        buffer = []
+
+        try:
+            for record in records:
+                buffer.append(dumps(record))
+
+                if len(buffer) >= lines_per_write:
+                    yield "\n".join(buffer) + "\n"
+                    buffer.clear()
+
+            if buffer:
+                yield "\n".join(buffer) + "\n"
+        finally:
+            # Fecha o cursor e devolve a conexão mesmo se o cliente desligar a meio
+            close = getattr(records, "close", None)
+            if close is not None:
+                close()
+
+            # O teardown do request já correu: uma conexão da thread obtida
+            # durante o stream (ex.: recarga do DimensionCache) ficaria
+            # presa, com o snapshot aberto, até ao próximo request
+            db.release_connection()
+
+    return Response(generate(), mimetype=NDJSON_MIMETYPE)
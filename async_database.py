@@ -0,0 +1,82 @@
+import contextlib
+import os
+import aiomysql
+from pymysql.constants import CLIENT
+from dotenv import load_dotenv
+
+# Carregar variáveis do .env (as mesmas do database.py)
+load_dotenv()
+
+DB_USER = os.getenv("MYSQL_USER")
+DB_PASSWORD = os.getenv("MYSQL_PASSWORD")
+DB_HOST = os.getenv("MYSQL_HOST", "localhost")
+DB_PORT = int(os.getenv("MYSQL_PORT", "3306"))
+DB_NAME = os.getenv("MYSQL_DB")
+
+# Conexões abertas por processo. Os pedidos acima deste número esperam por
+# uma conexão livre sem bloquear o event loop
+POOL_MIN_SIZE = int(os.getenv("MYSQL_POOL_MIN_SIZE", "1"))
+POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", "20"))
+
+# Segundos até uma conexão ser reaberta (antes do wait_timeout do MySQL)
+POOL_RECYCLE = int(os.getenv("MYSQL_POOL_RECYCLE", "300"))
+
+
+class AsyncDatabase:
+    """
+    Pool de conexões assíncronas (aiomysql) da Camada 2.
+
+    O pool é criado no arranque da aplicação (`connect`, dentro do event
+    loop do servidor) e fechado no fim (`close`). Os repositórios pedem uma
+    conexão por operação: `async with db.connection() as conn` para leituras
+    e `async with db.transaction() as conn` para escritas.
+    """
+
+    def __init__(self):
+        self.pool = None
+
+    async def connect(self):
+        if self.pool is None:
+            self.pool = await aiomysql.create_pool(
+                host=DB_HOST,
+                port=DB_PORT,
+                user=DB_USER,
+                password=DB_PASSWORD,
+                db=DB_NAME,
+                charset="utf8mb4",
+                # Leituras em autocommit; as escritas abrem uma transação (`transaction`)
+                autocommit=True,
+                # rowcount de UPDATE conta as linhas encontradas, mesmo sem alterações
+                client_flag=CLIENT.FOUND_ROWS,
+                minsize=POOL_MIN_SIZE,
+                maxsize=POOL_SIZE,
+                pool_recycle=POOL_RECYCLE,
+            )
+
+    async def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+            self.pool = None
+
+    def connection(self):
+        return self.pool.acquire()
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        """Conexão com uma transação: commit no fim do bloco, rollback se houver exceção."""
+        async with self.pool.acquire() as conn:
+            await conn.begin()
+
+            try:
+                yield conn
+            except BaseException:
+                # Um pedido cancelado a meio de uma consulta já fechou a conexão
+                if not conn.closed:
+                    await conn.rollback()
+                raise
+
+            await conn.commit()
+
+
+db = AsyncDatabase()
@@ -3193,7 +3193,15 @@ ALTER TABLE `global_cyber_threats`
   ADD KEY `Target Industry` (`Target Industry`),
   ADD KEY `Attack Source` (`Attack Source`),
   ADD KEY `Security Vulnerability Type` (`Security Vulnerability Type`),
-  ADD KEY `Defense Mechanism Used` (`Defense Mechanism Used`);
+  ADD KEY `Defense Mechanism Used` (`Defense Mechanism Used`),
+  ADD KEY `Year_Totals` (`Year`,`Financial Loss (in Million $)`,`Number of Affected Users`,`Incident Resolution Time (in Hours)`),
+  ADD KEY `Country_Totals` (`Country`,`Financial Loss (in Million $)`,`Number of Affected Users`,`Incident Resolution Time (in Hours)`),
+  ADD KEY `Breakdown` (`Attack Type`,`Defense Mechanism Used`,`Security Vulnerability Type`,`Target Industry`),
+  ADD KEY `Country_Year` (`Country`,`Year`),
+  ADD KEY `Attack Type_Year` (`Attack Type`,`Year`),
+  ADD KEY `Target Industry_Year` (`Target Industry`,`Year`),
+  ADD KEY `Financial Loss (in Million $)` (`Financial Loss (in Million $)`),
+  ADD KEY `Number of Affected Users` (`Number of Affected Users`);
 
 --
 -- Indexes for table `Security_Vulnerabilities`
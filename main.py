@@ -23,6 +23,10 @@
 from fastapi import FastAPI, HTTPException, Query, status #cria a app/http e permite que sejam enviados os erros
 from pydantic import BaseModel, Field #metodo de criação de modelos de validação
 from typing import Optional, List, Dict, Any  # o campo valor pode ser opcional ou uma lista
+from contextlib import asynccontextmanager
+
+import services
+from async_database import db
 
 # ==========================================================
 # CAMADA 1 (APRESENTAÇÃO)
@@ -31,10 +35,19 @@ from typing import Optional, List, Dict, Any  # o campo valor pode ser opcional
 # - Define respostas HTTP
 # ==========================================================
 
+# O pool de conexões MySQL (async_database.py) é aberto no arranque, dentro
+# do event loop do servidor, e fechado no fim
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await db.connect()
+    yield
+    await db.close()
+
 app = FastAPI(
     title="Cybersecurity Threats API",
     version="1.0.0",
-    description="Camada 1: Rotas REST + validação + OpenAPI3"
+    description="Camada 1: Rotas REST + validação + OpenAPI3",
+    lifespan=lifespan
 )
 
 #Criação dos dicionários
@@ -143,50 +156,54 @@ class IncidentOut(BaseModel):
 # HEALTH (para testar se a API está a correr)
 # ==========================================================
 @app.get("/health", tags=["System"])
-def health():
+async def health():
     return {"status": "ok"}
 
 
 # ==========================================================
-# SERVIÇO: DEFESAS (Camada 2: "Defesas") vai criar as routas para a defense, e posteriomente é necessário alterar após ser feita a camada 2, 
-#vai ser feito em todas as varieaveis.
+# SERVIÇO: DEFESAS (Camada 2: "Defesas"), implementado em services.py.
+# As rotas /stats vêm antes de /{id}: caso contrário "stats" seria lido como id.
 # CRUD (5) + stats (1) = 6
 # ==========================================================
 @app.get("/defenses", response_model=List[DefenseOut], tags=["Defesas"])
-def list_defenses():
-    # TODO (Camada 2): return services.list_defenses()
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
+async def list_defenses():
+    return await services.list_defenses()
+
+@app.get("/defenses/stats", tags=["Defesas"])
+async def defenses_stats():
+    return await services.defenses_stats()
 
 @app.get("/defenses/{defense_id}", response_model=DefenseOut, tags=["Defesas"])
-def get_defense(defense_id: int):
+async def get_defense(defense_id: int):
     if defense_id <= 0:
         raise HTTPException(status_code=400, detail="Invalid defense id")
-    # TODO (Camada 2): return services.get_defense(defense_id)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
+    defense = await services.get_defense(defense_id)
+    if defense is None:
+        raise HTTPException(status_code=404, detail="Defense not found")
+    return defense
 
 @app.post("/defenses", response_model=DefenseOut, status_code=status.HTTP_201_CREATED, tags=["Defesas"])
-def create_defense(payload: DefenseIn):
-    # TODO (Camada 2): return services.create_defense(payload)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
+async def create_defense(payload: DefenseIn):
+    return await services.create_defense(payload)
 
 @app.put("/defenses/{defense_id}", response_model=DefenseOut, tags=["Defesas"])
-def update_defense(defense_id: int, payload: DefenseIn):
+async def update_defense(defense_id: int, payload: DefenseIn):
     if defense_id <= 0:
         raise HTTPException(status_code=400, detail="Invalid defense id")
-    # TODO (Camada 2): return services.update_defense(defense_id, payload)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
+    defense = await services.update_defense(defense_id, payload)
+    if defense is None:
+        raise HTTPException(status_code=404, detail="Defense not found")
+    return defense
 
-@app.delete("/defenses/{defense_id}", tags=["Defesas"])
-def delete_defense(defense_id: int):
+@app.delete("/defenses/{defense_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Defesas"])
+async def delete_defense(defense_id: int):
     if defense_id <= 0:
         raise HTTPException(status_code=400, detail="Invalid defense id")
-    # TODO (Camada 2): services.delete_defense(defense_id)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
-
-@app.get("/defenses/stats", tags=["Defesas"])
-def defenses_stats():
-    # TODO (Camada 2): return services.defenses_stats()
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
+    result = await services.delete_defense(defense_id)
+    if result == "FK":
+        raise HTTPException(status_code=409, detail="Defense is used by incidents")
+    if not result:
+        raise HTTPException(status_code=404, detail="Defense not found")
 
 
 # ==========================================================
@@ -194,40 +211,44 @@ def defenses_stats():
 # CRUD (5) + stats (1) = 6
 # ==========================================================
 @app.get("/attacks", response_model=List[AttackTypeOut], tags=["Ataques"])
-def list_attacks():
-    # TODO (Camada 2)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
+async def list_attacks():
+    return await services.list_attacks()
+
+@app.get("/attacks/stats", tags=["Ataques"])
+async def attacks_stats():
+    return await services.attacks_stats()
 
 @app.get("/attacks/{attack_id}", response_model=AttackTypeOut, tags=["Ataques"])
-def get_attack(attack_id: int):
+async def get_attack(attack_id: int):
     if attack_id <= 0:
         raise HTTPException(status_code=400, detail="Invalid attack id")
-    # TODO (Camada 2)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
+    attack = await services.get_attack(attack_id)
+    if attack is None:
+        raise HTTPException(status_code=404, detail="Attack type not found")
+    return attack
 
 @app.post("/attacks", response_model=AttackTypeOut, status_code=status.HTTP_201_CREATED, tags=["Ataques"])
-def create_attack(payload: AttackTypeIn):
-    # TODO (Camada 2)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
+async def create_attack(payload: AttackTypeIn):
+    return await services.create_attack(payload)
 
 @app.put("/attacks/{attack_id}", response_model=AttackTypeOut, tags=["Ataques"])
-def update_attack(attack_id: int, payload: AttackTypeIn):
+async def update_attack(attack_id: int, payload: AttackTypeIn):
     if attack_id <= 0:
         raise HTTPException(status_code=400, detail="Invalid attack id")
-    # TODO (Camada 2)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
+    attack = await services.update_attack(attack_id, payload)
+    if attack is None:
+        raise HTTPException(status_code=404, detail="Attack type not found")
+    return attack
 
-@app.delete("/attacks/{attack_id}", tags=["Ataques"])
-def delete_attack(attack_id: int):
+@app.delete("/attacks/{attack_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Ataques"])
+async def delete_attack(attack_id: int):
     if attack_id <= 0:
         raise HTTPException(status_code=400, detail="Invalid attack id")
-    # TODO (Camada 2)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
-
-@app.get("/attacks/stats", tags=["Ataques"])
-def attacks_stats():
-    # TODO (Camada 2)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
+    result = await services.delete_attack(attack_id)
+    if result == "FK":
+        raise HTTPException(status_code=409, detail="Attack type is used by incidents")
+    if not result:
+        raise HTTPException(status_code=404, detail="Attack type not found")
 
 
 # ==========================================================
@@ -235,40 +256,44 @@ def attacks_stats():
 # CRUD (5) + stats (1) = 6
 # ==========================================================
 @app.get("/vulnerabilities", response_model=List[VulnerabilityOut], tags=["Vulnerabilidades"])
-def list_vulnerabilities():
-    # TODO (Camada 2)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
+async def list_vulnerabilities():
+    return await services.list_vulnerabilities()
+
+@app.get("/vulnerabilities/stats", tags=["Vulnerabilidades"])
+async def vulnerabilities_stats():
+    return await services.vulnerabilities_stats()
 
 @app.get("/vulnerabilities/{vuln_id}", response_model=VulnerabilityOut, tags=["Vulnerabilidades"])
-def get_vulnerability(vuln_id: int):
+async def get_vulnerability(vuln_id: int):
     if vuln_id <= 0:
         raise HTTPException(status_code=400, detail="Invalid vulnerability id")
-    # TODO (Camada 2)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
+    vulnerability = await services.get_vulnerability(vuln_id)
+    if vulnerability is None:
+        raise HTTPException(status_code=404, detail="Vulnerability not found")
+    return vulnerability
 
 @app.post("/vulnerabilities", response_model=VulnerabilityOut, status_code=status.HTTP_201_CREATED, tags=["Vulnerabilidades"])
-def create_vulnerability(payload: VulnerabilityIn):
-    # TODO (Camada 2)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
+async def create_vulnerability(payload: VulnerabilityIn):
+    return await services.create_vulnerability(payload)
 
 @app.put("/vulnerabilities/{vuln_id}", response_model=VulnerabilityOut, tags=["Vulnerabilidades"])
-def update_vulnerability(vuln_id: int, payload: VulnerabilityIn):
+async def update_vulnerability(vuln_id: int, payload: VulnerabilityIn):
     if vuln_id <= 0:
         raise HTTPException(status_code=400, detail="Invalid vulnerability id")
-    # TODO (Camada 2)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
+    vulnerability = await services.update_vulnerability(vuln_id, payload)
+    if vulnerability is None:
+        raise HTTPException(status_code=404, detail="Vulnerability not found")
+    return vulnerability
 
-@app.delete("/vulnerabilities/{vuln_id}", tags=["Vulnerabilidades"])
-def delete_vulnerability(vuln_id: int):
+@app.delete("/vulnerabilities/{vuln_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Vulnerabilidades"])
+async def delete_vulnerability(vuln_id: int):
     if vuln_id <= 0:
         raise HTTPException(status_code=400, detail="Invalid vulnerability id")
-    # TODO (Camada 2)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
-
-@app.get("/vulnerabilities/stats", tags=["Vulnerabilidades"])
-def vulnerabilities_stats():
-    # TODO (Camada 2)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
+    result = await services.delete_vulnerability(vuln_id)
+    if result == "FK":
+        raise HTTPException(status_code=409, detail="Vulnerability is used by incidents")
+    if not result:
+        raise HTTPException(status_code=404, detail="Vulnerability not found")
 
 
 # ==========================================================
@@ -276,40 +301,48 @@ def vulnerabilities_stats():
 # CRUD (5) + stats (1) = 6
 # ==========================================================
 @app.get("/incidents", response_model=List[IncidentOut], tags=["Incidentes"])
-def list_incidents(
+async def list_incidents(
     year: Optional[int] = Query(None, description="Filtrar por ano"),
     country: Optional[str] = Query(None, description="Filtrar por país")
 ):
-    # TODO (Camada 2): return services.list_incidents(year, country)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
+    return await services.list_incidents(year, country)
+
+@app.get("/incidents/stats", tags=["Incidentes"])
+async def incidents_stats():
+    # Estatísticas: perdas totais, por tipo, por país e por ano
+    return await services.incidents_stats()
 
 @app.get("/incidents/{incident_id}", response_model=IncidentOut, tags=["Incidentes"])
-def get_incident(incident_id: int):
+async def get_incident(incident_id: int):
     if incident_id <= 0:
         raise HTTPException(status_code=400, detail="Invalid incident id")
-    # TODO (Camada 2)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
+    incident = await services.get_incident(incident_id)
+    if incident is None:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    return incident
 
 @app.post("/incidents", response_model=IncidentOut, status_code=status.HTTP_201_CREATED, tags=["Incidentes"])
-def create_incident(payload: IncidentIn):
-    # TODO (Camada 2): validar FKs + inserir
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
+async def create_incident(payload: IncidentIn):
+    # As FKs (tipo, indústria, origem, vulnerabilidade, defesa) são validadas pelo MySQL
+    incident = await services.create_incident(payload)
+    if incident == "FK":
+        raise HTTPException(status_code=400, detail="Invalid reference")
+    return incident
 
 @app.put("/incidents/{incident_id}", response_model=IncidentOut, tags=["Incidentes"])
-def update_incident(incident_id: int, payload: IncidentIn):
+async def update_incident(incident_id: int, payload: IncidentIn):
     if incident_id <= 0:
         raise HTTPException(status_code=400, detail="Invalid incident id")
-    # TODO (Camada 2)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
-
-@app.delete("/incidents/{incident_id}", tags=["Incidentes"])
-def delete_incident(incident_id: int):
+    incident = await services.update_incident(incident_id, payload)
+    if incident == "FK":
+        raise HTTPException(status_code=400, detail="Invalid reference")
+    if incident is None:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    return incident
+
+@app.delete("/incidents/{incident_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Incidentes"])
+async def delete_incident(incident_id: int):
     if incident_id <= 0:
         raise HTTPException(status_code=400, detail="Invalid incident id")
-    # TODO (Camada 2)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
-
-@app.get("/incidents/stats", tags=["Incidentes"])
-def incidents_stats():
-    # TODO (Camada 2): estatísticas (ex.: perdas totais, por ano, por tipo)
-    raise HTTPException(status_code=501, detail="Implementar na Camada 2")
+    if not await services.delete_incident(incident_id):
+        raise HTTPException(status_code=404, detail="Incident not found")
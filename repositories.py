@@ -0,0 +1,567 @@
+import asyncio
+import logging
+import os
+import time
+from decimal import Decimal
+import aiomysql
+
+# ==========================================================
+# CAMADA 3 (DADOS) - repositórios assíncronos
+# - Mesmo SQL que os repositórios da API Flask (app/repository)
+# - Cada operação pede uma conexão ao pool (async_database.py) e
+#   devolve-a no fim, sem bloquear o event loop à espera do MySQL
+# ==========================================================
+
+# Erros do MySQL tratados pelos repositórios
+FK_PARENT_ROW = 1451  # linha referenciada por global_cyber_threats
+FK_NO_PARENT = 1452   # chave estrangeira inexistente
+
+# Segundos que as linhas de incident_changes (registo das escritas lido pelo
+# cubo da API Flask) são guardadas: o mesmo valor que em app/utils/incident_cube.py
+CUBE_CHANGES_RETENTION_SECONDS = float(os.getenv("CUBE_CHANGES_RETENTION_SECONDS", "3600"))
+
+logger = logging.getLogger(__name__)
+
+
+class IncidentAggregateRepository:
+    """
+    Tabela `incident_aggregates` (criada por `flask --app main migrate`):
+    contagem e somas de global_cyber_threats por dimensão, mais uma linha
+    'total', com a contagem dos valores não NULL de cada soma (as médias
+    dividem por ela, como AVG()). As inserções e remoções de incidentes
+    atualizam-na na mesma transação, como em
+    app/repository/incident_aggregate_repository.py, e os UPDATE são contados
+    pelo trigger `incident_aggregates_update` (migração 8), por isso as
+    estatísticas das duas APIs leem os mesmos valores.
+    """
+
+    TOTAL = "total"
+
+    # dimensão -> coluna em global_cyber_threats
+    DIMENSIONS = {
+        "attack_type": "Attack Type",
+        "target_industry": "Target Industry",
+        "security_vulnerability": "Security Vulnerability Type",
+        "defense_mechanism": "Defense Mechanism Used",
+        "country": "Country",
+        "year": "Year",
+    }
+
+    def __init__(self, db):
+        self.db = db
+
+    @staticmethod
+    def _key(value) -> str:
+        # NULL é guardado como '' (a chave primária não aceita NULL)
+        return "" if value is None else str(value)
+
+    async def apply(self, cursor, added=(), removed=()):
+        """
+        Soma as linhas `added` e subtrai as linhas `removed` (dicts com os
+        nomes das colunas de global_cyber_threats) dentro da transação de
+        `cursor`.
+        """
+        deltas = {}
+
+        for rows, sign in ((added, 1), (removed, -1)):
+            for row in rows:
+                loss = row.get("Financial Loss (in Million $)")
+                users = row.get("Number of Affected Users")
+                hours = row.get("Incident Resolution Time (in Hours)")
+
+                keys = [(self.TOTAL, "")]
+                keys.extend(
+                    (dimension, self._key(row.get(column)))
+                    for dimension, column in self.DIMENSIONS.items()
+                )
+
+                for key in keys:
+                    delta = deltas.setdefault(key, [0, Decimal(0), 0, 0, 0, 0, 0])
+                    delta[0] += sign
+
+                    if loss is not None:
+                        delta[1] += sign * Decimal(str(loss))
+                        delta[4] += sign
+
+                    if users is not None:
+                        delta[2] += sign * users
+                        delta[5] += sign
+
+                    if hours is not None:
+                        delta[3] += sign * hours
+                        delta[6] += sign
+
+        deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+
+        if not deltas:
+            return
+
+        # Ordem fixa das chaves (evita deadlocks entre escritas concorrentes)
+        await cursor.executemany(
+            """
+            INSERT INTO incident_aggregates
+                (dimension, dimension_key, incident_count, total_financial_loss,
+                 total_affected_users, total_resolution_hours, financial_loss_count,
+                 affected_users_count, resolution_hours_count)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                incident_count = incident_count + VALUES(incident_count),
+                total_financial_loss = total_financial_loss + VALUES(total_financial_loss),
+                total_affected_users = total_affected_users + VALUES(total_affected_users),
+                total_resolution_hours = total_resolution_hours + VALUES(total_resolution_hours),
+                financial_loss_count = financial_loss_count + VALUES(financial_loss_count),
+                affected_users_count = affected_users_count + VALUES(affected_users_count),
+                resolution_hours_count = resolution_hours_count + VALUES(resolution_hours_count)
+            """,
+            [key + tuple(delta) for key, delta in sorted(deltas.items())]
+        )
+
+    async def total(self):
+        async with self.db.connection() as conn, conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(
+                """
+                SELECT incident_count, total_financial_loss, total_affected_users, total_resolution_hours,
+                       financial_loss_count, affected_users_count, resolution_hours_count
+                FROM incident_aggregates
+                WHERE dimension = %s AND dimension_key = ''
+                """,
+                (self.TOTAL,)
+            )
+
+            return await cursor.fetchone() or {
+                "incident_count": 0,
+                "total_financial_loss": Decimal(0),
+                "total_affected_users": 0,
+                "total_resolution_hours": 0,
+                "financial_loss_count": 0,
+                "affected_users_count": 0,
+                "resolution_hours_count": 0
+            }
+
+    async def by_dimension(self, dimension: str):
+        """Linhas (dimension_key, incident_count, totais) de uma dimensão, sem grupos vazios."""
+        async with self.db.connection() as conn, conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(
+                """
+                SELECT dimension_key, incident_count, total_financial_loss,
+                       total_affected_users, total_resolution_hours, financial_loss_count,
+                       affected_users_count, resolution_hours_count
+                FROM incident_aggregates
+                WHERE dimension = %s AND incident_count > 0
+                """,
+                (dimension,)
+            )
+
+            return await cursor.fetchall()
+
+    async def by_lookup(self, dimension: str, table: str, name_column: str):
+        """Agregados de uma dimensão para todas as linhas da tabela de lookup (LEFT JOIN)."""
+        async with self.db.connection() as conn, conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(
+                f"""
+                SELECT
+                    lkp.Id AS id,
+                    lkp.`{name_column}` AS name,
+                    COALESCE(agg.incident_count, 0) AS incident_count,
+                    COALESCE(agg.total_financial_loss, 0) AS total_financial_loss,
+                    COALESCE(agg.total_affected_users, 0) AS total_affected_users,
+                    COALESCE(agg.total_resolution_hours, 0) AS total_resolution_hours,
+                    COALESCE(agg.financial_loss_count, 0) AS financial_loss_count,
+                    COALESCE(agg.affected_users_count, 0) AS affected_users_count,
+                    COALESCE(agg.resolution_hours_count, 0) AS resolution_hours_count
+                FROM {table} lkp
+                LEFT JOIN incident_aggregates agg
+                    ON agg.dimension = %s AND agg.dimension_key = CAST(lkp.Id AS CHAR)
+                ORDER BY incident_count DESC
+                """,
+                (dimension,)
+            )
+
+            return await cursor.fetchall()
+
+
+class LookupRepository:
+    """
+    CRUD de uma tabela de lookup (Id, nome), com o mesmo SQL dos
+    repositórios de app/repository. As subclasses definem a tabela, a
+    coluna do nome, o campo na API e a dimensão em incident_aggregates.
+    """
+
+    TABLE = None
+    COLUMN = None
+    FIELD = None
+    DIMENSION = None
+
+    def __init__(self, db, aggregates: IncidentAggregateRepository):
+        self.db = db
+        self.aggregates = aggregates
+
+    def _row(self, id: int, name: str) -> dict:
+        return {"id": id, self.FIELD: name}
+
+    async def list(self):
+        async with self.db.connection() as conn, conn.cursor() as cursor:
+            await cursor.execute(f"SELECT Id, `{self.COLUMN}` FROM {self.TABLE}")
+
+            return [self._row(id, name) for id, name in await cursor.fetchall()]
+
+    async def get_by_id(self, id: int):
+        async with self.db.connection() as conn, conn.cursor() as cursor:
+            await cursor.execute(
+                f"SELECT Id, `{self.COLUMN}` FROM {self.TABLE} WHERE Id = %s",
+                (id,)
+            )
+
+            row = await cursor.fetchone()
+
+        if row is None:
+            return None
+
+        return self._row(*row)
+
+    async def create(self, name: str):
+        async with self.db.transaction() as conn, conn.cursor() as cursor:
+            await cursor.execute(
+                f"INSERT INTO {self.TABLE} (`{self.COLUMN}`) VALUES (%s)",
+                (name,)
+            )
+
+            return self._row(cursor.lastrowid, name)
+
+    async def update(self, id: int, name: str):
+        async with self.db.transaction() as conn, conn.cursor() as cursor:
+            await cursor.execute(
+                f"UPDATE {self.TABLE} SET `{self.COLUMN}` = %s WHERE Id = %s",
+                (name, id)
+            )
+
+            if cursor.rowcount == 0:
+                return None
+
+        return self._row(id, name)
+
+    async def delete(self, id: int):
+        try:
+            async with self.db.transaction() as conn, conn.cursor() as cursor:
+                await cursor.execute(
+                    f"DELETE FROM {self.TABLE} WHERE Id = %s",
+                    (id,)
+                )
+
+                return cursor.rowcount > 0
+
+        except aiomysql.IntegrityError as err:
+            if err.args[0] == FK_PARENT_ROW:
+                return "FK"
+
+            raise
+
+    async def usage(self):
+        """Agregados de incidentes de cada linha da tabela (mais usados primeiro)."""
+        return await self.aggregates.by_lookup(self.DIMENSION, self.TABLE, self.COLUMN)
+
+
+class DefenseRepository(LookupRepository):
+    TABLE = "Defense_Mechanisms"
+    COLUMN = "Mechanism"
+    FIELD = "mechanism"
+    DIMENSION = "defense_mechanism"
+
+    async def statistics(self):
+        """
+        Total de mecanismos, uso de cada um em incidentes e efetividade
+        (tempo médio de resolução), lidos de incident_aggregates.
+        """
+        usage_stats = await self.usage()
+
+        return {
+            "total_defense_mechanisms": len(usage_stats),
+            "mechanisms": [
+                {
+                    "defense_mechanism": self._row(item["id"], item["name"]),
+                    "usage_count": item["incident_count"],
+                    "avg_resolution_time_hours": item["total_resolution_hours"] / item["resolution_hours_count"] if item["resolution_hours_count"] else 0.0,
+                    "total_financial_loss": float(item["total_financial_loss"]),
+                    "total_affected_users": item["total_affected_users"]
+                }
+                for item in usage_stats
+            ]
+        }
+
+
+class AttackTypeRepository(LookupRepository):
+    TABLE = "Attack_Types"
+    COLUMN = "Type"
+    FIELD = "type"
+    DIMENSION = "attack_type"
+
+    async def statistics(self):
+        """Total de tipos de ataque e incidentes, perdas e utilizadores afetados por tipo."""
+        usage_stats = await self.usage()
+
+        return {
+            "total_attack_types": len(usage_stats),
+            "attack_types": [
+                {
+                    "attack_type": self._row(item["id"], item["name"]),
+                    "count": item["incident_count"],
+                    "total_financial_loss": float(item["total_financial_loss"]),
+                    "total_affected_users": item["total_affected_users"]
+                }
+                for item in usage_stats
+            ]
+        }
+
+
+class VulnerabilityRepository(LookupRepository):
+    TABLE = "Security_Vulnerabilities"
+    COLUMN = "Vulnerability"
+    FIELD = "vulnerability"
+    DIMENSION = "security_vulnerability"
+
+    async def statistics(self):
+        """Total de vulnerabilidades, uso de cada uma e impacto financeiro por vulnerabilidade."""
+        usage_stats = await self.usage()
+
+        result = {
+            "total_vulnerabilities": len(usage_stats),
+            "vulnerabilities": []
+        }
+
+        for item in usage_stats:
+            usage_count = item["incident_count"]
+
+            result["vulnerabilities"].append({
+                "vulnerability": self._row(item["id"], item["name"]),
+                "usage_count": usage_count,
+                "total_financial_loss": float(item["total_financial_loss"]),
+                "avg_financial_loss": float(item["total_financial_loss"] / item["financial_loss_count"]) if item["financial_loss_count"] else 0.0,
+                "total_affected_users": item["total_affected_users"],
+                "avg_affected_users": item["total_affected_users"] / item["affected_users_count"] if item["affected_users_count"] else 0.0
+            })
+
+        return result
+
+
+class IncidentRepository:
+    # Campo da API (IncidentIn/IncidentOut) -> coluna de global_cyber_threats
+    FIELD_COLUMNS = {
+        "country": "Country",
+        "year": "Year",
+        "attack_type": "Attack Type",
+        "target_industry": "Target Industry",
+        "financial_loss_million": "Financial Loss (in Million $)",
+        "affected_users": "Number of Affected Users",
+        "attack_source": "Attack Source",
+        "security_vulnerability_type": "Security Vulnerability Type",
+        "defense_mechanism_used": "Defense Mechanism Used",
+        "incident_resolution_time_hours": "Incident Resolution Time (in Hours)",
+    }
+
+    _SELECT = "SELECT Id AS id, " + ", ".join(
+        f"`{column}` AS {field}" for field, column in FIELD_COLUMNS.items()
+    ) + " FROM global_cyber_threats"
+
+    # Os sketches de `approx=1` (incident_sketches) só são calculados pela API
+    # Flask. Cada escrita desta API marca-os como desatualizados na mesma
+    # transação (como IncidentSketchRepository.mark_dirty), para que
+    # `flask --app main rebuild-sketches --if-dirty` os recalcule.
+    _MARK_SKETCHES_DIRTY = """
+        UPDATE incident_sketches SET dirty_since = COALESCE(dirty_since, CURRENT_TIMESTAMP)
+        WHERE dimension = 'total' AND dimension_key = ''
+    """
+
+    # Instante da última limpeza de incident_changes feita por este processo
+    _pruned_at = 0.0
+
+    def __init__(self, db, aggregates: IncidentAggregateRepository):
+        self.db = db
+        self.aggregates = aggregates
+
+    async def _prune_changes(self):
+        """
+        Como IncidentCube.prune_changes: apaga as linhas de incident_changes
+        mais antigas do que CUBE_CHANGES_RETENTION_SECONDS, no máximo uma vez
+        por minuto. Nunca lança exceções.
+        """
+        now = time.monotonic()
+        if now - IncidentRepository._pruned_at < 60:
+            return
+        IncidentRepository._pruned_at = now
+
+        try:
+            async with self.db.transaction() as conn, conn.cursor() as cursor:
+                await cursor.execute(
+                    "DELETE FROM incident_changes WHERE changed_at < NOW() - INTERVAL %s SECOND",
+                    (CUBE_CHANGES_RETENTION_SECONDS,)
+                )
+        except Exception:
+            logger.exception("Could not prune incident_changes")
+
+    async def list(self, year: int | None = None, country: str | None = None):
+        conditions = []
+        params = []
+
+        if year is not None:
+            conditions.append("Year = %s")
+            params.append(year)
+
+        if country is not None:
+            conditions.append("Country = %s")
+            params.append(country)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        async with self.db.connection() as conn, conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(f"{self._SELECT} {where} ORDER BY Id", tuple(params))
+
+            return await cursor.fetchall()
+
+    async def get_by_id(self, id: int):
+        async with self.db.connection() as conn, conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(f"{self._SELECT} WHERE Id = %s", (id,))
+
+            return await cursor.fetchone()
+
+    async def create(self, fields: dict):
+        """
+        Insere um incidente ({campo da API: valor}) e atualiza os agregados.
+        Retorna o id, ou "FK" se uma chave estrangeira não existir.
+        """
+        incident = {column: fields.get(field) for field, column in self.FIELD_COLUMNS.items()}
+        columns = ", ".join(f"`{column}`" for column in incident)
+        placeholders = ", ".join(["%s"] * len(incident))
+
+        await self._prune_changes()
+
+        try:
+            async with self.db.transaction() as conn, conn.cursor() as cursor:
+                await cursor.execute(
+                    f"INSERT INTO global_cyber_threats ({columns}) VALUES ({placeholders})",
+                    tuple(incident.values())
+                )
+
+                # Lido antes de `apply`: o INSERT em incident_aggregates repõe lastrowid a 0
+                incident_id = cursor.lastrowid
+                await self.aggregates.apply(cursor, added=[incident])
+                await cursor.execute(self._MARK_SKETCHES_DIRTY)
+
+            return incident_id
+
+        except aiomysql.IntegrityError as err:
+            if err.args[0] == FK_NO_PARENT:
+                return "FK"
+
+            raise
+
+    async def update(self, id: int, fields: dict):
+        """
+        Atualiza só os campos fornecidos com um único UPDATE. Retorna True,
+        False se o incidente não existir, ou "FK" se uma chave estrangeira
+        não existir.
+        """
+        changes = {self.FIELD_COLUMNS[field]: value for field, value in fields.items()}
+        assignments = ", ".join(f"`{column}` = %s" for column in changes)
+
+        await self._prune_changes()
+
+        try:
+            async with self.db.transaction() as conn, conn.cursor() as cursor:
+                await cursor.execute(
+                    f"UPDATE global_cyber_threats SET {assignments} WHERE Id = %s",
+                    (*changes.values(), id)
+                )
+
+                # Com FOUND_ROWS (async_database.py) conta a linha mesmo sem alterações
+                if cursor.rowcount == 0:
+                    return False
+
+                await cursor.execute(self._MARK_SKETCHES_DIRTY)
+                return True
+
+        except aiomysql.IntegrityError as err:
+            if err.args[0] == FK_NO_PARENT:
+                return "FK"
+
+            raise
+
+    async def delete(self, id: int) -> bool:
+        await self._prune_changes()
+
+        async with self.db.transaction() as conn, conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(
+                "SELECT * FROM global_cyber_threats WHERE Id = %s FOR UPDATE",
+                (id,)
+            )
+            current = await cursor.fetchone()
+
+            if current is None:
+                return False
+
+            await cursor.execute(
+                "DELETE FROM global_cyber_threats WHERE Id = %s",
+                (id,)
+            )
+            await self.aggregates.apply(cursor, removed=[current])
+            await cursor.execute(self._MARK_SKETCHES_DIRTY)
+
+            return True
+
+    async def statistics(self):
+        """
+        Totais, incidentes por tipo de ataque, por país (top 10) e por ano,
+        lidos de incident_aggregates. As quatro consultas correm em paralelo,
+        cada uma na sua conexão do pool.
+        """
+        general_stats, by_type, by_country, by_year = await asyncio.gather(
+            self.aggregates.total(),
+            self.aggregates.by_lookup("attack_type", "Attack_Types", "Type"),
+            self.aggregates.by_dimension("country"),
+            self.aggregates.by_dimension("year"),
+        )
+
+        total_incidents = general_stats["incident_count"]
+
+        by_country = sorted(by_country, key=lambda item: item["incident_count"], reverse=True)[:10]
+
+        # Mais recente primeiro, ano desconhecido no fim
+        by_year = sorted(by_year, key=lambda item: int(item["dimension_key"] or -1), reverse=True)
+
+        return {
+            "general": {
+                "total_incidents": total_incidents,
+                "total_financial_loss": float(general_stats["total_financial_loss"]),
+                "total_affected_users": general_stats["total_affected_users"],
+                "avg_financial_loss": float(general_stats["total_financial_loss"] / general_stats["financial_loss_count"]) if general_stats["financial_loss_count"] else 0.0,
+                "avg_affected_users": general_stats["total_affected_users"] / general_stats["affected_users_count"] if general_stats["affected_users_count"] else 0.0
+            },
+            # Só tipos com incidentes, como o JOIN original
+            "by_type": [
+                {
+                    "attack_type": {"id": item["id"], "type": item["name"]},
+                    "count": item["incident_count"],
+                    "total_financial_loss": float(item["total_financial_loss"]),
+                    "total_affected_users": item["total_affected_users"]
+                }
+                for item in by_type
+                if item["incident_count"] > 0
+            ],
+            "by_country": [
+                {
+                    "country": item["dimension_key"] or None,
+                    "count": item["incident_count"],
+                    "total_financial_loss": float(item["total_financial_loss"]),
+                    "total_affected_users": item["total_affected_users"]
+                }
+                for item in by_country
+            ],
+            "by_year": [
+                {
+                    "year": int(item["dimension_key"]) if item["dimension_key"] else None,
+                    "count": item["incident_count"],
+                    "total_financial_loss": float(item["total_financial_loss"]),
+                    "total_affected_users": item["total_affected_users"]
+                }
+                for item in by_year
+            ]
+        }
@@ -0,0 +1,124 @@
+from async_database import db
+from repositories import (
+    AttackTypeRepository,
+    DefenseRepository,
+    IncidentAggregateRepository,
+    IncidentRepository,
+    VulnerabilityRepository,
+)
+
+# ==========================================================
+# CAMADA 2 (SERVIÇOS)
+# - Chamada pelas rotas de main.py (Camada 1)
+# - Usa os repositórios assíncronos (Camada 3); as funções são corrotinas,
+#   por isso um processo atende muitos pedidos em simultâneo no event loop
+# - Retorna None / False / "FK" como os serviços da API Flask; a Camada 1
+#   converte-os em respostas HTTP
+# ==========================================================
+
+aggregates = IncidentAggregateRepository(db)
+defenses = DefenseRepository(db, aggregates)
+attack_types = AttackTypeRepository(db, aggregates)
+vulnerabilities = VulnerabilityRepository(db, aggregates)
+incidents = IncidentRepository(db, aggregates)
+
+
+# ---- DEFESAS ----
+async def list_defenses():
+    return await defenses.list()
+
+async def get_defense(defense_id: int):
+    return await defenses.get_by_id(defense_id)
+
+async def create_defense(payload):
+    return await defenses.create(payload.mechanism)
+
+async def update_defense(defense_id: int, payload):
+    return await defenses.update(defense_id, payload.mechanism)
+
+async def delete_defense(defense_id: int):
+    return await defenses.delete(defense_id)
+
+async def defenses_stats():
+    return await defenses.statistics()
+
+
+# ---- ATAQUES ----
+async def list_attacks():
+    return await attack_types.list()
+
+async def get_attack(attack_id: int):
+    return await attack_types.get_by_id(attack_id)
+
+async def create_attack(payload):
+    return await attack_types.create(payload.type)
+
+async def update_attack(attack_id: int, payload):
+    return await attack_types.update(attack_id, payload.type)
+
+async def delete_attack(attack_id: int):
+    return await attack_types.delete(attack_id)
+
+async def attacks_stats():
+    return await attack_types.statistics()
+
+
+# ---- VULNERABILIDADES ----
+async def list_vulnerabilities():
+    return await vulnerabilities.list()
+
+async def get_vulnerability(vuln_id: int):
+    return await vulnerabilities.get_by_id(vuln_id)
+
+async def create_vulnerability(payload):
+    return await vulnerabilities.create(payload.vulnerability)
+
+async def update_vulnerability(vuln_id: int, payload):
+    return await vulnerabilities.update(vuln_id, payload.vulnerability)
+
+async def delete_vulnerability(vuln_id: int):
+    return await vulnerabilities.delete(vuln_id)
+
+async def vulnerabilities_stats():
+    return await vulnerabilities.statistics()
+
+
+# ---- INCIDENTES ----
+async def list_incidents(year=None, country=None):
+    return await incidents.list(year, country)
+
+async def get_incident(incident_id: int):
+    return await incidents.get_by_id(incident_id)
+
+async def create_incident(payload):
+    """Retorna o incidente criado, ou "FK" se alguma chave estrangeira não existir."""
+    incident_id = await incidents.create(payload.model_dump())
+
+    if incident_id == "FK":
+        return "FK"
+
+    return await incidents.get_by_id(incident_id)
+
+async def update_incident(incident_id: int, payload):
+    """
+    PUT parcial: só os campos enviados pelo cliente são alterados.
+    Retorna o incidente atualizado, None se não existir, ou "FK".
+    """
+    fields = payload.model_dump(exclude_unset=True)
+
+    if fields:
+        result = await incidents.update(incident_id, fields)
+
+        if result == "FK":
+            return "FK"
+
+        if not result:
+            return None
+
+    return await incidents.get_by_id(incident_id)
+
+async def delete_incident(incident_id: int):
+    return await incidents.delete(incident_id)
+
+async def incidents_stats():
+    return await incidents.statistics()